@@ -0,0 +1,154 @@
+"""
+Vistas asíncronas. Necesitan servirse con ASGI (ver suavespets/asgi.py) para no
+bloquear un worker mientras se espera a servicios externos. detalle_pet y RazasAPI
+son las versiones async de las de views.py y se usan cuando VISTAS_ASYNC está activo.
+"""
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views import View
+from asgiref.sync import sync_to_async
+from appsuavespets.models import Raza
+from appsuavespets.services.gemini_client import cliente_gemini
+from appsuavespets.services.gemini_service import GeminiVetService, ParserSecciones, perfil_pet
+from appsuavespets.services.cola_vet import ainfo_o_encolar, completar_tarea, liberar_tarea, reservar_tarea
+from appsuavespets.services.indice_razas import RAZAS_RESPALDO
+from appsuavespets.services.pet_api_service import PetAPIService
+from appsuavespets.views import (
+    CAMPOS_DETALLE_PET, CAMPOS_PERFIL_PET, pets_del_usuario, render_detalle_pet, role_required,
+)
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _evento(nombre, datos):
+    return f'event: {nombre}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n'
+
+
+def _eventos_completos(info):
+    for seccion in GeminiVetService.SECCIONES:
+        yield _evento('seccion', {'seccion': seccion, 'items': info.get(seccion, [])})
+    yield _evento('fin', {'estado': 'listo'})
+
+
+async def _esperar_worker(perfil):
+    """Otro proceso ya está generando este perfil: esperar a que aparezca en la cache"""
+    limite = time.monotonic() + settings.GEMINI_STREAM_TIMEOUT
+    while time.monotonic() < limite:
+        await asyncio.sleep(1)
+        info = await GeminiVetService.obtener_cache_async(perfil)
+        if info is not None:
+            for evento in _eventos_completos(info):
+                yield evento
+            return
+        # Comentario SSE para mantener viva la conexión a través de proxies
+        yield ': esperando\n\n'
+    yield _evento('fin', {'estado': 'pendiente'})
+
+
+async def _generar(perfil, tarea):
+    """Genera en streaming y envía cada sección apenas se cierra su encabezado"""
+    parser = ParserSecciones()
+    prompt = GeminiVetService.construir_prompt(perfil, formato='texto')
+    completado = False
+    error = 'Stream interrumpido por el cliente'
+    try:
+        async for fragmento in cliente_gemini.generar_stream_async(prompt):
+            for seccion in parser.alimentar(fragmento):
+                yield _evento('seccion', {'seccion': seccion, 'items': parser.info[seccion]})
+        for seccion in parser.cerrar():
+            yield _evento('seccion', {'seccion': seccion, 'items': parser.info[seccion]})
+        if not any(parser.info.values()):
+            raise ValueError('Gemini no devolvió contenido')
+        await GeminiVetService.guardar_cache_async(perfil, parser.info)
+        await sync_to_async(completar_tarea)(tarea)
+        completado = True
+    except Exception as e:
+        error = e
+        logger.warning('Stream de Gemini falló para %s (%s): %s', perfil['especie'], perfil['raza'], e)
+    finally:
+        if not completado:
+            # Devolver la tarea a la cola para que la termine el worker
+            await sync_to_async(liberar_tarea)(tarea, error)
+
+    if completado:
+        yield _evento('fin', {'estado': 'listo'})
+    else:
+        yield _evento('fin', {'estado': 'error', 'info': GeminiVetService.info_fallback(perfil['especie'])})
+
+
+async def _stream_info_vet(perfil):
+    info = await GeminiVetService.obtener_cache_async(perfil)
+    if info is not None:
+        for evento in _eventos_completos(info):
+            yield evento
+        return
+
+    tarea = await sync_to_async(reservar_tarea)(perfil)
+    fuente = _esperar_worker(perfil) if tarea is None else _generar(perfil, tarea)
+    async for evento in fuente:
+        yield evento
+
+
+@login_required
+async def info_vet_stream(request, pk):
+    """Información veterinaria de una mascota como Server-Sent Events, sección por sección"""
+    user = await request.auser()
+    if user.tipo_usuario not in ('admin', 'socio', 'socio_premium'):
+        return HttpResponseForbidden()
+
+    pet = await pets_del_usuario(user, CAMPOS_PERFIL_PET).filter(pk=pk).afirst()
+    if pet is None:
+        raise Http404('Mascota no encontrada')
+
+    response = StreamingHttpResponse(_stream_info_vet(perfil_pet(pet)), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+@role_required(['socio', 'socio_premium'])
+async def detalle_pet(request, pk):
+    """Versión async de views.detalle_pet: misma consulta, permisos y plantilla"""
+    pet = await aget_object_or_404(pets_del_usuario(await request.auser(), CAMPOS_DETALLE_PET), pk=pk)
+    info_vet, info_vet_pendiente = await ainfo_o_encolar(perfil_pet(pet))
+    return render_detalle_pet(request, pet, info_vet, info_vet_pendiente)
+
+
+class RazasAPI(View):
+    """Versión async de views.RazasAPI (catálogo local con ETag)"""
+
+    async def get(self, request):
+        especie = request.GET.get('especie', '').lower()
+        if especie not in ('perro', 'gato'):
+            return JsonResponse({'error': 'Especie inválida'}, status=400)
+
+        etag = await PetAPIService.aversion_catalogo(especie)
+        no_modificado = get_conditional_response(request, etag=f'"{etag}"')
+        if no_modificado is not None:
+            return no_modificado
+
+        razas = [
+            {'id': id_externo, 'name': nombre}
+            async for id_externo, nombre in (
+                Raza.objects.filter(especie=especie).order_by('nombre').values_list('id_externo', 'nombre')
+            )
+        ]
+        if razas:
+            response = JsonResponse({'razas': razas})
+            patch_cache_control(response, max_age=settings.RAZAS_CACHE_MAX_AGE, must_revalidate=True)
+        else:
+            # Catálogo aún no sincronizado (python manage.py sync_breeds)
+            response = JsonResponse({'razas': [
+                {'id': n.lower().replace(' ', '_'), 'name': n} for n in RAZAS_RESPALDO[especie]
+            ]})
+            patch_cache_control(response, no_cache=True)
+        response['ETag'] = f'"{etag}"'
+        return response
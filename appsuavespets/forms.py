@@ -1,6 +1,10 @@
 from django import forms
 from .models import Usuario, Pet, ArchivoAdjunto, Notificacion, EventoClinico
 from django.core.exceptions import ValidationError
+from appsuavespets.services.validacion_imagenes import ImagenInvalida, validar_imagen
+from appsuavespets.services.validacion_pets import (
+    DatoInvalido, validar_edad, validar_fecha_nacimiento, validar_peso,
+)
 import re
 
 
@@ -275,42 +279,28 @@ class PetForm(forms.ModelForm):
             'peso_kg': 'Peso (kg)',
             'foto_url': 'Foto',
         }
+        # FileField en lugar de ImageField: evita Image.verify() sobre el archivo completo
+        field_classes = {'foto_url': forms.FileField}
 
     def clean_peso_kg(self):
         """Validación adicional para peso SOLO si se ingresa"""
-        peso = self.cleaned_data.get('peso_kg')
-        
-        # Si está vacío, está bien (es opcional)
-        if peso is None or peso == '':
-            return None
-        
-        if peso < 0.4:
-            raise forms.ValidationError('El peso mínimo es 0.4 kg')
-        
-        if peso > 160:
-            raise forms.ValidationError('El peso máximo es 160 kg')
-        
-        # Validar que tenga máximo 2 decimales
-        peso_str = str(peso)
-        if '.' in peso_str:
-            decimales = len(peso_str.split('.')[1])
-            if decimales > 2:
-                raise forms.ValidationError('El peso puede tener máximo 2 decimales')
-        
-        return peso
+        try:
+            return validar_peso(self.cleaned_data.get('peso_kg'))
+        except DatoInvalido as e:
+            raise forms.ValidationError(str(e))
 
     def clean(self):
         cleaned = super().clean()
         dob = cleaned.get('fecha_nacimiento')
         edad = cleaned.get('edad')
-        from datetime import date
-        if dob:
-            if dob > date.today():
-                self.add_error('fecha_nacimiento', 'La fecha no puede ser futura')
-            if edad is not None:
-                years = int((date.today() - dob).days // 365)
-                if years != int(edad):
-                    self.add_error('edad', 'La edad no coincide con la fecha de nacimiento')
+        try:
+            validar_fecha_nacimiento(dob)
+        except DatoInvalido as e:
+            self.add_error('fecha_nacimiento', str(e))
+        try:
+            validar_edad(edad, dob)
+        except DatoInvalido as e:
+            self.add_error('edad', str(e))
         # No permitir modificar especie desde este formulario
         if self.instance and getattr(self.instance, 'especie', None):
             cleaned['especie'] = self.instance.especie
@@ -320,28 +310,10 @@ class PetForm(forms.ModelForm):
         foto = self.cleaned_data.get('foto_url')
         if not foto:
             return foto
-        content_type = getattr(foto, 'content_type', '')
-        name = getattr(foto, 'name', '')
-        allowed_ct = ['image/jpeg', 'image/png', 'image/jpg']
-        allowed_ext = ('.jpg', '.jpeg', '.png')
-        if content_type and content_type.lower() not in allowed_ct:
-            raise forms.ValidationError('Solo se permiten imágenes JPG o PNG')
-        if name and not name.lower().endswith(allowed_ext):
-            raise forms.ValidationError('Extensión de archivo no permitida')
-        # Validar que realmente es una imagen
         try:
-            from PIL import Image
-            Image.open(foto).verify()
-            try:
-                foto.seek(0)
-            except Exception:
-                pass
-        except Exception:
-            raise forms.ValidationError('Archivo de imagen inválido')
-        # Limitar tamaño (5 MB)
-        max_bytes = 5 * 1024 * 1024
-        if getattr(foto, 'size', 0) > max_bytes:
-            raise forms.ValidationError('La imagen supera 5 MB')
+            validar_imagen(foto)
+        except ImagenInvalida as e:
+            raise forms.ValidationError(str(e))
         return foto
     
     
@@ -0,0 +1,89 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from appsuavespets.models import ArchivoAdjunto, Pet
+from appsuavespets.services.almacenamiento import (
+    almacenamiento, borrar_huerfanos, es_contenido, registrar_referencia, reporte_ahorro,
+)
+from appsuavespets.services.imagenes import FORMATOS, TAMANIOS, ruta_derivado
+
+
+def _tamanio_legible(bytes_):
+    for unidad in ('B', 'KB', 'MB'):
+        if bytes_ < 1024:
+            return f'{bytes_:.1f} {unidad}'
+        bytes_ /= 1024
+    return f'{bytes_:.1f} GB'
+
+
+class Command(BaseCommand):
+    help = (
+        'Muestra cuánto disco ahorra el almacenamiento por contenido. Con --migrar mueve a '
+        'blobs/ las fotos de mascotas y adjuntos guardados con el almacenamiento anterior; '
+        'con --borrar-huerfanos elimina los blobs de subidas que se revirtieron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--migrar', action='store_true', help='Migra los archivos existentes a blobs/')
+        parser.add_argument('--borrar-huerfanos', action='store_true', help='Borra los blobs que no tienen fila en contenido_archivo')
+        parser.add_argument('--minutos', type=int, default=60, help='Antigüedad mínima de un blob huérfano para borrarlo')
+
+    def handle(self, *args, **options):
+        if options['migrar']:
+            self.migrar()
+        if options['borrar_huerfanos']:
+            borrados = borrar_huerfanos(options['minutos'])
+            self.stdout.write(f'Blobs huérfanos borrados: {borrados}')
+        self.reporte()
+
+    def reporte(self):
+        datos = reporte_ahorro()
+        ahorro = datos['bytes_ahorrados']
+        porcentaje = ahorro * 100 / datos['bytes_subidos'] if datos['bytes_subidos'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{datos['archivos']} archivos únicos | en disco={_tamanio_legible(datos['bytes_almacenados'])} "
+            f"subidos={_tamanio_legible(datos['bytes_subidos'])} "
+            f"ahorrados={_tamanio_legible(ahorro)} ({porcentaje:.0f}%)"
+        ))
+
+    def migrar(self):
+        nuevas = {}
+        reemplazados = set()
+        migrados = faltantes = 0
+        referencias = [
+            (Pet, 'foto_url', Pet.objects.exclude(foto_url__isnull=True).exclude(foto_url='')),
+            (ArchivoAdjunto, 'archivo_url', ArchivoAdjunto.objects.filter(estado='listo')),
+        ]
+        for modelo, campo, filas in referencias:
+            for pk, ruta in filas.values_list('pk', campo).iterator():
+                if es_contenido(ruta):
+                    continue
+                with transaction.atomic():
+                    if ruta in nuevas:
+                        # Mismo archivo referenciado por otra fila: solo suma la referencia
+                        huella, nueva, tamanio = nuevas[ruta]
+                        registrar_referencia(huella, nueva, tamanio, subida=False)
+                    elif almacenamiento.exists(ruta):
+                        with almacenamiento.open(ruta, 'rb') as original:
+                            # No es una subida nueva: no debe inflar el reporte de ahorro
+                            nueva = almacenamiento.guardar_existente(ruta, File(original))
+                        contenido = nueva.rsplit('/', 1)[1].split('.')[0]
+                        nuevas[ruta] = (contenido, nueva, almacenamiento.size(nueva))
+                    else:
+                        faltantes += 1
+                        self.stderr.write(f'{modelo.__name__} {pk}: no existe {ruta}')
+                        continue
+                    modelo.objects.filter(pk=pk).update(**{campo: nuevas[ruta][1]})
+                migrados += 1
+                reemplazados.add(ruta)
+
+        # Los originales y sus derivados ya no los referencia ninguna fila
+        for ruta in reemplazados:
+            for vieja in [ruta] + [ruta_derivado(ruta, t, f) for t in TAMANIOS for f in FORMATOS]:
+                if almacenamiento.exists(vieja):
+                    almacenamiento.delete(vieja)
+        self.stdout.write(
+            f'Migradas {migrados} referencias de {len(reemplazados)} archivos ({faltantes} no encontrados). '
+            'Ejecuta generar_derivados para las fotos de mascotas.'
+        )
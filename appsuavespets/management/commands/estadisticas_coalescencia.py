@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from appsuavespets.services.coalescencia import estadisticas
+
+
+class Command(BaseCommand):
+    help = 'Muestra cuántas llamadas externas se ejecutaron y cuántas se ahorraron por coalescencia'
+
+    def add_arguments(self, parser):
+        parser.add_argument('espacios', nargs='*', default=['gemini', 'razas'])
+
+    def handle(self, *args, **options):
+        for espacio in options['espacios']:
+            datos = estadisticas(espacio)
+            total = datos['ejecutadas'] + datos['ahorradas']
+            porcentaje = (datos['ahorradas'] * 100 / total) if total else 0
+            self.stdout.write(
+                f"{espacio}: {datos['ejecutadas']} ejecutadas, {datos['ahorradas']} ahorradas ({porcentaje:.1f}%)"
+            )
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from appsuavespets.services.indice_razas import obtener_indice
+
+
+class Command(BaseCommand):
+    help = 'Construye el índice de razas en memoria y muestra su tamaño y el tiempo de búsqueda'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consulta', default='pas', help='Prefijo usado para medir el autocompletado')
+
+    def handle(self, *args, **options):
+        for especie in ('perro', 'gato'):
+            indice = obtener_indice(especie)
+            datos = indice.estadisticas()
+
+            repeticiones = 10000
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                indice.autocompletar(options['consulta'])
+            microsegundos = (time.perf_counter() - inicio) * 1e6 / repeticiones
+
+            self.stdout.write(
+                f"{especie} ({datos['version']}): {datos['razas']} razas, "
+                f"{datos['claves_exactas']} claves exactas, {datos['claves_aproximadas']} aproximadas, "
+                f"{datos['nodos_trie']} nodos | {datos['bytes'] / 1024:.1f} KB | "
+                f"autocompletar('{options['consulta']}'): {microsegundos:.1f} µs"
+            )
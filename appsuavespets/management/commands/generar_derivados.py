@@ -0,0 +1,55 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from appsuavespets.models import Pet
+from appsuavespets.services.almacenamiento import almacenamiento
+from appsuavespets.services.imagenes import es_derivado, generar_derivados
+
+EXTENSIONES = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera los derivados (thumb, card, full en WebP y JPEG) de las fotos existentes. '
+        'Es idempotente: las fotos que ya tienen sus derivados se omiten.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--carpeta', help='Carpeta dentro de MEDIA_ROOT (por defecto, las fotos de las mascotas)')
+        parser.add_argument('--forzar', action='store_true', help='Regenera aunque los derivados existan')
+
+    def archivos(self, carpeta):
+        directorios, archivos = almacenamiento.listdir(carpeta)
+        for nombre in archivos:
+            ruta = f'{carpeta}/{nombre}'
+            if os.path.splitext(nombre)[1].lower() in EXTENSIONES and not es_derivado(ruta):
+                yield ruta
+        for directorio in directorios:
+            yield from self.archivos(f'{carpeta}/{directorio}')
+
+    def fotos_pets(self):
+        # Las fotos viven en blobs/ junto a los adjuntos de eventos: se toman de la tabla pet
+        return (
+            Pet.objects.exclude(foto_url__isnull=True).exclude(foto_url='')
+            .values_list('foto_url', flat=True).distinct().iterator()
+        )
+
+    def handle(self, *args, **options):
+        procesadas = omitidas = errores = 0
+        rutas = self.archivos(options['carpeta']) if options['carpeta'] else self.fotos_pets()
+        for ruta in rutas:
+            try:
+                escritos = generar_derivados(ruta, almacenamiento, forzar=options['forzar'])
+            except Exception as e:
+                errores += 1
+                self.stderr.write(f'Error en {ruta}: {e}')
+                continue
+            if escritos:
+                procesadas += 1
+                self.stdout.write(f'{ruta}: {escritos} derivados')
+            else:
+                omitidas += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Listo: procesadas={procesadas} ya completas={omitidas} errores={errores}'
+        ))
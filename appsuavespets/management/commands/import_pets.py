@@ -0,0 +1,255 @@
+import csv
+import datetime
+import itertools
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from appsuavespets.models import Cuidados, Notificacion, Pet, Usuario
+from appsuavespets.services.lote_pets import CAMPOS_EDITABLES, asignar_fichas, limpiar_item
+from appsuavespets.services.validacion_pets import (
+    CUIDADOS_CON_RECORDATORIO, DatoInvalido, validar_dosis, validar_tipo_cuidado,
+)
+
+COLUMNAS_CUIDADO = ('tipo_cuidado', 'fecha_proxima', 'dosis')
+
+
+def _filas_csv(ruta, delimitador):
+    with open(ruta, newline='', encoding='utf-8-sig') as archivo:
+        yield from csv.DictReader(archivo, delimiter=delimitador)
+
+
+def _celda(valor):
+    # Excel entrega fechas como datetime y enteros como float
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime.datetime):
+        return valor.date().isoformat()
+    if isinstance(valor, datetime.date):
+        return valor.isoformat()
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def _filas_excel(ruta, hoja):
+    try:
+        import openpyxl
+    except ImportError:
+        raise CommandError('Para importar Excel instala openpyxl (pip install openpyxl)')
+    # read_only: openpyxl lee la hoja fila a fila sin cargar el libro completo
+    libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = (libro[hoja] if hoja else libro.active).iter_rows(values_only=True)
+        encabezado = [_celda(c).strip() for c in next(filas, ())]
+        for fila in filas:
+            yield dict(zip(encabezado, (_celda(c) for c in fila)))
+    finally:
+        libro.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa mascotas y sus próximos cuidados desde un CSV o Excel (.xlsx), leyendo el '
+        'archivo fila a fila. Columnas: email_responsable, email_veterinario (opcional), los '
+        'campos de la mascota (nombre_pet, especie, ..., numero_ficha) y opcionalmente '
+        'tipo_cuidado, fecha_proxima y dosis. Una fila cuya numero_ficha ya existe para el '
+        'mismo responsable solo agrega su cuidado. Las filas rechazadas van a un CSV con el '
+        'motivo; cada bloque se confirma por separado y se puede reanudar con --desde.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta al .csv o .xlsx')
+        parser.add_argument('--hoja', help='Hoja del Excel (por defecto la activa)')
+        parser.add_argument('--delimitador', default=',', help='Separador del CSV')
+        parser.add_argument('--desde', type=int, default=0, help='Omite las primeras N filas de datos (reanudar)')
+        parser.add_argument('--lote', type=int, default=500, help='Filas por bloque / transacción')
+        parser.add_argument('--rechazos', help='CSV de filas rechazadas (por defecto <archivo>.rechazos.csv)')
+
+    def handle(self, *args, **options):
+        ruta = options['archivo']
+        if not os.path.exists(ruta):
+            raise CommandError(f'No existe {ruta}')
+        if options['lote'] < 1 or options['desde'] < 0:
+            raise CommandError('--lote debe ser al menos 1 y --desde no puede ser negativo')
+
+        if ruta.lower().endswith(('.xlsx', '.xlsm')):
+            filas = _filas_excel(ruta, options['hoja'])
+        else:
+            filas = _filas_csv(ruta, options['delimitador'])
+
+        # Una consulta para todos los usuarios: email -> (id, tipo_usuario)
+        self.usuarios = {
+            email.strip().lower(): (pk, tipo)
+            for email, pk, tipo in Usuario.objects.values_list('email', 'id_usuario', 'tipo_usuario')
+        }
+        # numero_ficha -> (id_pet, responsable_id, nombre) de las mascotas ya vistas
+        self.fichas = {}
+        self.totales = {'filas': 0, 'mascotas': 0, 'cuidados': 0, 'rechazadas': 0}
+        self.inicio = time.monotonic()
+
+        ruta_rechazos = options['rechazos'] or f'{ruta}.rechazos.csv'
+        anexar = options['desde'] > 0 and os.path.exists(ruta_rechazos)
+        with open(ruta_rechazos, 'a' if anexar else 'w', newline='', encoding='utf-8') as salida:
+            self.rechazos = salida
+            self.escritor = None
+            numero = options['desde']
+            filas = itertools.islice(filas, options['desde'], None)
+            while True:
+                bloque = list(itertools.islice(filas, options['lote']))
+                if not bloque:
+                    break
+                self.importar_bloque(list(enumerate(bloque, start=numero + 1)))
+                numero += len(bloque)
+                self.progreso(numero)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Listo: {self.totales['mascotas']} mascotas y {self.totales['cuidados']} cuidados creados, "
+            f"{self.totales['rechazadas']} filas rechazadas ({ruta_rechazos})"
+        ))
+
+    def progreso(self, numero):
+        segundos = max(time.monotonic() - self.inicio, 1e-6)
+        self.stdout.write(
+            f"fila {numero}: {self.totales['mascotas']} mascotas, {self.totales['cuidados']} cuidados, "
+            f"{self.totales['rechazadas']} rechazadas | {self.totales['filas'] / segundos:.0f} filas/s "
+            f"(para reanudar: --desde {numero})"
+        )
+
+    def rechazar(self, numero, fila, errores):
+        # Se escriben al confirmar el bloque: si falla, --desde lo repite sin duplicar rechazos
+        motivo = '; '.join(f'{campo}: {" ".join(map(str, mensajes))}' for campo, mensajes in errores.items())
+        self.rechazos_bloque.append({**fila, 'fila': numero, 'errores': motivo})
+
+    def escribir_rechazos(self):
+        for rechazo in self.rechazos_bloque:
+            if self.escritor is None:
+                campos = [c for c in rechazo if c not in ('fila', 'errores')]
+                self.escritor = csv.DictWriter(self.rechazos, fieldnames=['fila', *campos, 'errores'], extrasaction='ignore')
+                if self.rechazos.tell() == 0:
+                    self.escritor.writeheader()
+            self.escritor.writerow(rechazo)
+        self.rechazos.flush()
+        self.totales['rechazadas'] += len(self.rechazos_bloque)
+
+    def cuidado(self, fila):
+        """Cuidado de la fila (sin mascota asignada) o None; lanza DatoInvalido"""
+        if not any(fila.get(c) for c in COLUMNAS_CUIDADO):
+            return None
+        try:
+            fecha = datetime.date.fromisoformat(fila.get('fecha_proxima', '').strip())
+        except ValueError:
+            raise DatoInvalido('fecha_proxima inválida (AAAA-MM-DD)')
+        return Cuidados(
+            tipo_cuidado=validar_tipo_cuidado(fila.get('tipo_cuidado')),
+            fecha_proxima=fecha,
+            dosis=validar_dosis(fila.get('dosis')),
+            is_deleted=0,
+        )
+
+    def validar(self, numero, fila, existente):
+        """(responsable, pet sin guardar o None si ya existe, cuidado); None si la fila se rechaza"""
+        errores = {}
+        responsable = self.usuarios.get(fila.get('email_responsable', '').lower())
+        if responsable is None:
+            errores['email_responsable'] = ['Usuario no encontrado']
+        veterinario = None
+        if fila.get('email_veterinario'):
+            veterinario = self.usuarios.get(fila['email_veterinario'].lower())
+            if veterinario is None:
+                errores['email_veterinario'] = ['Usuario no encontrado']
+
+        pet = None
+        if existente is None:
+            pet = Pet(
+                responsable_id=responsable and responsable[0], veterinario_id=veterinario and veterinario[0],
+                is_deleted=0, es_mestizo=False, numero_ficha=fila.get('numero_ficha') or None,
+            )
+            datos = {campo: fila[campo] for campo in CAMPOS_EDITABLES if fila.get(campo, '') != ''}
+            errores.update(limpiar_item(datos, pet))
+        elif responsable and existente[1] != responsable[0]:
+            errores['numero_ficha'] = ['La ficha pertenece a otra mascota']
+        try:
+            cuidado = self.cuidado(fila)
+        except DatoInvalido as e:
+            errores['cuidado'] = [str(e)]
+        else:
+            if existente is not None and cuidado is None:
+                errores.setdefault('numero_ficha', ['La mascota ya existe y la fila no trae cuidado'])
+
+        if errores:
+            self.rechazar(numero, fila, errores)
+            return None
+        return responsable, pet, cuidado
+
+    def importar_bloque(self, bloque):
+        bloque = [
+            # Las celdas sobrantes del CSV quedan bajo la clave None
+            (numero, {k.strip().lower(): (v or '').strip() for k, v in fila.items() if k is not None})
+            for numero, fila in bloque
+        ]
+        self.totales['filas'] += len(bloque)
+        self.rechazos_bloque = []
+
+        # Fichas del bloque que aún no conocemos: una sola consulta
+        pedidas = {fila.get('numero_ficha') for _, fila in bloque} - set(self.fichas) - {'', None}
+        for ficha, pk, responsable_id, nombre in Pet.objects.filter(numero_ficha__in=pedidas).values_list(
+            'numero_ficha', 'id_pet', 'responsable_id', 'nombre_pet',
+        ):
+            self.fichas[ficha] = (pk, responsable_id, nombre)
+
+        pets, cuidados = [], []
+        del_bloque = {}
+        for numero, fila in bloque:
+            ficha = fila.get('numero_ficha')
+            # Una ficha ya vista (en la base o antes en el archivo) solo aporta su cuidado
+            existente = self.fichas.get(ficha) or del_bloque.get(ficha) if ficha else None
+            resultado = self.validar(numero, fila, existente)
+            if resultado is None:
+                continue
+            responsable, pet, cuidado = resultado
+            if pet is not None:
+                pets.append(pet)
+                if ficha:
+                    del_bloque[ficha] = (pet, responsable[0], pet.nombre_pet)
+            if cuidado is not None:
+                cuidados.append((cuidado, pet or existente, responsable))
+
+        asignar_fichas(pets)
+        with transaction.atomic():
+            Pet.objects.bulk_create(pets)
+            if pets and pets[0].pk is None:
+                # MySQL no devuelve los ids de bulk_create; la ficha es única
+                ids = dict(Pet.objects.filter(numero_ficha__in=[p.numero_ficha for p in pets])
+                           .values_list('numero_ficha', 'id_pet'))
+                for pet in pets:
+                    pet.pk = ids[pet.numero_ficha]
+
+            notificaciones = []
+            ahora = timezone.now()
+            for cuidado, destino, (id_usuario, tipo_usuario) in cuidados:
+                if isinstance(destino, tuple):
+                    id_pet, _, nombre = destino
+                    cuidado.id_pet_id = id_pet.pk if isinstance(id_pet, Pet) else id_pet
+                else:
+                    cuidado.id_pet_id, nombre = destino.pk, destino.nombre_pet
+                # Mismo recordatorio que crea gestionar_cuidados
+                if tipo_usuario == 'socio_premium' and cuidado.tipo_cuidado in CUIDADOS_CON_RECORDATORIO:
+                    notificaciones.append(Notificacion(
+                        usuario_id=id_usuario, pet_id=cuidado.id_pet_id,
+                        titulo=f'Recordatorio: {cuidado.tipo_cuidado} para {nombre}',
+                        mensaje=f'Recuerda la próxima {cuidado.tipo_cuidado} el {cuidado.fecha_proxima}.',
+                        tipo='recordatorio', leido=0, fecha_creacion=ahora, is_deleted=0,
+                        fecha_envio=timezone.make_aware(datetime.datetime.combine(cuidado.fecha_proxima, datetime.time())),
+                    ))
+            Cuidados.objects.bulk_create([cuidado for cuidado, *_ in cuidados])
+            Notificacion.objects.bulk_create(notificaciones)
+
+        self.escribir_rechazos()
+        for pet in pets:
+            self.fichas[pet.numero_ficha] = (pet.pk, pet.responsable_id, pet.nombre_pet)
+        self.totales['mascotas'] += len(pets)
+        self.totales['cuidados'] += len(cuidados)
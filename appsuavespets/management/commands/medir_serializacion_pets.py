@@ -0,0 +1,91 @@
+import json
+import time
+
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from appsuavespets.models import Pet, Usuario
+from appsuavespets.renderers import JSONRapidoRenderer
+from appsuavespets.serializers import FormaPet, PetSerializer
+
+
+class _Revertir(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la serialización de listas de mascotas: PetSerializer + JSONRenderer '
+        'frente a values() + FormaPet.serializar + orjson. Los datos de prueba se crean '
+        'en una transacción que se revierte al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cantidad', type=int, default=10000, help='Mascotas a serializar')
+        parser.add_argument('--repeticiones', type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.medir(options['cantidad'], options['repeticiones'])
+                raise _Revertir
+        except _Revertir:
+            pass
+
+    def crear_datos(self, cantidad):
+        # Un responsable cada 5 mascotas, como en un listado de staff
+        duenos = Usuario.objects.bulk_create([
+            Usuario(email=f'bench{i}@suavespets.cl', nombre=f'Dueño {i}', tipo_identificacion='rut',
+                    identificacion=str(i), tipo_usuario='socio', password='!')
+            for i in range(max(cantidad // 5, 1))
+        ])
+        if duenos[0].pk is None:
+            duenos = list(Usuario.objects.filter(email__startswith='bench').order_by('pk'))
+        Pet.objects.bulk_create([
+            Pet(nombre_pet=f'Mascota {i}', descripcion_pet='Juguetona', especie='perro' if i % 2 else 'gato',
+                tamanio='mediano', raza='Mestizo', es_mestizo=True, sexo='macho', edad=i % 15,
+                peso_kg=None if i % 7 == 0 else 12.5, responsable=duenos[i % len(duenos)], is_deleted=0)
+            for i in range(cantidad)
+        ], batch_size=1000)
+        return Pet.objects.filter(responsable__email__startswith='bench').order_by('id_pet')
+
+    def cronometrar(self, etiqueta, funcion, cantidad, repeticiones):
+        mejor, salida = None, None
+        consultas = []
+
+        def contar(execute, sql, params, many, context):
+            consultas.append(sql)
+            return execute(sql, params, many, context)
+
+        for _ in range(repeticiones):
+            consultas.clear()
+            # execute_wrapper en lugar de CaptureQueriesContext: su log se corta en 9000 consultas
+            with connection.execute_wrapper(contar):
+                inicio = time.perf_counter()
+                salida = funcion()
+                duracion = time.perf_counter() - inicio
+            mejor = duracion if mejor is None else min(mejor, duracion)
+        self.stdout.write(
+            f'{etiqueta:<28} {mejor * 1000:8.0f} ms  {cantidad / mejor:10.0f} pets/s  '
+            f'{len(consultas):6d} consultas  {len(salida) / 1024:8.0f} KB'
+        )
+        return salida
+
+    def medir(self, cantidad, repeticiones):
+        pets = self.crear_datos(cantidad)
+        self.stdout.write(f'{cantidad} mascotas, mejor de {repeticiones} repeticiones')
+
+        antes = self.cronometrar(
+            'PetSerializer + JSONRenderer',
+            lambda: JSONRenderer().render(PetSerializer(pets.all(), many=True).data),
+            cantidad, repeticiones,
+        )
+        forma = FormaPet()
+        despues = self.cronometrar(
+            'values() + orjson',
+            lambda: JSONRapidoRenderer().render(forma.serializar(pets.all().values(*forma.columnas))),
+            cantidad, repeticiones,
+        )
+        iguales = json.loads(antes) == json.loads(despues)
+        self.stdout.write(self.style.SUCCESS('Mismo JSON') if iguales else self.style.ERROR('El JSON difiere'))
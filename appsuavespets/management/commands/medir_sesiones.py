@@ -0,0 +1,100 @@
+import datetime
+import time
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from appsuavespets.models import SesionUsuario, Usuario
+from appsuavespets.services.sesiones import cerrar_otras_sesiones
+
+
+class _Revertir(Exception):
+    pass
+
+
+def _escanear_sesiones(usuario, clave_actual):
+    """Implementación anterior de one_session_per_user: decodifica cada sesión activa"""
+    for session in Session.objects.filter(expire_date__gte=timezone.now()):
+        if session.session_key != clave_actual and session.get_decoded().get('_auth_user_id') == str(usuario.id_usuario):
+            session.delete()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el cierre de las otras sesiones de un usuario al iniciar sesión: recorrer y '
+        'decodificar django_session frente al índice SesionUsuario. Los datos de prueba se '
+        'crean en una transacción que se revierte al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sesiones', type=int, default=100000, help='Sesiones activas de otros usuarios')
+        parser.add_argument('--usuarios', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.medir(options['sesiones'], max(options['usuarios'], 1))
+                raise _Revertir
+        except _Revertir:
+            pass
+
+    def crear_datos(self, sesiones, cantidad_usuarios):
+        usuarios = Usuario.objects.bulk_create([
+            Usuario(email=f'bench{i}@suavespets.cl', nombre=f'Usuario {i}', tipo_identificacion='rut',
+                    identificacion=str(i), tipo_usuario='socio', password='!')
+            for i in range(cantidad_usuarios)
+        ], batch_size=1000)
+        if usuarios[0].pk is None:
+            usuarios = list(Usuario.objects.filter(email__startswith='bench').order_by('pk'))
+
+        expira = timezone.now() + datetime.timedelta(hours=1)
+        codificador = SessionStore()
+        filas, indice = [], []
+        for i in range(sesiones):
+            usuario = usuarios[i % len(usuarios)]
+            clave = f'bench{i:027d}'
+            datos = codificador.encode({'_auth_user_id': str(usuario.pk), '_auth_user_backend': 'bench'})
+            filas.append(Session(session_key=clave, session_data=datos, expire_date=expira))
+            indice.append(SesionUsuario(session_id=clave, usuario=usuario))
+        Session.objects.bulk_create(filas, batch_size=1000)
+        SesionUsuario.objects.bulk_create(indice, batch_size=1000)
+        return usuarios[0], expira, codificador
+
+    def sesiones_previas(self, usuario, expira, codificador):
+        # El usuario medido tiene 3 sesiones abiertas y acaba de iniciar una cuarta
+        datos = codificador.encode({'_auth_user_id': str(usuario.pk)})
+        claves = [f'previa{i}-{time.monotonic_ns()}' for i in range(4)]
+        Session.objects.bulk_create([Session(session_key=c, session_data=datos, expire_date=expira) for c in claves])
+        SesionUsuario.objects.bulk_create([SesionUsuario(session_id=c, usuario=usuario) for c in claves])
+        return claves[-1]
+
+    def cronometrar(self, etiqueta, funcion, usuario, actual):
+        consultas = []
+
+        def contar(execute, sql, params, many, context):
+            consultas.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(contar):
+            inicio = time.perf_counter()
+            funcion(usuario, actual)
+            duracion = time.perf_counter() - inicio
+        restantes = Session.objects.filter(session_key__startswith='previa').count()
+        self.stdout.write(
+            f'{etiqueta:<24} {duracion * 1000:9.1f} ms  {len(consultas):4d} consultas  '
+            f'sesiones del usuario tras el login: {restantes}'
+        )
+
+    def medir(self, sesiones, cantidad_usuarios):
+        usuario, expira, codificador = self.crear_datos(sesiones, cantidad_usuarios)
+        self.stdout.write(f'{sesiones} sesiones activas de {cantidad_usuarios} usuarios')
+
+        actual = self.sesiones_previas(usuario, expira, codificador)
+        self.cronometrar('Recorrer django_session', _escanear_sesiones, usuario, actual)
+        Session.objects.filter(session_key__startswith='previa').delete()
+
+        actual = self.sesiones_previas(usuario, expira, codificador)
+        self.cronometrar('Índice SesionUsuario', cerrar_otras_sesiones, usuario, actual)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from appsuavespets.services import contadores
+from appsuavespets.services.gemini_client import CircuitBreaker
+
+
+class Command(BaseCommand):
+    help = 'Muestra las transiciones del circuit breaker de Gemini acumuladas por todos los workers'
+
+    def handle(self, *args, **options):
+        valores = contadores.leer('circuito:gemini')
+        for estado in (CircuitBreaker.CERRADO, CircuitBreaker.SEMIABIERTO, CircuitBreaker.ABIERTO):
+            self.stdout.write(f"-> {estado}: {valores.get(estado, 0)}")
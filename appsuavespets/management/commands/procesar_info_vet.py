@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from appsuavespets.services.cola_vet import procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Worker local que procesa la cola de información veterinaria (Gemini)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help='Vacía la cola y termina')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera cuando la cola está vacía')
+
+    def handle(self, *args, **options):
+        if options['una_vez']:
+            procesadas = procesar_pendientes()
+            self.stdout.write(self.style.SUCCESS(f'Tareas procesadas: {procesadas}'))
+            return
+
+        self.stdout.write('Worker de información veterinaria iniciado (Ctrl+C para detener)')
+        try:
+            while True:
+                close_old_connections()
+                procesadas = procesar_pendientes(limite=50)
+                if procesadas:
+                    self.stdout.write(f'Tareas procesadas: {procesadas}')
+                else:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('Worker detenido')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from appsuavespets.services.adjuntos import recuperar_pendientes
+
+
+class Command(BaseCommand):
+    help = (
+        "Reintenta los adjuntos de eventos clínicos que quedaron 'pendiente' (el proceso se "
+        "reinició antes de guardarlos), marca 'error' los que perdieron su temporal y borra "
+        'los temporales huérfanos. Pensado para ejecutarse periódicamente (cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutos', type=int, default=30, help='Antigüedad mínima de un pendiente para darlo por perdido')
+
+    def handle(self, *args, **options):
+        if options['minutos'] < 1:
+            raise CommandError('--minutos debe ser al menos 1')
+        listos, con_error, borrados = recuperar_pendientes(options['minutos'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Adjuntos recuperados: {listos} | con error: {con_error} | temporales borrados: {borrados}'
+        ))
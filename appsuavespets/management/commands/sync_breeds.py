@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from appsuavespets.models import Raza
+from appsuavespets.services.pet_api_service import PetAPIService
+
+CAMPOS = ('nombre', 'temperamento', 'origen', 'descripcion',
+          'peso', 'esperanza_vida', 'grupo', 'imagen_url')
+
+
+def datos_raza(breed):
+    """Convierte una raza de TheDogAPI/TheCatAPI en los campos del modelo Raza"""
+    nombre = (breed.get('name') or '').strip()
+    return {
+        'nombre': nombre[:100],
+        'temperamento': breed.get('temperament') or None,
+        'origen': (breed.get('origin') or '')[:100] or None,
+        'descripcion': breed.get('description') or None,
+        'peso': ((breed.get('weight') or {}).get('metric') or '')[:50] or None,
+        'esperanza_vida': (breed.get('life_span') or '')[:50] or None,
+        'grupo': (breed.get('breed_group') or '')[:100] or None,
+        'imagen_url': ((breed.get('image') or {}).get('url') or '')[:500] or None,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Sincroniza la tabla de razas con TheDogAPI/TheCatAPI. Solo actualiza las razas '
+        'que cambiaron; si la API falla, el catálogo local se mantiene sin cambios.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--especie', choices=['perro', 'gato'], help='Sincroniza solo una especie')
+
+    def handle(self, *args, **options):
+        especies = [options['especie']] if options['especie'] else ['perro', 'gato']
+        for especie in especies:
+            try:
+                breeds = PetAPIService.descargar_catalogo(especie)
+            except Exception as e:
+                self.stderr.write(f'No se pudo descargar el catálogo de {especie}: {e}')
+                continue
+            if not breeds:
+                self.stderr.write(f'La API devolvió un catálogo vacío para {especie}; se omite')
+                continue
+            creadas, actualizadas, eliminadas = self.sincronizar(especie, breeds)
+            self.stdout.write(self.style.SUCCESS(
+                f'{especie}: {len(breeds)} razas | nuevas={creadas} actualizadas={actualizadas} eliminadas={eliminadas}'
+            ))
+
+    @transaction.atomic
+    def sincronizar(self, especie, breeds):
+        ahora = timezone.now()
+        existentes = {r.id_externo: r for r in Raza.objects.filter(especie=especie)}
+        nuevas, cambiadas, vistas = [], [], set()
+
+        for breed in breeds:
+            id_externo = str(breed['id'] if breed.get('id') is not None else breed.get('name', '')).strip()[:50]
+            datos = datos_raza(breed)
+            if not id_externo or not datos['nombre'] or id_externo in vistas:
+                continue
+            vistas.add(id_externo)
+
+            raza = existentes.get(id_externo)
+            if raza is None:
+                nuevas.append(Raza(especie=especie, id_externo=id_externo, fecha_actualizacion=ahora, **datos))
+            elif any(getattr(raza, campo) != valor for campo, valor in datos.items()):
+                for campo, valor in datos.items():
+                    setattr(raza, campo, valor)
+                raza.fecha_actualizacion = ahora
+                cambiadas.append(raza)
+
+        Raza.objects.bulk_create(nuevas, batch_size=500)
+        Raza.objects.bulk_update(cambiadas, CAMPOS + ('fecha_actualizacion',), batch_size=500)
+        eliminadas, _ = Raza.objects.filter(especie=especie).exclude(id_externo__in=vistas).delete()
+        return len(nuevas), len(cambiadas), eliminadas
@@ -0,0 +1,162 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from appsuavespets.models import InfoVetCache, Pet
+from appsuavespets.services.gemini_service import (
+    ETAPAS_VIDA, PROMPT_VERSION, GeminiVetService, calcular_huella, perfil_pet,
+)
+from appsuavespets.services.pet_api_service import PetAPIService
+
+
+class _LimitadorRPM:
+    """Reparte las llamadas de todos los threads a un máximo de N por minuto"""
+
+    def __init__(self, rpm):
+        self.intervalo = 60.0 / rpm if rpm else 0
+        self.lock = threading.Lock()
+        self.siguiente = time.monotonic()
+
+    def esperar(self):
+        if not self.intervalo:
+            return
+        with self.lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self.siguiente)
+            self.siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+def tamanio_por_peso(peso_metrico):
+    """Estima el tamaño a partir del rango de peso de la API ('25 - 32')"""
+    numeros = [float(n) for n in re.findall(r'\d+(?:\.\d+)?', peso_metrico or '')]
+    if not numeros:
+        return 'mediano'
+    promedio = sum(numeros) / len(numeros)
+    if promedio < 10:
+        return 'pequeno'
+    if promedio < 25:
+        return 'mediano'
+    if promedio < 45:
+        return 'grande'
+    return 'gigante'
+
+
+class Command(BaseCommand):
+    help = (
+        'Precalcula la información veterinaria (Gemini) de todas las combinaciones de '
+        'especie/raza/tamaño/sexo/etapa existentes. Es reanudable: los perfiles que ya '
+        'tienen contenido vigente en cache se omiten.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--catalogo', action='store_true',
+                            help='Incluye todas las razas de TheDogAPI/TheCatAPI (macho/hembra y todas las etapas)')
+        parser.add_argument('--concurrencia', type=int, default=4, help='Llamadas simultáneas a Gemini')
+        parser.add_argument('--rpm', type=int, default=30, help='Máximo de llamadas por minuto (0 = sin límite)')
+        parser.add_argument('--limite', type=int, default=None, help='Procesa como máximo N perfiles')
+        parser.add_argument('--dry-run', action='store_true', help='Solo informa cuántas llamadas haría')
+
+    def perfiles_tabla(self):
+        filas = (
+            Pet.objects
+            .filter(Q(is_deleted=0) | Q(is_deleted__isnull=True))
+            .values('especie', 'raza', 'es_mestizo', 'tamanio', 'sexo', 'edad', 'fecha_nacimiento')
+            .distinct()
+        )
+        for fila in filas.iterator():
+            yield perfil_pet(SimpleNamespace(**fila))
+
+    def perfiles_catalogo(self):
+        etapas = [e for e in ETAPAS_VIDA if e != 'desconocida']
+        for especie, razas in (('perro', PetAPIService.get_dog_breeds()), ('gato', PetAPIService.get_cat_breeds())):
+            if not razas:
+                self.stderr.write(f'No se pudo obtener el catálogo de razas de {especie}')
+            for raza in razas:
+                tamanio = tamanio_por_peso((raza.get('weight') or {}).get('metric'))
+                for sexo in ('macho', 'hembra'):
+                    for etapa in etapas:
+                        yield {
+                            'especie': especie,
+                            'raza': raza.get('name', '').strip(),
+                            'es_mestizo': False,
+                            'tamanio': tamanio,
+                            'sexo': sexo,
+                            'etapa': etapa,
+                        }
+
+    def handle(self, *args, **options):
+        if options['concurrencia'] < 1:
+            raise CommandError('--concurrencia debe ser al menos 1')
+
+        vigentes = set(
+            InfoVetCache.objects
+            .filter(version_prompt=PROMPT_VERSION, fecha_expiracion__gt=timezone.now())
+            .values_list('huella', flat=True)
+        )
+
+        fuentes = [self.perfiles_tabla()]
+        if options['catalogo']:
+            fuentes.append(self.perfiles_catalogo())
+
+        distintos = {}
+        for fuente in fuentes:
+            for perfil in fuente:
+                if perfil['raza']:
+                    distintos.setdefault(calcular_huella(perfil), perfil)
+        pendientes = {h: p for h, p in distintos.items() if h not in vigentes}
+        total = len(distintos)
+
+        perfiles = list(pendientes.values())
+        if options['limite'] is not None:
+            perfiles = perfiles[:options['limite']]
+
+        self.stdout.write(
+            f'Perfiles distintos: {total} | ya en cache: {total - len(pendientes)} | llamadas a realizar: {len(perfiles)}'
+        )
+        if options['dry_run'] or not perfiles:
+            return
+
+        limitador = _LimitadorRPM(options['rpm'])
+
+        def calentar(perfil):
+            try:
+                limitador.esperar()
+                info = GeminiVetService.generar_y_guardar(perfil)
+                return bool(info and any(info.get(k) for k in GeminiVetService.SECCIONES))
+            finally:
+                connections.close_all()
+
+        ok = errores = 0
+        executor = ThreadPoolExecutor(max_workers=options['concurrencia'])
+        try:
+            futuros = {executor.submit(calentar, p): p for p in perfiles}
+            for i, futuro in enumerate(as_completed(futuros), start=1):
+                perfil = futuros[futuro]
+                try:
+                    exito = futuro.result()
+                except Exception as e:
+                    exito = False
+                    self.stderr.write(f'Error en {perfil["especie"]}/{perfil["raza"]}: {e}')
+                if exito:
+                    ok += 1
+                else:
+                    errores += 1
+                if i % 10 == 0 or i == len(perfiles):
+                    self.stdout.write(f'[{i}/{len(perfiles)}] ok={ok} errores={errores}')
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.stdout.write(self.style.WARNING(
+                f'Interrumpido: ok={ok} errores={errores}. Vuelve a ejecutar el comando para continuar.'
+            ))
+            return
+        executor.shutdown()
+        self.stdout.write(self.style.SUCCESS(f'Listo: ok={ok} errores={errores}'))
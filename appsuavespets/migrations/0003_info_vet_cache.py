@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appsuavespets', '0002_pet_fecha_nacimiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InfoVetCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('huella', models.CharField(max_length=64, unique=True)),
+                ('version_prompt', models.CharField(max_length=20)),
+                ('especie', models.CharField(max_length=10)),
+                ('raza', models.CharField(max_length=100)),
+                ('contenido', models.JSONField()),
+                ('fecha_creacion', models.DateTimeField()),
+                ('fecha_expiracion', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'info_vet_cache',
+                'managed': True,
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appsuavespets', '0003_info_vet_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TareaInfoVet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('huella', models.CharField(max_length=64, unique=True)),
+                ('perfil', models.JSONField()),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completada', 'Completada'), ('error', 'Error')], default='pendiente', max_length=12)),
+                ('intentos', models.IntegerField(default=0)),
+                ('ultimo_error', models.TextField(blank=True, null=True)),
+                ('disponible_desde', models.DateTimeField()),
+                ('fecha_creacion', models.DateTimeField()),
+                ('fecha_actualizacion', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'tarea_info_vet',
+                'managed': True,
+                'indexes': [models.Index(fields=['estado', 'disponible_desde'], name='tarea_info_vet_estado_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appsuavespets', '0004_tarea_info_vet'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Raza',
+            fields=[
+                ('id_raza', models.AutoField(primary_key=True, serialize=False)),
+                ('especie', models.CharField(choices=[('perro', 'Perro'), ('gato', 'Gato')], max_length=10)),
+                ('id_externo', models.CharField(max_length=50)),
+                ('nombre', models.CharField(max_length=100)),
+                ('nombre_normalizado', models.CharField(max_length=100)),
+                ('temperamento', models.TextField(blank=True, null=True)),
+                ('origen', models.CharField(blank=True, max_length=100, null=True)),
+                ('descripcion', models.TextField(blank=True, null=True)),
+                ('peso', models.CharField(blank=True, max_length=50, null=True)),
+                ('esperanza_vida', models.CharField(blank=True, max_length=50, null=True)),
+                ('grupo', models.CharField(blank=True, max_length=100, null=True)),
+                ('imagen_url', models.URLField(blank=True, max_length=500, null=True)),
+                ('fecha_actualizacion', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'raza',
+                'managed': True,
+                'indexes': [models.Index(fields=['especie', 'nombre_normalizado'], name='raza_especie_nombre_idx')],
+                'unique_together': {('especie', 'id_externo')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:53
+
+import appsuavespets.services.almacenamiento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appsuavespets', '0005_raza'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContenidoArchivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('huella', models.CharField(max_length=64, unique=True)),
+                ('ruta', models.CharField(max_length=255, unique=True)),
+                ('tamanio', models.BigIntegerField()),
+                ('referencias', models.IntegerField(default=0)),
+                ('subidas', models.IntegerField(default=0)),
+                ('fecha_creacion', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'contenido_archivo',
+                'managed': True,
+            },
+        ),
+        migrations.AlterField(
+            model_name='pet',
+            name='foto_url',
+            field=models.ImageField(blank=True, null=True, storage=appsuavespets.services.almacenamiento.almacenamiento_deduplicado, upload_to='pets/'),
+        ),
+    ]
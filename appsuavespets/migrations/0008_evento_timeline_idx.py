@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appsuavespets', '0007_archivo_adjunto_estado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventoclinico',
+            index=models.Index(fields=['id_pet', '-fecha_evento', '-fecha_registro', '-id_eventoclinico'], name='evento_timeline_idx'),
+        ),
+    ]
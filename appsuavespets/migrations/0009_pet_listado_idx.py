@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appsuavespets', '0008_evento_timeline_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['responsable', 'id_pet'], name='pet_responsable_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['especie', 'id_pet'], name='pet_especie_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['tamanio', 'id_pet'], name='pet_tamanio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['raza', 'id_pet'], name='pet_raza_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appsuavespets', '0009_pet_listado_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cuidados',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='eventoclinico',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='pet',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['responsable', 'fecha_actualizacion'], name='pet_actualizacion_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def indexar_sesiones_activas(apps, schema_editor):
+    # Única vez que se decodifican todas las sesiones: las activas al migrar quedan en el índice
+    from django.contrib.sessions.backends.db import SessionStore
+
+    Session = apps.get_model('sessions', 'Session')
+    Usuario = apps.get_model('appsuavespets', 'Usuario')
+    SesionUsuario = apps.get_model('appsuavespets', 'SesionUsuario')
+    usuarios = set(Usuario.objects.values_list('id_usuario', flat=True))
+    decodificador = SessionStore()
+    filas = []
+    for clave, datos in Session.objects.filter(expire_date__gte=timezone.now()).values_list(
+        'session_key', 'session_data',
+    ).iterator():
+        id_usuario = decodificador.decode(datos).get('_auth_user_id')
+        if id_usuario and id_usuario.isdigit() and int(id_usuario) in usuarios:
+            filas.append(SesionUsuario(session_id=clave, usuario_id=int(id_usuario)))
+    SesionUsuario.objects.bulk_create(filas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appsuavespets', '0010_fecha_actualizacion'),
+        ('sessions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SesionUsuario',
+            fields=[
+                ('session', models.OneToOneField(db_column='session_key', on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='sessions.session')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(db_column='id_usuario', on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'sesion_usuario',
+                'managed': True,
+            },
+        ),
+        migrations.RunPython(indexar_sesiones_activas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appsuavespets', '0011_sesion_usuario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorCoalescencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('espacio', models.CharField(max_length=50)),
+                ('tipo', models.CharField(max_length=20)),
+                ('total', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'contador_coalescencia',
+                'managed': True,
+                'unique_together': {('espacio', 'tipo')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:31
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appsuavespets', '0012_contador_coalescencia'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='raza',
+            name='raza_especie_nombre_idx',
+        ),
+        migrations.RemoveField(
+            model_name='raza',
+            name='nombre_normalizado',
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:00
+
+import datetime
+
+import django.utils.timezone
+from django.db import migrations, models
+
+FECHA_REGISTRO_DESCONOCIDA = datetime.datetime(1900, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def completar_fecha_registro(apps, schema_editor):
+    # El timeline trataba NULL como la fecha más antigua: el mismo valor conserva el orden
+    EventoClinico = apps.get_model('appsuavespets', 'EventoClinico')
+    EventoClinico.objects.filter(fecha_registro__isnull=True).update(fecha_registro=FECHA_REGISTRO_DESCONOCIDA)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appsuavespets', '0013_quitar_raza_nombre_normalizado'),
+    ]
+
+    operations = [
+        migrations.RunPython(completar_fecha_registro, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='eventoclinico',
+            name='fecha_registro',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
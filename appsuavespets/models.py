@@ -7,10 +7,30 @@
 # Feel free to rename the models, but don't rename db_table values or field names.
 
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.contrib.sessions.models import Session
 from django.db import models
+from django.utils import timezone
+import datetime
+
+from appsuavespets.services.almacenamiento import almacenamiento_deduplicado
+from appsuavespets.services.imagenes import derivados_listos, ruta_derivado
+
+
+class ConFechaActualizacionQuerySet(models.QuerySet):
+    """update() no pasa por auto_now: aquí también se marca fecha_actualizacion"""
+
+    def update(self, **kwargs):
+        kwargs.setdefault('fecha_actualizacion', timezone.now())
+        return super().update(**kwargs)
 
 
 class ArchivoAdjunto(models.Model):
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('listo', 'Listo'),
+        ('error', 'Error'),
+    ]
+
     id_archivo = models.AutoField(primary_key=True)
     id_eventoclinico = models.ForeignKey('EventoClinico', models.DO_NOTHING, blank=True, null=True)
     archivo_url = models.CharField(max_length=255)
@@ -18,11 +38,25 @@ class ArchivoAdjunto(models.Model):
     fecha_subida = models.DateTimeField()
     subido_por = models.ForeignKey('Usuario', models.DO_NOTHING, blank=True, null=True)
     is_deleted = models.IntegerField()
+    # Las fotos se guardan después del commit (services/adjuntos.py)
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default='listo')
 
     class Meta:
         managed = True
         db_table = 'archivo_adjunto'
 
+    @property
+    def url(self):
+        if self.estado != 'listo' or not self.archivo_url:
+            return None
+        return almacenamiento_deduplicado().url(self.archivo_url)
+
+    @property
+    def url_miniatura(self):
+        if self.url and derivados_listos(self.archivo_url):
+            return almacenamiento_deduplicado().url(ruta_derivado(self.archivo_url, 'card', 'jpg'))
+        return self.url
+
 
 class Auditoria(models.Model):
     id_auditoria = models.BigAutoField(primary_key=True)
@@ -39,6 +73,32 @@ class Auditoria(models.Model):
         db_table = 'auditoria'
 
 
+class ContadorCoalescencia(models.Model):
+    """Contador sumado entre workers: coalescencia y circuit breaker (ver services/contadores.py)"""
+    espacio = models.CharField(max_length=50)
+    tipo = models.CharField(max_length=20)
+    total = models.BigIntegerField(default=0)
+
+    class Meta:
+        managed = True
+        db_table = 'contador_coalescencia'
+        unique_together = (('espacio', 'tipo'),)
+
+
+class ContenidoArchivo(models.Model):
+    """Archivo guardado una sola vez por su hash (ver services/almacenamiento.py)"""
+    huella = models.CharField(max_length=64, unique=True)
+    ruta = models.CharField(max_length=255, unique=True)
+    tamanio = models.BigIntegerField()
+    referencias = models.IntegerField(default=0)
+    subidas = models.IntegerField(default=0)
+    fecha_creacion = models.DateTimeField()
+
+    class Meta:
+        managed = True
+        db_table = 'contenido_archivo'
+
+
 class Cuidados(models.Model):
     id_cuidado = models.AutoField(primary_key=True)
     id_pet = models.ForeignKey('Pet', models.DO_NOTHING, db_column='id_pet')
@@ -46,6 +106,9 @@ class Cuidados(models.Model):
     fecha_proxima = models.DateField()
     dosis = models.CharField(max_length=120, blank=True, null=True)
     is_deleted = models.IntegerField(blank=True, null=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = ConFechaActualizacionQuerySet.as_manager()
 
     class Meta:
         managed = True
@@ -54,6 +117,9 @@ class Cuidados(models.Model):
 
 
 class EventoClinico(models.Model):
+    # Valor que recibieron los eventos antiguos sin fecha_registro: quedan al final del timeline de su día
+    FECHA_REGISTRO_DESCONOCIDA = datetime.datetime(1900, 1, 1, tzinfo=datetime.timezone.utc)
+
     id_eventoclinico = models.AutoField(primary_key=True)
     id_pet = models.ForeignKey('Pet', models.DO_NOTHING, db_column='id_pet')
     id_usuario_responsable = models.ForeignKey('Usuario', models.DO_NOTHING, db_column='id_usuario_responsable')
@@ -63,12 +129,38 @@ class EventoClinico(models.Model):
     descripcion_evento = models.TextField(blank=True, null=True)
     estado_preconsulta = models.CharField(max_length=30, blank=True, null=True)
     observaciones = models.TextField(blank=True, null=True)
-    fecha_registro = models.DateTimeField(blank=True, null=True)
+    # NOT NULL para que evento_timeline_idx sirva al ORDER BY del timeline tal cual
+    fecha_registro = models.DateTimeField(default=timezone.now)
     is_deleted = models.IntegerField(blank=True, null=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = ConFechaActualizacionQuerySet.as_manager()
+
+    @property
+    def fecha_registro_conocida(self):
+        return self.fecha_registro != self.FECHA_REGISTRO_DESCONOCIDA
 
     class Meta:
         managed = True
         db_table = 'evento_clinico'
+        indexes = [
+            models.Index(fields=['id_pet', '-fecha_evento', '-fecha_registro', '-id_eventoclinico'], name='evento_timeline_idx'),
+        ]
+
+
+class InfoVetCache(models.Model):
+    """Información veterinaria generada por IA, compartida por todas las mascotas con la misma huella"""
+    huella = models.CharField(max_length=64, unique=True)
+    version_prompt = models.CharField(max_length=20)
+    especie = models.CharField(max_length=10)
+    raza = models.CharField(max_length=100)
+    contenido = models.JSONField()
+    fecha_creacion = models.DateTimeField()
+    fecha_expiracion = models.DateTimeField(db_index=True)
+
+    class Meta:
+        managed = True
+        db_table = 'info_vet_cache'
 
 
 class Notificacion(models.Model):
@@ -122,12 +214,24 @@ class Pet(models.Model):
     responsable = models.ForeignKey('Usuario', models.DO_NOTHING, blank=True, null=True)
     veterinario = models.ForeignKey('Usuario', models.DO_NOTHING, blank=True, null=True, related_name='pet_veterinario_set')
     is_deleted = models.IntegerField(blank=True, null=True, default=0)
-    foto_url = models.ImageField(upload_to='pets/', blank=True, null=True)
+    foto_url = models.ImageField(upload_to='pets/', storage=almacenamiento_deduplicado, blank=True, null=True)
     foto = models.URLField(blank=True, null=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    objects = ConFechaActualizacionQuerySet.as_manager()
 
     class Meta:
         managed = True
         db_table = 'pet'
+        # Listados paginados por id_pet, por responsable o con filtros de igualdad
+        indexes = [
+            models.Index(fields=['responsable', 'id_pet'], name='pet_responsable_idx'),
+            # Versión de las mascotas de un responsable (ETag del API)
+            models.Index(fields=['responsable', 'fecha_actualizacion'], name='pet_actualizacion_idx'),
+            models.Index(fields=['especie', 'id_pet'], name='pet_especie_idx'),
+            models.Index(fields=['tamanio', 'id_pet'], name='pet_tamanio_idx'),
+            models.Index(fields=['raza', 'id_pet'], name='pet_raza_idx'),
+        ]
 
 class ProductoVeterinario(models.Model):
     id_producto = models.AutoField(primary_key=True)
@@ -144,6 +248,64 @@ class ProductoVeterinario(models.Model):
         db_table = 'producto_veterinario'
 
 
+class Raza(models.Model):
+    """Catálogo local de razas, sincronizado desde TheDogAPI/TheCatAPI con sync_breeds"""
+    id_raza = models.AutoField(primary_key=True)
+    especie = models.CharField(max_length=10, choices=Pet.ESPECIE_CHOICES)
+    id_externo = models.CharField(max_length=50)
+    nombre = models.CharField(max_length=100)
+    temperamento = models.TextField(blank=True, null=True)
+    origen = models.CharField(max_length=100, blank=True, null=True)
+    descripcion = models.TextField(blank=True, null=True)
+    peso = models.CharField(max_length=50, blank=True, null=True)
+    esperanza_vida = models.CharField(max_length=50, blank=True, null=True)
+    grupo = models.CharField(max_length=100, blank=True, null=True)
+    imagen_url = models.URLField(max_length=500, blank=True, null=True)
+    fecha_actualizacion = models.DateTimeField()
+
+    class Meta:
+        managed = True
+        db_table = 'raza'
+        unique_together = (('especie', 'id_externo'),)
+
+
+class SesionUsuario(models.Model):
+    """Índice usuario → sesión: permite cerrar las otras sesiones de un usuario sin decodificar django_session"""
+    session = models.OneToOneField(Session, models.CASCADE, primary_key=True, db_column='session_key')
+    usuario = models.ForeignKey('Usuario', models.CASCADE, db_column='id_usuario')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        managed = True
+        db_table = 'sesion_usuario'
+
+
+class TareaInfoVet(models.Model):
+    """Cola en base de datos para generar información veterinaria fuera del request"""
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completada', 'Completada'),
+        ('error', 'Error'),
+    ]
+
+    huella = models.CharField(max_length=64, unique=True)
+    perfil = models.JSONField()
+    estado = models.CharField(max_length=12, choices=ESTADO_CHOICES, default='pendiente')
+    intentos = models.IntegerField(default=0)
+    ultimo_error = models.TextField(blank=True, null=True)
+    disponible_desde = models.DateTimeField()
+    fecha_creacion = models.DateTimeField()
+    fecha_actualizacion = models.DateTimeField()
+
+    class Meta:
+        managed = True
+        db_table = 'tarea_info_vet'
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde'], name='tarea_info_vet_estado_idx'),
+        ]
+
+
 
 class UsuarioManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
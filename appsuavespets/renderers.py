@@ -0,0 +1,19 @@
+from rest_framework.renderers import BaseRenderer
+import orjson
+
+
+def _por_defecto(valor):
+    # Decimal, lazy strings de Django, etc.
+    return str(valor)
+
+
+class JSONRapidoRenderer(BaseRenderer):
+    """Renderer JSON con orjson para respuestas grandes (listas de mascotas)"""
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=_por_defecto, option=orjson.OPT_NON_STR_KEYS)
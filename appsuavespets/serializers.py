@@ -1,8 +1,22 @@
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from operator import itemgetter
 from rest_framework import serializers
 from .models import Usuario, Pet, ArchivoAdjunto, Notificacion, EventoClinico
+from .services.imagenes import derivados_listos, ruta_derivado
 
 
 # ------------ Pet ------------ 
+# Datos del responsable que se exponen junto a cada mascota (nunca el hash de la contraseña)
+CAMPOS_RESPONSABLE = ('id_usuario', 'nombre', 'email')
+
+
+class ResponsableSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Usuario
+        fields = CAMPOS_RESPONSABLE
+
+
 class PetSerializer(serializers.ModelSerializer):
     responsable_data = serializers.SerializerMethodField(read_only=True)
 
@@ -13,8 +27,7 @@ class PetSerializer(serializers.ModelSerializer):
     def get_responsable_data(self, obj):
         usuario = obj.responsable
         if usuario:
-            from .serializers import UsuarioSerializer
-            return UsuarioSerializer(usuario).data
+            return ResponsableSerializer(usuario).data
         return None
 
     def to_representation(self, instance):
@@ -26,11 +39,138 @@ class PetSerializer(serializers.ModelSerializer):
         return data
 
 
+# Camino rápido de la API (listado y detalle): mismo JSON que PetSerializer, armado
+# desde values() sin instanciar modelos ni fields de DRF. FormaPet decide, según
+# ?fields= y ?expand=, qué columnas se consultan y qué JOINs hacen falta.
+CAMPOS_PET = (
+    'id_pet', 'responsable_data', 'nombre_pet', 'descripcion_pet', 'especie', 'tamanio', 'raza',
+    'es_mestizo', 'sexo', 'edad', 'fecha_nacimiento', 'peso_kg', 'numero_ficha', 'alergias',
+    'is_deleted', 'foto_url', 'foto', 'fecha_actualizacion', 'responsable', 'veterinario',
+)
+# Solo se devuelven si se piden en ?fields=
+CAMPOS_OPCIONALES = ('foto_miniatura',)
+EXPANSIONES = ('responsable', 'veterinario', 'ultimos_eventos')
+ULTIMOS_EVENTOS = 3
+CAMPOS_EVENTO = ('id_eventoclinico', 'fecha_evento', 'tipo_evento', 'estado_preconsulta')
+
+
+# Mismo formato de fecha y zona horaria que PetSerializer
+_FECHA_HORA = serializers.DateTimeField()
+
+
+def _columnas_usuario(relacion):
+    return (relacion,) + tuple(f'{relacion}__{campo}' for campo in CAMPOS_RESPONSABLE)
+
+
+def _usuario(fila, relacion):
+    if fila[relacion] is None:
+        return None
+    return {campo: fila[f'{relacion}__{campo}'] for campo in CAMPOS_RESPONSABLE}
+
+
+def _url_foto(nombre):
+    return Pet._meta.get_field('foto_url').storage.url(nombre) if nombre else None
+
+
+def _miniatura(nombre):
+    if nombre and derivados_listos(nombre):
+        return _url_foto(ruta_derivado(nombre, 'thumb', 'webp'))
+    return _url_foto(nombre)
+
+
+# campo: (columnas de values() que necesita, función que arma el valor desde la fila)
+ARMADORES_PET = {
+    'responsable_data': (_columnas_usuario('responsable'), lambda fila: _usuario(fila, 'responsable')),
+    'fecha_nacimiento': (('fecha_nacimiento',), lambda fila: (
+        fila['fecha_nacimiento'].isoformat() if fila['fecha_nacimiento'] else 'Desconocida'
+    )),
+    'peso_kg': (('peso_kg',), lambda fila: str(fila['peso_kg']) if fila['peso_kg'] is not None else 'Desconocido'),
+    'fecha_actualizacion': (('fecha_actualizacion',), lambda fila: _FECHA_HORA.to_representation(fila['fecha_actualizacion'])),
+    'foto_url': (('foto_url',), lambda fila: _url_foto(fila['foto_url'])),
+    'foto_miniatura': (('foto_url',), lambda fila: _miniatura(fila['foto_url'])),
+}
+
+
+def _ultimos_eventos(ids_pet):
+    """Últimos eventos de cada mascota en una sola consulta (ROW_NUMBER por mascota)"""
+    eventos = (
+        EventoClinico.objects
+        .filter(id_pet__in=ids_pet)
+        .filter(Q(is_deleted=0) | Q(is_deleted__isnull=True))
+        .annotate(posicion=Window(
+            RowNumber(), partition_by=F('id_pet'),
+            order_by=[F('fecha_evento').desc(), F('id_eventoclinico').desc()],
+        ))
+        .filter(posicion__lte=ULTIMOS_EVENTOS)
+        .order_by('id_pet', 'posicion')
+        .values('id_pet', *CAMPOS_EVENTO)
+    )
+    por_pet = {}
+    for evento in eventos:
+        evento['fecha_evento'] = evento['fecha_evento'].isoformat()
+        por_pet.setdefault(evento.pop('id_pet'), []).append(evento)
+    return por_pet
+
+
+class FormaPet:
+    """
+    Forma de la respuesta pedida por el cliente. Sin ?fields= se devuelven todos los
+    campos de PetSerializer; id_pet siempre se incluye. Lanza ValueError si se pide
+    un campo o expansión que no existe.
+    """
+
+    def __init__(self, fields=None, expand=None):
+        campos = [c.strip() for c in (fields or '').split(',') if c.strip()] or list(CAMPOS_PET)
+        expansiones = {e.strip() for e in (expand or '').split(',') if e.strip()}
+        desconocidos = (set(campos) - set(CAMPOS_PET + CAMPOS_OPCIONALES)) | (expansiones - set(EXPANSIONES))
+        if desconocidos:
+            raise ValueError(f'Campos desconocidos: {", ".join(sorted(desconocidos))}')
+        if 'id_pet' not in campos:
+            campos.insert(0, 'id_pet')
+        self.campos = list(dict.fromkeys(campos))
+        self.expansiones = expansiones
+
+    @classmethod
+    def desde_request(cls, request):
+        return cls(request.query_params.get('fields'), request.query_params.get('expand'))
+
+    @property
+    def columnas(self):
+        columnas = {'id_pet'}
+        for campo in self.campos:
+            columnas.update(ARMADORES_PET[campo][0] if campo in ARMADORES_PET else (campo,))
+        for relacion in ('responsable', 'veterinario'):
+            if relacion in self.expansiones:
+                columnas.update(_columnas_usuario(relacion))
+        return sorted(columnas)
+
+    def serializar(self, filas):
+        """Convierte filas de Pet.objects.values(*self.columnas) en la respuesta"""
+        filas = list(filas)
+        armadores = [
+            (campo, ARMADORES_PET[campo][1] if campo in ARMADORES_PET else itemgetter(campo))
+            for campo in self.campos
+        ]
+        relaciones = [r for r in ('responsable', 'veterinario') if r in self.expansiones]
+        eventos = _ultimos_eventos([f['id_pet'] for f in filas]) if 'ultimos_eventos' in self.expansiones else None
+
+        resultado = []
+        for fila in filas:
+            item = {campo: armar(fila) for campo, armar in armadores}
+            for relacion in relaciones:
+                item[relacion] = _usuario(fila, relacion)
+            if eventos is not None:
+                item['ultimos_eventos'] = eventos.get(fila['id_pet'], [])
+            resultado.append(item)
+        return resultado
+
+
 # ------------ Usuario ------------
 class UsuarioSerializer(serializers.ModelSerializer):
     class Meta:
         model = Usuario
         fields = '__all__'
+        extra_kwargs = {'password': {'write_only': True}}
 
 
 class ArchivoAdjuntoSerializer(serializers.ModelSerializer):
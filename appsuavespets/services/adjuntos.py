@@ -0,0 +1,174 @@
+# services/adjuntos.py
+"""
+Procesamiento de las fotos de eventos clínicos fuera del request. La vista solo deja
+cada foto en un archivo temporal y crea las filas ArchivoAdjunto en estado
+'pendiente'; después del commit un pool de threads guarda las fotos en paralelo
+(almacenamiento deduplicado), genera sus miniaturas y las marca como 'listo'.
+
+El temporal de cada foto queda en ARCHIVOS_TEMPORALES_DIR/adjuntos/<id_archivo>, así
+si el proceso se cae antes de terminar, el comando recuperar_adjuntos lo reintenta.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.db import connections, transaction
+from django.utils import timezone
+import datetime
+import logging
+import os
+import tempfile
+import time
+
+from appsuavespets.models import ArchivoAdjunto
+from appsuavespets.services.almacenamiento import almacenamiento
+from appsuavespets.services.imagenes import generar_derivados
+
+logger = logging.getLogger(__name__)
+
+_procesador = ThreadPoolExecutor(max_workers=4, thread_name_prefix='adjuntos')
+
+
+def _carpeta_temporal():
+    carpeta = os.path.join(settings.ARCHIVOS_TEMPORALES_DIR, 'adjuntos')
+    os.makedirs(carpeta, exist_ok=True)
+    return carpeta
+
+
+class FotoPendiente:
+    """Copia de una foto subida que sobrevive al cierre del request"""
+
+    def __init__(self, foto):
+        self.nombre = foto.name
+        descriptor, self.ruta = tempfile.mkstemp(prefix='subida-', dir=_carpeta_temporal())
+        os.close(descriptor)
+        if hasattr(foto, 'temporary_file_path'):
+            # Subidas grandes: Django ya las dejó en disco, basta con moverlas
+            file_move_safe(foto.temporary_file_path(), self.ruta, allow_overwrite=True)
+        else:
+            with open(self.ruta, 'wb') as destino:
+                for bloque in foto.chunks():
+                    destino.write(bloque)
+
+    @classmethod
+    def de_archivo(cls, id_archivo, nombre):
+        """Temporal ya asignado a una fila ArchivoAdjunto, o None si no existe"""
+        ruta = os.path.join(_carpeta_temporal(), str(id_archivo))
+        if not os.path.exists(ruta):
+            return None
+        pendiente = cls.__new__(cls)
+        pendiente.nombre, pendiente.ruta = os.path.basename(nombre), ruta
+        return pendiente
+
+    def asignar(self, id_archivo):
+        # El nombre del temporal pasa a ser el id de su fila
+        ruta = os.path.join(os.path.dirname(self.ruta), str(id_archivo))
+        os.replace(self.ruta, ruta)
+        self.ruta = ruta
+
+    def guardar(self, nombre):
+        with open(self.ruta, 'rb') as origen:
+            return almacenamiento.save(nombre, File(origen, name=self.nombre))
+
+    def descartar(self):
+        try:
+            os.remove(self.ruta)
+        except FileNotFoundError:
+            pass
+
+
+def procesar_adjunto(id_archivo, nombre, pendiente):
+    """Guarda la foto de una fila 'pendiente' y genera sus miniaturas; devuelve si quedó lista"""
+    try:
+        ruta = pendiente.guardar(nombre)
+        ArchivoAdjunto.objects.filter(pk=id_archivo).update(archivo_url=ruta, estado='listo')
+    except Exception as e:
+        logger.error(f'No se pudo guardar el adjunto {id_archivo}: {e}')
+        ArchivoAdjunto.objects.filter(pk=id_archivo).update(estado='error')
+        return False
+    finally:
+        pendiente.descartar()
+
+    try:
+        generar_derivados(ruta)
+    except Exception as e:
+        logger.warning(f'No se pudieron generar miniaturas del adjunto {id_archivo}: {e}')
+    return True
+
+
+def _procesar(id_archivo, nombre, pendiente):
+    try:
+        procesar_adjunto(id_archivo, nombre, pendiente)
+    finally:
+        connections.close_all()
+
+
+def registrar_adjuntos(evento, pendientes, usuario):
+    """
+    Crea las filas ArchivoAdjunto del evento en un solo INSERT (estado 'pendiente') y
+    programa su procesamiento en paralelo para cuando se confirme la transacción.
+    """
+    ahora = timezone.now()
+    # Mientras está pendiente, archivo_url guarda el nombre con que se va a guardar la foto
+    nombres = [
+        f'eventos_clinicos/{evento.id_eventoclinico}_{i}_{pendiente.nombre}'
+        for i, pendiente in enumerate(pendientes)
+    ]
+    archivos = ArchivoAdjunto.objects.bulk_create([
+        ArchivoAdjunto(
+            id_eventoclinico=evento,
+            archivo_url=nombre,
+            descripcion=f'Foto {i + 1} del evento',
+            fecha_subida=ahora,
+            subido_por=usuario,
+            is_deleted=0,
+            estado='pendiente',
+        )
+        for i, nombre in enumerate(nombres)
+    ])
+    if archivos and archivos[0].pk is None:
+        # MySQL no devuelve los ids de bulk_create; el evento es nuevo, así que son todos sus adjuntos
+        ids = ArchivoAdjunto.objects.filter(id_eventoclinico=evento).order_by('pk').values_list('pk', flat=True)
+        for archivo, pk in zip(archivos, ids):
+            archivo.pk = pk
+
+    for archivo, pendiente in zip(archivos, pendientes):
+        pendiente.asignar(archivo.pk)
+    trabajos = list(zip([archivo.pk for archivo in archivos], nombres, pendientes))
+    transaction.on_commit(lambda: [_procesador.submit(_procesar, *trabajo) for trabajo in trabajos])
+    return archivos
+
+
+def recuperar_pendientes(minutos=30):
+    """
+    Retoma los adjuntos que quedaron 'pendiente' por más de `minutos` (el proceso se
+    cayó antes de guardarlos): los guarda si su temporal sigue en disco o los marca
+    'error' si no. Borra además los temporales de esa antigüedad que ya no tienen fila
+    pendiente (subidas de requests que fallaron). Devuelve (listos, con_error, borrados).
+    """
+    limite = timezone.now() - datetime.timedelta(minutes=minutos)
+    listos = con_error = 0
+    atascados = ArchivoAdjunto.objects.filter(estado='pendiente', fecha_subida__lt=limite)
+    for id_archivo, nombre in atascados.values_list('pk', 'archivo_url').iterator():
+        pendiente = FotoPendiente.de_archivo(id_archivo, nombre)
+        if pendiente is not None and procesar_adjunto(id_archivo, nombre, pendiente):
+            listos += 1
+            continue
+        if pendiente is None:
+            logger.error(f'El adjunto {id_archivo} quedó pendiente y su temporal ya no existe')
+            ArchivoAdjunto.objects.filter(pk=id_archivo, estado='pendiente').update(estado='error')
+        con_error += 1
+
+    carpeta = _carpeta_temporal()
+    en_uso = {str(pk) for pk in ArchivoAdjunto.objects.filter(estado='pendiente').values_list('pk', flat=True)}
+    antiguedad = time.time() - minutos * 60
+    borrados = 0
+    for entrada in os.scandir(carpeta):
+        if entrada.name in en_uso or entrada.stat().st_mtime >= antiguedad:
+            continue
+        try:
+            os.remove(entrada.path)
+            borrados += 1
+        except FileNotFoundError:
+            pass
+    return listos, con_error, borrados
@@ -0,0 +1,220 @@
+# services/almacenamiento.py
+"""
+Almacenamiento direccionado por contenido para las fotos de mascotas y los adjuntos
+de eventos clínicos. Cada archivo se guarda una sola vez en `blobs/ab/cd/<sha256>.<ext>`
+y la tabla ContenidoArchivo lleva cuántas referencias tiene, así volver a subir la
+misma imagen no ocupa disco.
+
+El archivo se escribe antes de que se confirme la transacción que crea su fila: si
+esa transacción se revierte queda un blob sin fila, que borrar_huerfanos() elimina
+(comando deduplicar_media --borrar-huerfanos).
+"""
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+import hashlib
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+CARPETA_BLOBS = 'blobs'
+
+
+def ruta_contenido(huella, extension):
+    """'3fa9…', '.JPG' -> 'blobs/3f/a9/3fa9….jpg'"""
+    return f'{CARPETA_BLOBS}/{huella[:2]}/{huella[2:4]}/{huella}{extension.lower()}'
+
+
+def es_contenido(nombre):
+    return bool(nombre) and nombre.startswith(f'{CARPETA_BLOBS}/')
+
+
+class AlmacenamientoDeduplicado(FileSystemStorage):
+    """
+    FileSystemStorage que ignora el nombre recibido (salvo la extensión) y guarda el
+    archivo bajo el hash de su contenido. El hash se calcula mientras se copia a un
+    temporal, sin leer el archivo dos veces.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre definitivo lo decide el hash en _save
+        return name
+
+    def _escribir_temporal(self, content):
+        # Fuera de MEDIA_ROOT: la copia a medio escribir no debe quedar publicada
+        carpeta = os.path.join(settings.ARCHIVOS_TEMPORALES_DIR, CARPETA_BLOBS)
+        os.makedirs(carpeta, exist_ok=True)
+        sha = hashlib.sha256()
+        tamanio = 0
+        descriptor, temporal = tempfile.mkstemp(dir=carpeta)
+        try:
+            with os.fdopen(descriptor, 'wb') as destino:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for bloque in content.chunks():
+                    sha.update(bloque)
+                    destino.write(bloque)
+                    tamanio += len(bloque)
+        except BaseException:
+            os.remove(temporal)
+            raise
+        return temporal, sha.hexdigest(), tamanio
+
+    def _save(self, name, content):
+        return self._guardar(name, content, subida=True)
+
+    def guardar_existente(self, name, content):
+        """Pasa a blobs/ un archivo que ya estaba guardado: suma la referencia sin contarlo como subida"""
+        return self._guardar(name, content, subida=False)
+
+    def _guardar(self, name, content, subida):
+        temporal, huella, tamanio = self._escribir_temporal(content)
+        try:
+            # El mismo contenido subido con otra extensión reutiliza la ruta ya registrada
+            nombre = registrar_referencia(
+                huella, ruta_contenido(huella, os.path.splitext(name)[1]), tamanio, subida=subida,
+            )
+            destino = self.path(nombre)
+            if os.path.exists(destino):
+                os.remove(temporal)
+            else:
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                file_move_safe(temporal, destino, allow_overwrite=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(destino, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        return nombre
+
+    def delete(self, name):
+        """Quita una referencia; el archivo se borra cuando ya nadie lo usa"""
+        if es_contenido(name):
+            liberar_referencia(name)
+        else:
+            super().delete(name)
+
+
+def registrar_referencia(huella, nombre, tamanio, subida=True):
+    """
+    Suma una referencia al contenido y devuelve la ruta donde está guardado. Con
+    subida=False (migraciones, copias de una fila) no cuenta para el reporte de ahorro.
+    """
+    from appsuavespets.models import ContenidoArchivo
+
+    contenidos = ContenidoArchivo.objects.filter(huella=huella)
+    sumar = {'referencias': F('referencias') + 1, 'subidas': F('subidas') + int(subida)}
+    if not contenidos.update(**sumar):
+        try:
+            with transaction.atomic():
+                ContenidoArchivo.objects.create(
+                    huella=huella, ruta=nombre, tamanio=tamanio,
+                    referencias=1, subidas=1, fecha_creacion=timezone.now(),
+                )
+            return nombre
+        except IntegrityError:
+            # Otro request subió el mismo contenido al mismo tiempo
+            contenidos.update(**sumar)
+    return contenidos.values_list('ruta', flat=True).get()
+
+
+def liberar_referencia(nombre):
+    from appsuavespets.models import ContenidoArchivo
+
+    ContenidoArchivo.objects.filter(ruta=nombre, referencias__gt=0).update(referencias=F('referencias') - 1)
+    transaction.on_commit(lambda: _borrar_si_huerfano(nombre))
+
+
+def _borrar_archivos(nombre):
+    """Borra un blob y sus derivados"""
+    from appsuavespets.services.imagenes import FORMATOS, TAMANIOS, ruta_derivado
+
+    rutas = [nombre] + [ruta_derivado(nombre, t, f) for t in TAMANIOS for f in FORMATOS]
+    for ruta in rutas:
+        try:
+            os.remove(almacenamiento.path(ruta))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f'No se pudo borrar {ruta}: {e}')
+
+
+def _borrar_si_huerfano(nombre):
+    from appsuavespets.models import ContenidoArchivo
+
+    # Los archivos se borran antes del commit, con la fila eliminada aún bloqueada: una subida
+    # del mismo contenido espera en registrar_referencia y, al no encontrarla, lo vuelve a escribir
+    with transaction.atomic():
+        borrados, _ = ContenidoArchivo.objects.filter(ruta=nombre, referencias=0).delete()
+        if borrados:
+            _borrar_archivos(nombre)
+
+
+def borrar_huerfanos(minutos=60):
+    """
+    Borra los blobs sin fila ContenidoArchivo con más de `minutos` de antigüedad (subidas
+    cuya transacción se revirtió). Devuelve cuántos borró.
+    """
+    from appsuavespets.models import ContenidoArchivo
+    from appsuavespets.services.imagenes import es_derivado
+
+    raiz = almacenamiento.path(CARPETA_BLOBS)
+    limite = time.time() - minutos * 60
+    borrados = 0
+    for carpeta, _, archivos in os.walk(raiz):
+        for archivo in archivos:
+            ruta = os.path.join(carpeta, archivo)
+            nombre = os.path.relpath(ruta, almacenamiento.location).replace(os.sep, '/')
+            if es_derivado(nombre) or os.path.getmtime(ruta) >= limite:
+                continue
+            huella = os.path.splitext(archivo)[0]
+            if ContenidoArchivo.objects.filter(huella=huella).exists():
+                continue
+            try:
+                with transaction.atomic():
+                    # Una fila sin referencias hace esperar a una subida simultánea del mismo
+                    # contenido mientras se borra el archivo, igual que en _borrar_si_huerfano
+                    ContenidoArchivo.objects.create(
+                        huella=huella, ruta=nombre, tamanio=0,
+                        referencias=0, subidas=0, fecha_creacion=timezone.now(),
+                    )
+                    _borrar_archivos(nombre)
+                    ContenidoArchivo.objects.filter(huella=huella).delete()
+            except IntegrityError:
+                # La misma imagen se acaba de volver a subir
+                continue
+            borrados += 1
+    return borrados
+
+
+def reporte_ahorro():
+    """Totales de la deduplicación: bytes guardados en disco frente a bytes subidos"""
+    from appsuavespets.models import ContenidoArchivo
+
+    archivos = almacenados = subidos = 0
+    for tamanio, subidas in ContenidoArchivo.objects.values_list('tamanio', 'subidas').iterator():
+        archivos += 1
+        almacenados += tamanio
+        subidos += tamanio * subidas
+    return {
+        'archivos': archivos,
+        'bytes_almacenados': almacenados,
+        'bytes_subidos': subidos,
+        'bytes_ahorrados': subidos - almacenados,
+    }
+
+
+# Sin argumentos sigue a MEDIA_ROOT/MEDIA_URL, igual que default_storage
+almacenamiento = AlmacenamientoDeduplicado()
+
+
+def almacenamiento_deduplicado():
+    # Callable para FileField(storage=...): las migraciones guardan la referencia, no la instancia
+    return almacenamiento
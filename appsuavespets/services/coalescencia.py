@@ -0,0 +1,137 @@
+# services/coalescencia.py
+"""
+Coalescencia de llamadas ("single-flight"): si varios requests piden a la vez el mismo
+resultado costoso, solo uno llama al servicio externo y el resto espera su resultado.
+
+- Dentro de un proceso se coordina con threading.Event.
+- Entre workers de gunicorn se coordina con un lock en la cache 'coordinacion'
+  (cache.add es atómico), y el resultado se publica en esa misma cache. Solo
+  se publican los resultados exitosos: si el líder falla, los demás reintentan.
+  Los que esperan consultan la cache con intervalos crecientes (hasta ESPERA_MAX_SONDEO).
+- Los contadores de estadisticas() se suman con services/contadores.py.
+"""
+from django.core.cache import caches
+import logging
+import threading
+import time
+import uuid
+
+from appsuavespets.services import contadores
+
+logger = logging.getLogger(__name__)
+
+ALIAS_CACHE = 'coordinacion'
+_SIN_RESULTADO = '__sin_resultado__'
+ESPERA_MIN_SONDEO = 0.05
+ESPERA_MAX_SONDEO = 1.0
+
+_vuelos_locales = {}
+_vuelos_lock = threading.Lock()
+_contadores_locales = {}
+
+
+class _Vuelo:
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+def _cache():
+    return caches[ALIAS_CACHE]
+
+
+def _siguiente_sondeo(espera):
+    return min(espera * 2, ESPERA_MAX_SONDEO)
+
+
+def _contar(espacio, tipo):
+    clave_local = (espacio, tipo)
+    with _vuelos_lock:
+        _contadores_locales[clave_local] = _contadores_locales.get(clave_local, 0) + 1
+    contadores.sumar(espacio, tipo)
+
+
+def estadisticas(espacio):
+    """Llamadas ejecutadas y ahorradas para un espacio (todos los workers)"""
+    try:
+        valores = contadores.leer(espacio)
+        return {'ejecutadas': valores.get('ejecutadas', 0), 'ahorradas': valores.get('ahorradas', 0)}
+    except Exception:
+        return {
+            'ejecutadas': _contadores_locales.get((espacio, 'ejecutadas'), 0),
+            'ahorradas': _contadores_locales.get((espacio, 'ahorradas'), 0),
+        }
+
+
+def single_flight(espacio, clave, funcion, ttl_lock=60, espera_max=45, ttl_resultado=60, exitoso=bool):
+    """
+    Ejecuta `funcion()` una sola vez para (espacio, clave) entre llamadores concurrentes.
+    Los demás reciben el mismo resultado si `exitoso(resultado)`; si no, o si `funcion`
+    lanza una excepción (que se propaga al llamador que la ejecutó), lo reintentan por su cuenta.
+    """
+    id_local = (espacio, clave)
+    with _vuelos_lock:
+        vuelo = _vuelos_locales.get(id_local)
+        lider = vuelo is None
+        if lider:
+            vuelo = _Vuelo()
+            _vuelos_locales[id_local] = vuelo
+
+    if not lider:
+        # Otro thread de este proceso ya está calculando el mismo resultado
+        if vuelo.evento.wait(espera_max) and vuelo.error is None and exitoso(vuelo.resultado):
+            _contar(espacio, 'ahorradas')
+            return vuelo.resultado
+        return funcion()
+
+    try:
+        vuelo.resultado = _vuelo_distribuido(espacio, clave, funcion, ttl_lock, espera_max, ttl_resultado, exitoso)
+        return vuelo.resultado
+    except Exception as e:
+        vuelo.error = e
+        raise
+    finally:
+        vuelo.evento.set()
+        with _vuelos_lock:
+            _vuelos_locales.pop(id_local, None)
+
+
+def _vuelo_distribuido(espacio, clave, funcion, ttl_lock, espera_max, ttl_resultado, exitoso):
+    clave_lock = f'sf:{espacio}:lock:{clave}'
+    clave_resultado = f'sf:{espacio}:resultado:{clave}'
+    token = uuid.uuid4().hex
+    try:
+        cache = _cache()
+        adquirido = cache.add(clave_lock, token, ttl_lock)
+    except Exception as e:
+        # Sin cache compartida disponible: degradar a llamada directa
+        logger.warning('Coalescencia deshabilitada para %s: %s', espacio, e)
+        _contar(espacio, 'ejecutadas')
+        return funcion()
+
+    limite = time.monotonic() + espera_max
+    espera = ESPERA_MIN_SONDEO
+    while not adquirido:
+        resultado = cache.get(clave_resultado, _SIN_RESULTADO)
+        if resultado != _SIN_RESULTADO:
+            _contar(espacio, 'ahorradas')
+            logger.info('Coalescencia %s: llamada ahorrada (%s)', espacio, clave)
+            return resultado
+        if time.monotonic() >= limite:
+            logger.warning('Coalescencia %s: espera agotada para %s, ejecutando directo', espacio, clave)
+            break
+        time.sleep(espera)
+        espera = _siguiente_sondeo(espera)
+        # Si el líder falló y liberó el lock, intentar tomarlo
+        adquirido = cache.add(clave_lock, token, ttl_lock)
+
+    _contar(espacio, 'ejecutadas')
+    try:
+        resultado = funcion()
+        if adquirido and exitoso(resultado):
+            cache.set(clave_resultado, resultado, ttl_resultado)
+        return resultado
+    finally:
+        if adquirido and cache.get(clave_lock) == token:
+            cache.delete(clave_lock)
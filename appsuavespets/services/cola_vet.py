@@ -0,0 +1,207 @@
+# services/cola_vet.py
+from django.db.models import F, Q
+from django.utils import timezone
+import datetime
+import logging
+
+from appsuavespets.services.gemini_client import cliente_gemini
+from appsuavespets.services.gemini_service import GeminiVetService, calcular_huella
+
+logger = logging.getLogger(__name__)
+
+MAX_INTENTOS = 3
+# Una tarea "procesando" sin cambios en este tiempo se considera abandonada (worker caído)
+TIEMPO_ABANDONO = datetime.timedelta(minutes=10)
+
+
+def _nueva_tarea(perfil, ahora):
+    return {
+        'perfil': perfil,
+        'estado': 'pendiente',
+        'disponible_desde': ahora,
+        'fecha_creacion': ahora,
+        'fecha_actualizacion': ahora,
+    }
+
+
+def _reintento(perfil, ahora):
+    return {'estado': 'pendiente', 'intentos': 0, 'perfil': perfil, 'disponible_desde': ahora, 'fecha_actualizacion': ahora}
+
+
+def encolar_info(perfil):
+    """Encola la generación de información para un perfil (idempotente por huella)"""
+    from appsuavespets.models import TareaInfoVet
+
+    ahora = timezone.now()
+    tarea, creada = TareaInfoVet.objects.get_or_create(
+        huella=calcular_huella(perfil), defaults=_nueva_tarea(perfil, ahora),
+    )
+    if not creada and tarea.estado in ('completada', 'error'):
+        # El contenido expiró o falló antes: volver a intentarlo
+        TareaInfoVet.objects.filter(pk=tarea.pk, estado=tarea.estado).update(**_reintento(perfil, ahora))
+        tarea.estado = 'pendiente'
+    return tarea
+
+
+async def aencolar_info(perfil):
+    """Versión asíncrona de encolar_info (ORM async de Django)"""
+    from appsuavespets.models import TareaInfoVet
+
+    ahora = timezone.now()
+    tarea, creada = await TareaInfoVet.objects.aget_or_create(
+        huella=calcular_huella(perfil), defaults=_nueva_tarea(perfil, ahora),
+    )
+    if not creada and tarea.estado in ('completada', 'error'):
+        await TareaInfoVet.objects.filter(pk=tarea.pk, estado=tarea.estado).aupdate(**_reintento(perfil, ahora))
+        tarea.estado = 'pendiente'
+    return tarea
+
+
+def info_o_encolar(perfil):
+    """
+    (info, pendiente) para mostrar un perfil: el contenido en cache o, si aún no está,
+    el contenido por especie mientras el worker genera el definitivo.
+    """
+    info = GeminiVetService.obtener_cache(perfil)
+    if info is not None:
+        return info, False
+    try:
+        encolar_info(perfil)
+        pendiente = True
+    except Exception as e:
+        logger.error(f'No se pudo encolar información veterinaria: {e}')
+        pendiente = False
+    return GeminiVetService.info_fallback(perfil['especie']), pendiente
+
+
+async def ainfo_o_encolar(perfil):
+    """Versión asíncrona de info_o_encolar"""
+    info = await GeminiVetService.obtener_cache_async(perfil)
+    if info is not None:
+        return info, False
+    try:
+        await aencolar_info(perfil)
+        pendiente = True
+    except Exception as e:
+        logger.error(f'No se pudo encolar información veterinaria: {e}')
+        pendiente = False
+    return GeminiVetService.info_fallback(perfil['especie']), pendiente
+
+
+def estado_tarea(perfil):
+    """Estado de la tarea de un perfil, o None si nunca se encoló"""
+    from appsuavespets.models import TareaInfoVet
+
+    return (
+        TareaInfoVet.objects
+        .filter(huella=calcular_huella(perfil))
+        .values_list('estado', flat=True)
+        .first()
+    )
+
+
+def tomar_siguiente():
+    """
+    Reserva la siguiente tarea disponible. La reserva es un UPDATE condicionado al
+    estado anterior, así varios workers pueden consumir la cola sin tomar la misma tarea.
+    """
+    from appsuavespets.models import TareaInfoVet
+
+    ahora = timezone.now()
+    disponibles = (
+        TareaInfoVet.objects
+        .filter(
+            Q(estado='pendiente', disponible_desde__lte=ahora)
+            | Q(estado='procesando', fecha_actualizacion__lt=ahora - TIEMPO_ABANDONO)
+        )
+        .order_by('disponible_desde')
+        .values_list('pk', 'estado')[:10]
+    )
+    for pk, estado in disponibles:
+        tomada = TareaInfoVet.objects.filter(pk=pk, estado=estado).update(
+            estado='procesando', intentos=F('intentos') + 1, fecha_actualizacion=ahora,
+        )
+        if tomada:
+            return TareaInfoVet.objects.get(pk=pk)
+    return None
+
+
+def reservar_tarea(perfil):
+    """
+    Reserva la tarea de un perfil para generarla fuera del worker (streaming SSE).
+    Devuelve la tarea reservada, o None si otro proceso ya la está generando.
+    """
+    from appsuavespets.models import TareaInfoVet
+
+    tarea = encolar_info(perfil)
+    ahora = timezone.now()
+    tomada = (
+        TareaInfoVet.objects
+        .filter(pk=tarea.pk)
+        .filter(Q(estado='pendiente') | Q(estado='procesando', fecha_actualizacion__lt=ahora - TIEMPO_ABANDONO))
+        .update(estado='procesando', intentos=F('intentos') + 1, fecha_actualizacion=ahora)
+    )
+    return tarea if tomada else None
+
+
+def completar_tarea(tarea):
+    from appsuavespets.models import TareaInfoVet
+
+    TareaInfoVet.objects.filter(pk=tarea.pk).update(
+        estado='completada', ultimo_error=None, fecha_actualizacion=timezone.now(),
+    )
+
+
+def liberar_tarea(tarea, error):
+    """Devuelve una tarea reservada a la cola para que la procese el worker"""
+    from appsuavespets.models import TareaInfoVet
+
+    ahora = timezone.now()
+    TareaInfoVet.objects.filter(pk=tarea.pk).update(
+        estado='pendiente', ultimo_error=str(error)[:1000],
+        disponible_desde=ahora, fecha_actualizacion=ahora,
+    )
+
+
+def procesar_tarea(tarea):
+    """Genera el contenido de una tarea y lo guarda en la cache"""
+    from appsuavespets.models import TareaInfoVet
+
+    perfil = tarea.perfil
+    ahora = timezone.now()
+    try:
+        if GeminiVetService.obtener_cache(perfil) is None:
+            info = GeminiVetService.generar_y_guardar(perfil)
+            if not info or not any(info.get(k) for k in GeminiVetService.SECCIONES):
+                raise ValueError('Gemini no devolvió contenido')
+        TareaInfoVet.objects.filter(pk=tarea.pk).update(
+            estado='completada', ultimo_error=None, fecha_actualizacion=ahora,
+        )
+        return True
+    except Exception as e:
+        logger.warning('Tarea info vet %s falló (intento %s): %s', tarea.pk, tarea.intentos, e)
+        if tarea.intentos >= MAX_INTENTOS:
+            cambios = {'estado': 'error'}
+        else:
+            # Reintento con espera creciente: 30s, 60s, ...
+            espera = datetime.timedelta(seconds=30 * tarea.intentos)
+            cambios = {'estado': 'pendiente', 'disponible_desde': ahora + espera}
+        TareaInfoVet.objects.filter(pk=tarea.pk).update(
+            ultimo_error=str(e)[:1000], fecha_actualizacion=ahora, **cambios,
+        )
+        return False
+
+
+def procesar_pendientes(limite=None):
+    """Procesa tareas hasta vaciar la cola (o hasta `limite`). Devuelve cuántas procesó."""
+    procesadas = 0
+    while limite is None or procesadas < limite:
+        if not cliente_gemini.disponible():
+            # Circuito abierto: no consumir intentos mientras Gemini está en enfriamiento
+            break
+        tarea = tomar_siguiente()
+        if tarea is None:
+            break
+        procesar_tarea(tarea)
+        procesadas += 1
+    return procesadas
@@ -0,0 +1,35 @@
+# services/contadores.py
+"""
+Contadores compartidos entre workers (coalescencia de llamadas, transiciones del
+circuit breaker de Gemini). Cada suma es un UPDATE ... SET total = total + 1, atómico
+en la base de datos; get + incr de DatabaseCache no lo es.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def sumar(espacio, tipo):
+    """Suma 1 al contador (espacio, tipo); un error de base de datos solo se registra"""
+    from appsuavespets.models import ContadorCoalescencia
+
+    try:
+        contadores = ContadorCoalescencia.objects.filter(espacio=espacio, tipo=tipo)
+        if not contadores.update(total=F('total') + 1):
+            try:
+                with transaction.atomic():
+                    ContadorCoalescencia.objects.create(espacio=espacio, tipo=tipo, total=1)
+            except IntegrityError:
+                # Otro worker creó el contador al mismo tiempo
+                contadores.update(total=F('total') + 1)
+    except Exception as e:
+        logger.debug('No se pudo actualizar el contador %s:%s: %s', espacio, tipo, e)
+
+
+def leer(espacio):
+    """{tipo: total} de un espacio"""
+    from appsuavespets.models import ContadorCoalescencia
+
+    return dict(ContadorCoalescencia.objects.filter(espacio=espacio).values_list('tipo', 'total'))
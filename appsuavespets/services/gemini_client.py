@@ -0,0 +1,222 @@
+# services/gemini_client.py
+"""
+Cliente de Gemini compartido por todo el proceso: configura la API una sola vez,
+reutiliza el modelo, aplica un plazo por llamada, reintenta con backoff y corta
+las llamadas con un circuit breaker cuando el servicio falla de forma repetida.
+"""
+from django.conf import settings
+from google.api_core import exceptions as google_exceptions
+import google.generativeai as genai
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from appsuavespets.services import contadores
+
+logger = logging.getLogger(__name__)
+
+ERRORES_REINTENTABLES = (
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    TimeoutError,
+    ConnectionError,
+)
+
+
+class CircuitoAbierto(Exception):
+    """Gemini está en enfriamiento tras fallos repetidos; usar contenido estático"""
+
+
+class CircuitBreaker:
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMIABIERTO = 'semiabierto'
+
+    def __init__(self, nombre, umbral, enfriamiento):
+        self.nombre = nombre
+        self.umbral = umbral
+        self.enfriamiento = enfriamiento
+        self.estado = self.CERRADO
+        self.fallos_consecutivos = 0
+        self.abierto_desde = 0.0
+        self.prueba_en_curso = False
+        self.transiciones = {self.CERRADO: 0, self.ABIERTO: 0, self.SEMIABIERTO: 0}
+        self.rechazadas = 0
+        self._lock = threading.Lock()
+
+    def _cambiar(self, estado):
+        """Cambia de estado (con el lock tomado) y devuelve el estado para registrarlo después"""
+        anterior, self.estado = self.estado, estado
+        self.transiciones[estado] += 1
+        if estado == self.ABIERTO:
+            logger.warning('Circuito %s: %s -> %s (%s fallos seguidos)', self.nombre, anterior, estado, self.fallos_consecutivos)
+        else:
+            logger.info('Circuito %s: %s -> %s', self.nombre, anterior, estado)
+        return estado
+
+    def _registrar(self, transicion):
+        # Fuera del lock: los demás threads no esperan el UPDATE del contador compartido
+        if transicion is not None:
+            contadores.sumar(f'circuito:{self.nombre}', transicion)
+
+    def permitir(self):
+        """Indica si se puede intentar una llamada (en semiabierto solo una de prueba)"""
+        transicion = None
+        with self._lock:
+            permitida = True
+            if self.estado == self.ABIERTO:
+                if time.monotonic() - self.abierto_desde < self.enfriamiento:
+                    self.rechazadas += 1
+                    return False
+                transicion = self._cambiar(self.SEMIABIERTO)
+            if self.estado == self.SEMIABIERTO:
+                if self.prueba_en_curso:
+                    self.rechazadas += 1
+                    permitida = False
+                else:
+                    self.prueba_en_curso = True
+        self._registrar(transicion)
+        return permitida
+
+    def disponible(self):
+        """Como permitir(), pero sin reservar la llamada de prueba"""
+        with self._lock:
+            if self.estado == self.ABIERTO:
+                return time.monotonic() - self.abierto_desde >= self.enfriamiento
+            return not (self.estado == self.SEMIABIERTO and self.prueba_en_curso)
+
+    def registrar_exito(self):
+        transicion = None
+        with self._lock:
+            self.fallos_consecutivos = 0
+            self.prueba_en_curso = False
+            if self.estado != self.CERRADO:
+                transicion = self._cambiar(self.CERRADO)
+        self._registrar(transicion)
+
+    def registrar_fallo(self):
+        transicion = None
+        with self._lock:
+            self.fallos_consecutivos += 1
+            self.prueba_en_curso = False
+            if self.estado == self.SEMIABIERTO or (
+                self.estado == self.CERRADO and self.fallos_consecutivos >= self.umbral
+            ):
+                self.abierto_desde = time.monotonic()
+                transicion = self._cambiar(self.ABIERTO)
+        self._registrar(transicion)
+
+    def liberar(self):
+        """
+        Libera la llamada de prueba sin contar éxito ni fallo: errores que no vienen de
+        la API (un bug propio, el cliente SSE que se desconecta)
+        """
+        with self._lock:
+            self.prueba_en_curso = False
+
+    def metricas(self):
+        with self._lock:
+            return {
+                'estado': self.estado,
+                'fallos_consecutivos': self.fallos_consecutivos,
+                'rechazadas': self.rechazadas,
+                'transiciones': dict(self.transiciones),
+            }
+
+
+class ClienteGemini:
+    """Modelo configurado una vez por proceso, con plazo, reintentos y circuit breaker"""
+
+    def __init__(self):
+        self._modelo = None
+        self._lock = threading.Lock()
+        self.circuito = CircuitBreaker(
+            'gemini',
+            umbral=settings.GEMINI_CIRCUITO_UMBRAL,
+            enfriamiento=settings.GEMINI_CIRCUITO_ENFRIAMIENTO,
+        )
+
+    @property
+    def modelo(self):
+        if self._modelo is None:
+            with self._lock:
+                if self._modelo is None:
+                    genai.configure(api_key=settings.GEMINI_API_KEY)
+                    self._modelo = genai.GenerativeModel(settings.GEMINI_MODELO)
+        return self._modelo
+
+    def disponible(self):
+        return self.circuito.disponible()
+
+    def generar(self, prompt, **kwargs):
+        """
+        Llama a generate_content respetando GEMINI_TIMEOUT como plazo total (incluidos
+        los reintentos). Lanza CircuitoAbierto si el circuito no permite la llamada.
+        """
+        if not self.circuito.permitir():
+            raise CircuitoAbierto('Gemini en enfriamiento')
+
+        limite = time.monotonic() + settings.GEMINI_TIMEOUT
+        intento = 0
+        while True:
+            restante = limite - time.monotonic()
+            try:
+                if restante <= 0:
+                    raise TimeoutError('Plazo de Gemini agotado')
+                respuesta = self.modelo.generate_content(
+                    prompt, request_options={'timeout': restante}, **kwargs
+                )
+                self.circuito.registrar_exito()
+                return respuesta
+            except ERRORES_REINTENTABLES as e:
+                espera = self._espera(intento)
+                if intento >= settings.GEMINI_REINTENTOS or time.monotonic() + espera >= limite:
+                    self.circuito.registrar_fallo()
+                    raise
+                logger.info('Gemini: reintento %s tras error %s', intento + 1, e)
+                time.sleep(espera)
+                intento += 1
+            except google_exceptions.GoogleAPICallError:
+                # Credenciales inválidas, InvalidArgument...: no se arreglan reintentando y deben abrir el circuito
+                self.circuito.registrar_fallo()
+                raise
+            except Exception:
+                self.circuito.liberar()
+                raise
+
+    async def generar_stream_async(self, prompt, **kwargs):
+        """
+        Genera en modo streaming y entrega el texto de cada fragmento a medida que llega.
+        Sin reintentos (el contenido parcial ya pudo enviarse al cliente); el plazo total
+        es GEMINI_STREAM_TIMEOUT.
+        """
+        if not self.circuito.permitir():
+            raise CircuitoAbierto('Gemini en enfriamiento')
+        try:
+            async with asyncio.timeout(settings.GEMINI_STREAM_TIMEOUT):
+                respuesta = await self.modelo.generate_content_async(
+                    prompt, stream=True, request_options={'timeout': settings.GEMINI_TIMEOUT}, **kwargs
+                )
+                async for fragmento in respuesta:
+                    yield fragmento.text
+        except (*ERRORES_REINTENTABLES, google_exceptions.GoogleAPICallError):
+            self.circuito.registrar_fallo()
+            raise
+        except BaseException:
+            self.circuito.liberar()
+            raise
+        else:
+            self.circuito.registrar_exito()
+
+    @staticmethod
+    def _espera(intento):
+        """Backoff exponencial con jitter completo: 0..(0.5 * 2^intento) segundos"""
+        return random.uniform(0, 0.5 * (2 ** intento))
+
+
+cliente_gemini = ClienteGemini()
@@ -1,137 +1,493 @@
 # services/gemini_service.py
-import google.generativeai as genai
 from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+import datetime
+import hashlib
+import json
 import logging
+import unicodedata
+
+from appsuavespets.services.coalescencia import single_flight
+from appsuavespets.services.gemini_client import CircuitoAbierto, cliente_gemini
 
 logger = logging.getLogger(__name__)
 
+# Incrementar cuando cambie el prompt o el formato de respuesta: invalida todas las entradas previas
+PROMPT_VERSION = 'v2'
+
+# Campos de Pet que determinan el contenido generado
+CAMPOS_HUELLA = ('especie', 'raza', 'es_mestizo', 'tamanio', 'sexo', 'edad', 'fecha_nacimiento')
+
+ETAPAS_VIDA = {
+    'cachorro': 'Cachorro (menos de 1 año)',
+    'joven': 'Joven (1 a 2 años)',
+    'adulto': 'Adulto (3 a 6 años)',
+    'senior': 'Senior (7 años o más)',
+    'desconocida': 'No especificada',
+}
+
+
+def normalizar_texto(valor):
+    """Minúsculas, sin acentos y sin espacios repetidos"""
+    texto = unicodedata.normalize('NFKD', str(valor or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def etapa_vida(edad=None, fecha_nacimiento=None):
+    """Agrupa la edad en etapas para que mascotas similares compartan contenido"""
+    if fecha_nacimiento:
+        edad = (datetime.date.today() - fecha_nacimiento).days // 365
+    if edad is None or edad == '':
+        return 'desconocida'
+    edad = int(edad)
+    if edad < 1:
+        return 'cachorro'
+    if edad <= 2:
+        return 'joven'
+    if edad <= 6:
+        return 'adulto'
+    return 'senior'
+
+
+def perfil_pet(pet):
+    """Atributos de la mascota que influyen en la información generada"""
+    es_mestizo = bool(pet.es_mestizo)
+    return {
+        'especie': normalizar_texto(pet.especie),
+        'raza': 'Mestizo' if es_mestizo else (pet.raza or '').strip(),
+        'es_mestizo': es_mestizo,
+        'tamanio': normalizar_texto(pet.tamanio),
+        'sexo': normalizar_texto(pet.sexo),
+        'etapa': etapa_vida(pet.edad, pet.fecha_nacimiento),
+    }
+
+
+def calcular_huella(perfil):
+    """Huella estable del perfil (incluye la versión del prompt)"""
+    partes = [
+        PROMPT_VERSION,
+        perfil['especie'],
+        'mestizo' if perfil['es_mestizo'] else normalizar_texto(perfil['raza']),
+        perfil['tamanio'],
+        perfil['sexo'],
+        perfil['etapa'],
+    ]
+    return hashlib.sha256('|'.join(partes).encode('utf-8')).hexdigest()
+
+
+ENCABEZADOS = {
+    'ENFERMEDADES': 'enfermedades',
+    'ALIMENTOS_PROHIBIDOS': 'alimentos_prohibidos',
+    'CUIDADOS': 'cuidados',
+    'ESTUDIOS': 'estudios',
+    'REFERENCIAS': 'referencias',
+}
+
+_ESQUEMA_ITEM = {
+    'type': 'object',
+    'properties': {'titulo': {'type': 'string'}, 'detalle': {'type': 'string'}},
+    'required': ['titulo'],
+}
+ESQUEMA_RESPUESTA = {
+    'type': 'object',
+    'properties': {seccion: {'type': 'array', 'items': _ESQUEMA_ITEM} for seccion in ENCABEZADOS.values()},
+    'required': list(ENCABEZADOS.values()),
+}
+
+
+def item_desde_linea(linea):
+    """'- Parvovirus: descripción' -> {'titulo': 'Parvovirus', 'detalle': 'descripción'}"""
+    linea = linea.strip().lstrip('-*•').strip().replace('**', '')
+    titulo, separador, detalle = linea.partition(': ')
+    if not separador or len(titulo) > 80:
+        return {'titulo': linea, 'detalle': ''}
+    return {'titulo': titulo.strip(), 'detalle': detalle.strip()}
+
+
+def items_desde_texto(texto):
+    return [item_desde_linea(l) for l in (texto or '').splitlines() if l.strip().lstrip('-*•').strip()]
+
+
+class ParserSecciones:
+    """
+    Parser incremental por encabezados: recibe el texto en fragmentos (streaming) y
+    devuelve cada sección en cuanto se cierra, es decir, cuando aparece el siguiente
+    encabezado o al llamar a cerrar().
+    """
+
+    def __init__(self):
+        self.info = {seccion: [] for seccion in ENCABEZADOS.values()}
+        self.actual = None
+        self._pendiente = ''
+
+    def _linea(self, linea):
+        """Procesa una línea; devuelve la sección que se cerró, si la hubo"""
+        limpia = linea.strip().strip('*#').strip()
+        encabezado = limpia.rstrip(':').strip().upper()
+        if limpia.endswith(':') and encabezado in ENCABEZADOS:
+            cerrada, self.actual = self.actual, ENCABEZADOS[encabezado]
+            return cerrada
+        if self.actual and limpia:
+            self.info[self.actual].append(item_desde_linea(linea))
+        return None
+
+    def alimentar(self, fragmento):
+        """Agrega texto y devuelve la lista de secciones cerradas por este fragmento"""
+        *lineas, self._pendiente = (self._pendiente + (fragmento or '')).split('\n')
+        return [cerrada for cerrada in map(self._linea, lineas) if cerrada]
+
+    def cerrar(self):
+        """Procesa el resto del texto y devuelve las secciones que quedaban abiertas"""
+        cerradas = [self._linea(self._pendiente)] if self._pendiente else []
+        self._pendiente = ''
+        cerradas.append(self.actual)
+        self.actual = None
+        return [cerrada for cerrada in cerradas if cerrada]
+
+
+def parsear_texto(texto):
+    """Parser de respaldo: recorre el texto una sola vez separando por encabezados"""
+    parser = ParserSecciones()
+    parser.alimentar(texto)
+    parser.cerrar()
+    return parser.info
+
+
+def parsear_respuesta(texto):
+    """Interpreta la respuesta JSON; si el modelo ignoró el esquema usa el parser de texto"""
+    try:
+        datos = json.loads(texto)
+    except (TypeError, ValueError):
+        return parsear_texto(texto)
+    if not isinstance(datos, dict):
+        return parsear_texto(texto)
+
+    info = {}
+    for seccion in ENCABEZADOS.values():
+        valor = datos.get(seccion)
+        if isinstance(valor, str):
+            # Sección como texto con viñetas en lugar de lista
+            info[seccion] = items_desde_texto(valor)
+            continue
+        items = []
+        for item in valor if isinstance(valor, list) else []:
+            if isinstance(item, dict) and str(item.get('titulo') or '').strip():
+                items.append({'titulo': str(item['titulo']).strip(), 'detalle': str(item.get('detalle') or '').strip()})
+            elif isinstance(item, str) and item.strip():
+                items.append(item_desde_linea(item))
+        info[seccion] = items
+    return info
+
+
 class GeminiVetService:
     """Servicio para obtener información veterinaria con Gemini"""
 
+    SECCIONES = ('enfermedades', 'alimentos_prohibidos', 'cuidados', 'estudios', 'referencias')
+
+    @staticmethod
+    def _clave_memoria(huella):
+        return f'vet_info:{huella}'
+
+    @staticmethod
+    def obtener_cache(perfil):
+        """Busca el contenido en la cache en memoria y luego en la base de datos"""
+        from appsuavespets.models import InfoVetCache
+
+        huella = calcular_huella(perfil)
+        clave = GeminiVetService._clave_memoria(huella)
+        info = cache.get(clave)
+        if info is not None:
+            return info
+
+        entrada = (
+            InfoVetCache.objects
+            .filter(huella=huella, version_prompt=PROMPT_VERSION, fecha_expiracion__gt=timezone.now())
+            .only('contenido')
+            .first()
+        )
+        if entrada is None:
+            return None
+        cache.set(clave, entrada.contenido, settings.GEMINI_CACHE_MEMORIA_TTL)
+        return entrada.contenido
+
+    @staticmethod
+    async def obtener_cache_async(perfil):
+        """Versión asíncrona de obtener_cache (ORM async de Django)"""
+        from appsuavespets.models import InfoVetCache
+
+        huella = calcular_huella(perfil)
+        clave = GeminiVetService._clave_memoria(huella)
+        info = await cache.aget(clave)
+        if info is not None:
+            return info
+
+        entrada = await (
+            InfoVetCache.objects
+            .filter(huella=huella, version_prompt=PROMPT_VERSION, fecha_expiracion__gt=timezone.now())
+            .only('contenido')
+            .afirst()
+        )
+        if entrada is None:
+            return None
+        await cache.aset(clave, entrada.contenido, settings.GEMINI_CACHE_MEMORIA_TTL)
+        return entrada.contenido
+
+    @staticmethod
+    def guardar_cache(perfil, info):
+        """Persiste el contenido generado en ambas capas de cache"""
+        from appsuavespets.models import InfoVetCache
+
+        huella = calcular_huella(perfil)
+        ahora = timezone.now()
+        InfoVetCache.objects.update_or_create(
+            huella=huella,
+            defaults={
+                'version_prompt': PROMPT_VERSION,
+                'especie': perfil['especie'],
+                'raza': perfil['raza'][:100],
+                'contenido': info,
+                'fecha_creacion': ahora,
+                'fecha_expiracion': ahora + datetime.timedelta(seconds=settings.GEMINI_CACHE_TTL),
+            },
+        )
+        cache.set(GeminiVetService._clave_memoria(huella), info, settings.GEMINI_CACHE_MEMORIA_TTL)
+
+    @staticmethod
+    async def guardar_cache_async(perfil, info):
+        """Versión asíncrona de guardar_cache"""
+        from appsuavespets.models import InfoVetCache
+
+        huella = calcular_huella(perfil)
+        ahora = timezone.now()
+        await InfoVetCache.objects.aupdate_or_create(
+            huella=huella,
+            defaults={
+                'version_prompt': PROMPT_VERSION,
+                'especie': perfil['especie'],
+                'raza': perfil['raza'][:100],
+                'contenido': info,
+                'fecha_creacion': ahora,
+                'fecha_expiracion': ahora + datetime.timedelta(seconds=settings.GEMINI_CACHE_TTL),
+            },
+        )
+        await cache.aset(GeminiVetService._clave_memoria(huella), info, settings.GEMINI_CACHE_MEMORIA_TTL)
+
+    @staticmethod
+    def invalidar(perfil):
+        """Elimina el contenido asociado a un perfil en ambas capas"""
+        from appsuavespets.models import InfoVetCache
+
+        huella = calcular_huella(perfil)
+        cache.delete(GeminiVetService._clave_memoria(huella))
+        InfoVetCache.objects.filter(huella=huella).delete()
+
+    @staticmethod
+    def invalidar_si_huerfana(perfil, excluir_pet_id=None):
+        """
+        Invalida la huella de un perfil si ya ninguna mascota activa la usa
+        (por ejemplo, tras editar la raza o el tamaño de la única mascota con ese perfil)
+        """
+        from appsuavespets.models import Pet
+        from django.db.models import Q
+
+        # Especie y tamaño son choices y se filtran en SQL; la raza admite acentos y espacios
+        # variados, así que se compara en Python con la misma normalización que la huella
+        candidatas = (
+            Pet.objects
+            .filter(Q(is_deleted=0) | Q(is_deleted__isnull=True))
+            .filter(especie__iexact=perfil['especie'], tamanio__iexact=perfil['tamanio'], es_mestizo=perfil['es_mestizo'])
+            .only(*CAMPOS_HUELLA)
+        )
+        if excluir_pet_id is not None:
+            candidatas = candidatas.exclude(pk=excluir_pet_id)
+
+        huella = calcular_huella(perfil)
+        if any(calcular_huella(perfil_pet(p)) == huella for p in candidatas.iterator()):
+            return False
+        GeminiVetService.invalidar(perfil)
+        return True
+
+    @staticmethod
+    def info_fallback(especie):
+        """Contenido estático por especie cuando no hay información generada (mismo formato que Gemini)"""
+        especie = (especie or '').lower()
+        if especie == 'perro':
+            textos = {
+                'enfermedades': '- Parvovirus: prevenir con calendario de vacunas\n- Moquillo: vacunación y controles regulares\n- Tos de las perreras: evitar contagios en guarderías\n- Leptospirosis: evitar aguas estancadas y mantener vacunación\n- Otitis: revisar y limpiar orejas periódicamente',
+                'alimentos_prohibidos': '- Chocolate: puede causar problemas serios\n- Uvas y pasas: pueden afectar los riñones\n- Cebolla y ajo: pueden alterar la sangre\n- Alcohol: nocivo para su salud\n- Xilitol: puede bajar el azúcar peligrosamente',
+                'cuidados': '- Vacunas y desparasitación al día\n- Higiene dental mensual\n- Ejercicio diario acorde al tamaño\n- Protección contra parásitos externos\n- Controles veterinarios cada 6-12 meses',
+                'estudios': '- Hemograma anual en adultos\n- Radiografías si hay cojera\n- Perfil renal/hepático en mayores de 7 años',
+                'referencias': '- AVMA. (2015). Preventive Care.\n- WSAVA. (2020). Vaccination Guidelines.'
+            }
+        elif especie == 'gato':
+            textos = {
+                'enfermedades': '- Panleucopenia: prevenir con vacunación completa\n- Rinotraqueitis: medidas de higiene y vacunas\n- Gingivitis: higiene dental y controles\n- Obesidad: alimentación adecuada y juego diario\n- Enfermedad renal crónica: monitoreo especialmente en mayores',
+                'alimentos_prohibidos': '- Chocolate: puede afectar su salud\n- Cebolla y ajo: pueden alterar la sangre\n- Lácteos: suelen causar molestias digestivas\n- Atún crudo: puede causar déficit de vitaminas\n- Huesos: riesgo de lesiones',
+                'cuidados': '- Vacunación core y refuerzos\n- Enriquecimiento ambiental diario\n- Higiene dental y dieta adecuada\n- Control de parásitos internos/externos',
+                'estudios': '- Hemograma y bioquímica anual\n- Estudios cardíacos si hay soplo\n- Uroanálisis desde los 7 años',
+                'referencias': '- AAFP. (2018). Feline Preventive Care.\n- ISFM. (2019). Senior Cat Guidelines.'
+            }
+        else:
+            textos = {
+                'enfermedades': '- Enfermedades comunes según especie\n- Consulta profesional recomendada',
+                'alimentos_prohibidos': '- Evitar tóxicos conocidos\n- Dieta específica por especie',
+                'cuidados': '- Calendario de vacunas y desparasitación\n- Controles periódicos',
+                'estudios': '- Pruebas recomendadas según edad, basadas en evidencia desde 2005 en adelante',
+                'referencias': '- Guías veterinarias generales.'
+            }
+        return {seccion: items_desde_texto(texto) for seccion, texto in textos.items()}
+
     @staticmethod
     def get_pet_health_info(pet):
         """
-        Obtiene información de salud personalizada según la raza
+        Obtiene información de salud personalizada según la raza.
+        El resultado se reutiliza entre mascotas con la misma huella.
         """
-        try:
-            # Configurar clave API
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            
-            # Seleccionar modelo Gemini
-            model = genai.GenerativeModel('gemini-2.0-flash-exp')
-            
-            # Preparar contexto según si es mestizo o no
-            if pet.es_mestizo:
-                contexto_raza = f"""
-                IMPORTANTE: Este {pet.especie} es MESTIZO (mezcla de razas).
-                
-                Los perros y gatos mestizos generalmente presentan:
-                - **Vigor híbrido**: Mayor resistencia genética a enfermedades hereditarias
-                - Menos problemas congénitos que razas puras
-                - Mayor diversidad genética = mejor salud general
-                - Menor predisposición a enfermedades específicas de raza
-                
-                Enfócate en cuidados generales para {pet.especie}s mestizos y menciona el vigor híbrido.
-                """
-            else:
-                contexto_raza = f"""
-                Este {pet.especie} es de raza: {pet.raza}
-                
-                Proporciona información ESPECÍFICA para la raza {pet.raza}, incluyendo:
-                - Enfermedades hereditarias y predisposiciones específicas de esta raza
-                - Problemas de salud comunes en {pet.raza}
-                - Cuidados especiales que requiere esta raza en particular
-                """
-            
-            prompt = f"""
-            Eres un veterinario enfocado en prevención y educación. Proporciona información clara y comprensible para personas sin formación veterinaria. Evita lenguaje alarmista (no uses expresiones como "alta mortalidad" o "letal") y prioriza consejos prácticos y señales de alerta comunes. Proporciona información de salud para:
-            
-            {contexto_raza}
-            
-            **Datos adicionales:**
-            - Especie: {pet.especie}
-            - Tamaño: {pet.tamanio}
-            - Edad: {pet.edad if pet.edad else 'No especificada'}
-            - Sexo: {pet.sexo}
-            
-            Proporciona la siguiente información en formato de lista simple con viñetas (-), con tono preventivo y amigable:
-            
-            1. **ENFERMEDADES COMUNES** (5-7 enfermedades específicas)
-            2. **ALIMENTOS PROHIBIDOS** (lista de alimentos tóxicos)
-            3. **CUIDADOS PREVENTIVOS** (vacunas, desparasitación, higiene)
-            4. **ESTUDIOS RECOMENDADOS** (chequeos y exámenes según edad; prioriza evidencia desde 2005 en adelante)
-            5. **REFERENCIAS BIBLIOGRÁFICAS** (3-4 referencias de revistas veterinarias del 2005 en adelante)
-            
+        perfil = perfil_pet(pet)
+        info = GeminiVetService.obtener_cache(perfil)
+        if info is not None:
+            return info
+        return GeminiVetService.generar_y_guardar(perfil)
+
+    @staticmethod
+    def generar_y_guardar(perfil):
+        """
+        Genera y guarda el contenido de un perfil. Llamadas concurrentes con la misma
+        huella (en cualquier worker) comparten una única llamada a Gemini.
+        """
+        def _completo(info):
+            return bool(info) and any(info.get(k) for k in GeminiVetService.SECCIONES)
+
+        def _generar():
+            # Otro llamador pudo completarlo mientras esperábamos el lock
+            info = GeminiVetService.obtener_cache(perfil)
+            if info is not None:
+                return info
+            info = GeminiVetService.generar_info(perfil)
+            if _completo(info):
+                try:
+                    GeminiVetService.guardar_cache(perfil, info)
+                except Exception as e:
+                    logger.error(f'Error guardando cache de Gemini: {e}')
+            return info
+
+        return single_flight('gemini', calcular_huella(perfil), _generar, ttl_lock=90, espera_max=60, exitoso=_completo)
+
+    @staticmethod
+    def construir_prompt(perfil, formato='json'):
+        """Prompt para el perfil; `formato` es 'json' (respuesta estructurada) o 'texto' (encabezados)"""
+        especie = perfil['especie']
+        raza = perfil['raza']
+
+        # Preparar contexto según si es mestizo o no
+        if perfil['es_mestizo']:
+            contexto_raza = f"""
+            IMPORTANTE: Este {especie} es MESTIZO (mezcla de razas).
+
+            Los perros y gatos mestizos generalmente presentan:
+            - **Vigor híbrido**: Mayor resistencia genética a enfermedades hereditarias
+            - Menos problemas congénitos que razas puras
+            - Mayor diversidad genética = mejor salud general
+            - Menor predisposición a enfermedades específicas de raza
+
+            Enfócate en cuidados generales para {especie}s mestizos y menciona el vigor híbrido.
+            """
+        else:
+            contexto_raza = f"""
+            Este {especie} es de raza: {raza}
+
+            Proporciona información ESPECÍFICA para la raza {raza}, incluyendo:
+            - Enfermedades hereditarias y predisposiciones específicas de esta raza
+            - Problemas de salud comunes en {raza}
+            - Cuidados especiales que requiere esta raza en particular
+            """
+
+        if formato == 'json':
+            formato_respuesta = """
+            **FORMATO DE RESPUESTA:** un objeto JSON con las claves enfermedades, alimentos_prohibidos,
+            cuidados, estudios y referencias. Cada clave contiene una lista de objetos con "titulo"
+            (nombre corto) y "detalle" (descripción, razón o cuándo y por qué). En referencias usa la
+            cita completa "Autor(es). (Año). Título. Revista." como titulo y deja detalle vacío.
+            """
+        else:
+            formato_respuesta = """
             **FORMATO DE RESPUESTA (usa exactamente este formato):**
-            
+
             ENFERMEDADES:
             - Enfermedad 1: breve descripción
             - Enfermedad 2: breve descripción
             (etc.)
-            
+
             ALIMENTOS_PROHIBIDOS:
             - Alimento 1: razón
             - Alimento 2: razón
             (etc.)
-            
+
             CUIDADOS:
             - Cuidado 1: descripción
             - Cuidado 2: descripción
             (etc.)
-            
+
             ESTUDIOS:
             - Estudio 1: cuándo y por qué
             - Estudio 2: cuándo y por qué
             (etc.)
-            
+
             REFERENCIAS:
             - Autor(es). (Año). Título. Revista.
             - Autor(es). (Año). Título. Revista.
             (etc.)
-            
-            Usa lenguaje profesional pero comprensible. Sé específico y práctico. Evita generar alarma innecesaria y destaca medidas de prevención y cuándo consultar al veterinario.
             """
-            
-            # Generar contenido con Gemini
-            response = model.generate_content(prompt)
-            texto = response.text
-            
-            # Parsear respuesta para extraer secciones
-            info = {
-                'enfermedades': '',
-                'alimentos_prohibidos': '',
-                'cuidados': '',
-                'estudios': '',
-                'referencias': ''
-            }
-            
-            if 'ENFERMEDADES:' in texto:
-                start = texto.find('ENFERMEDADES:') + len('ENFERMEDADES:')
-                end = texto.find('ALIMENTOS_PROHIBIDOS:')
-                info['enfermedades'] = texto[start:end].strip()
-            
-            if 'ALIMENTOS_PROHIBIDOS:' in texto:
-                start = texto.find('ALIMENTOS_PROHIBIDOS:') + len('ALIMENTOS_PROHIBIDOS:')
-                end = texto.find('CUIDADOS:')
-                info['alimentos_prohibidos'] = texto[start:end].strip()
-            
-            if 'CUIDADOS:' in texto:
-                start = texto.find('CUIDADOS:') + len('CUIDADOS:')
-                end = texto.find('ESTUDIOS:')
-                info['cuidados'] = texto[start:end].strip()
-            
-            if 'ESTUDIOS:' in texto:
-                start = texto.find('ESTUDIOS:') + len('ESTUDIOS:')
-                end = texto.find('REFERENCIAS:')
-                info['estudios'] = texto[start:end].strip()
-            
-            if 'REFERENCIAS:' in texto:
-                start = texto.find('REFERENCIAS:') + len('REFERENCIAS:')
-                info['referencias'] = texto[start:].strip()
-            
-            logger.info('Gemini OK: contenido generado para pet %s (%s)', pet.id_pet, pet.raza)
+
+        return f"""
+        Eres un veterinario enfocado en prevención y educación. Proporciona información clara y comprensible para personas sin formación veterinaria. Evita lenguaje alarmista (no uses expresiones como "alta mortalidad" o "letal") y prioriza consejos prácticos y señales de alerta comunes. Proporciona información de salud para:
+
+        {contexto_raza}
+
+        **Datos adicionales:**
+        - Especie: {especie}
+        - Tamaño: {perfil['tamanio']}
+        - Etapa de vida: {ETAPAS_VIDA[perfil['etapa']]}
+        - Sexo: {perfil['sexo'] or 'No especificado'}
+
+        Proporciona la siguiente información, con tono preventivo y amigable:
+
+        1. **ENFERMEDADES COMUNES** (5-7 enfermedades específicas)
+        2. **ALIMENTOS PROHIBIDOS** (lista de alimentos tóxicos)
+        3. **CUIDADOS PREVENTIVOS** (vacunas, desparasitación, higiene)
+        4. **ESTUDIOS RECOMENDADOS** (chequeos y exámenes según edad; prioriza evidencia desde 2005 en adelante)
+        5. **REFERENCIAS BIBLIOGRÁFICAS** (3-4 referencias de revistas veterinarias del 2005 en adelante)
+
+        {formato_respuesta}
+
+        Usa lenguaje profesional pero comprensible. Sé específico y práctico. Evita generar alarma innecesaria y destaca medidas de prevención y cuándo consultar al veterinario.
+        """
+
+    @staticmethod
+    def generar_info(perfil):
+        """
+        Genera la información con Gemini a partir del perfil (sin cache).
+        Devuelve {seccion: [{'titulo', 'detalle'}, ...]} o None si falla.
+        """
+        try:
+            prompt = GeminiVetService.construir_prompt(perfil, formato='json')
+
+            # Generar contenido con el cliente compartido (plazo, reintentos y circuit breaker)
+            response = cliente_gemini.generar(prompt, generation_config={
+                'response_mime_type': 'application/json',
+                'response_schema': ESQUEMA_RESPUESTA,
+            })
+            info = parsear_respuesta(response.text)
+
+            logger.info('Gemini OK: contenido generado para %s (%s)', perfil['especie'], perfil['raza'])
             return info
-        
+
+        except CircuitoAbierto:
+            logger.info('Gemini omitido: circuito abierto, se usará contenido estático')
+            return None
+
         except Exception as e:
             logger.error(f'Error en Gemini: {e}')
             return None
@@ -0,0 +1,88 @@
+# services/http_client.py
+"""
+Capa HTTP compartida para las llamadas a APIs externas: una sesión con pool de
+conexiones por host (keep-alive), reintentos con backoff solo para métodos
+idempotentes, un máximo de llamadas simultáneas por host y log de latencia.
+"""
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from urllib3.util.retry import Retry
+import logging
+import requests
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class HostSaturado(requests.RequestException):
+    """Se alcanzó el máximo de llamadas simultáneas a un host y no se liberó a tiempo"""
+
+
+class ClienteHTTP:
+    """Sesiones por host reutilizadas por todos los threads del proceso"""
+
+    def __init__(self):
+        self._sesiones = {}
+        self._semaforos = {}
+        self._lock = threading.Lock()
+
+    def _crear_sesion(self):
+        reintentos = Retry(
+            total=settings.HTTP_REINTENTOS,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adaptador = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.HTTP_MAX_CONCURRENCIA_HOST,
+            max_retries=reintentos,
+        )
+        sesion = requests.Session()
+        sesion.mount('http://', adaptador)
+        sesion.mount('https://', adaptador)
+        return sesion
+
+    def _host(self, url):
+        partes = urlsplit(url)
+        host = f'{partes.scheme}://{partes.netloc}'
+        with self._lock:
+            if host not in self._sesiones:
+                self._sesiones[host] = self._crear_sesion()
+                self._semaforos[host] = threading.BoundedSemaphore(settings.HTTP_MAX_CONCURRENCIA_HOST)
+            return host, self._sesiones[host], self._semaforos[host]
+
+    def request(self, metodo, url, timeout=None, **kwargs):
+        timeout = timeout or settings.HTTP_TIMEOUT
+        host, sesion, semaforo = self._host(url)
+        if not semaforo.acquire(timeout=timeout):
+            logger.warning('HTTP %s %s: máximo de llamadas simultáneas alcanzado', metodo, host)
+            raise HostSaturado(f'Demasiadas llamadas simultáneas a {host}')
+
+        inicio = time.monotonic()
+        estado = 'error'
+        try:
+            response = sesion.request(metodo, url, timeout=timeout, **kwargs)
+            estado = response.status_code
+            return response
+        finally:
+            semaforo.release()
+            logger.info('HTTP %s %s -> %s (%.0f ms)', metodo, url.split('?')[0], estado,
+                        (time.monotonic() - inicio) * 1000)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def cerrar(self):
+        with self._lock:
+            for sesion in self._sesiones.values():
+                sesion.close()
+            self._sesiones.clear()
+            self._semaforos.clear()
+
+
+cliente_http = ClienteHTTP()
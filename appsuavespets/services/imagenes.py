@@ -0,0 +1,150 @@
+# services/imagenes.py
+"""
+Derivados de las fotos de mascotas: tamaños fijos (thumb, card, full) en WebP y
+JPEG, guardados junto al original como `<nombre>__<tamaño>.<formato>`.
+Se generan en segundo plano después del commit y la generación es idempotente.
+
+Los derivados se escriben en el storage del campo (el almacenamiento deduplicado),
+en su ruta exacta: save() los renombraría por hash o con un sufijo al coincidir.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+import io
+import logging
+import os
+import tempfile
+
+from appsuavespets.services.almacenamiento import almacenamiento
+
+logger = logging.getLogger(__name__)
+
+# nombre: (ancho, alto, recortar). Con recortar=False la imagen entra en la caja sin deformarse
+TAMANIOS = {
+    'thumb': (160, 160, True),
+    'card': (480, 360, False),
+    'full': (1200, 1200, False),
+}
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+SEPARADOR = '__'
+
+_generador = ThreadPoolExecutor(max_workers=2, thread_name_prefix='imagenes')
+
+# Se envía con `nombre` cuando se escribieron derivados nuevos de una foto
+derivados_generados = Signal()
+
+
+def es_derivado(nombre):
+    raiz = os.path.splitext(os.path.basename(nombre))[0]
+    return any(raiz.endswith(f'{SEPARADOR}{tamanio}') for tamanio in TAMANIOS)
+
+
+def ruta_derivado(nombre, tamanio, formato):
+    """'pets/firulais.jpg' -> 'pets/firulais__card.webp'"""
+    raiz = os.path.splitext(nombre)[0]
+    return f'{raiz}{SEPARADOR}{tamanio}.{formato}'
+
+
+def _clave_lista(nombre):
+    return f'derivados:{nombre}'
+
+
+def derivados_listos(nombre, storage=almacenamiento):
+    """Indica si ya existen todos los derivados (el último que se genera es full.jpg)"""
+    if not nombre:
+        return False
+    if cache.get(_clave_lista(nombre)):
+        return True
+    listo = storage.exists(ruta_derivado(nombre, 'full', 'jpg'))
+    if listo:
+        cache.set(_clave_lista(nombre), True, 60 * 60 * 24)
+    return listo
+
+
+def _redimensionar(imagen, ancho, alto, recortar):
+    if recortar:
+        return ImageOps.fit(imagen, (ancho, alto), Image.LANCZOS)
+    copia = imagen.copy()
+    copia.thumbnail((ancho, alto), Image.LANCZOS)
+    return copia
+
+
+def _escribir(storage, ruta, datos):
+    """Escribe en la ruta exacta reemplazando el archivo anterior; nunca queda uno a medio escribir"""
+    destino = storage.path(ruta)
+    carpeta = os.path.dirname(destino)
+    os.makedirs(carpeta, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=carpeta, prefix='.derivado-')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(datos)
+        if storage.file_permissions_mode is not None:
+            os.chmod(temporal, storage.file_permissions_mode)
+        # os.replace es atómico: dos generaciones simultáneas dejan el mismo archivo, no copias renombradas
+        os.replace(temporal, destino)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def generar_derivados(nombre, storage=almacenamiento, forzar=False):
+    """
+    Genera los derivados que falten para una foto. Devuelve cuántos archivos escribió.
+    Es seguro llamarla varias veces: los derivados existentes no se regeneran.
+    """
+    if not nombre or es_derivado(nombre):
+        return 0
+    pendientes = [
+        (tamanio, formato)
+        for tamanio in TAMANIOS
+        for formato in FORMATOS
+        if forzar or not storage.exists(ruta_derivado(nombre, tamanio, formato))
+    ]
+    if not pendientes:
+        return 0
+
+    with storage.open(nombre, 'rb') as archivo:
+        imagen = ImageOps.exif_transpose(Image.open(archivo))
+        imagen.load()
+    if imagen.mode not in ('RGB', 'RGBA'):
+        imagen = imagen.convert('RGBA' if 'transparency' in imagen.info else 'RGB')
+
+    escritos = 0
+    # full.jpg va al final: su existencia marca que el juego de derivados está completo
+    for tamanio, formato in sorted(pendientes, key=lambda p: p == ('full', 'jpg')):
+        ancho, alto, recortar = TAMANIOS[tamanio]
+        derivado = _redimensionar(imagen, ancho, alto, recortar)
+        formato_pil, opciones = FORMATOS[formato]
+        if formato_pil == 'JPEG' and derivado.mode != 'RGB':
+            fondo = Image.new('RGB', derivado.size, (255, 255, 255))
+            fondo.paste(derivado, mask=derivado.getchannel('A') if derivado.mode == 'RGBA' else None)
+            derivado = fondo
+        buffer = io.BytesIO()
+        derivado.save(buffer, formato_pil, **opciones)
+
+        _escribir(storage, ruta_derivado(nombre, tamanio, formato), buffer.getvalue())
+        escritos += 1
+    cache.delete(_clave_lista(nombre))
+    derivados_generados.send(sender=generar_derivados, nombre=nombre)
+    return escritos
+
+
+def _generar_en_segundo_plano(nombre, storage):
+    try:
+        generar_derivados(nombre, storage)
+    except Exception as e:
+        logger.error(f'No se pudieron generar derivados de {nombre}: {e}')
+    finally:
+        connections.close_all()
+
+
+def encolar_derivados(nombre, storage=almacenamiento):
+    """Programa la generación de derivados para cuando se confirme la transacción actual"""
+    if nombre and not es_derivado(nombre):
+        transaction.on_commit(lambda: _generador.submit(_generar_en_segundo_plano, nombre, storage))
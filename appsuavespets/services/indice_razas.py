@@ -0,0 +1,312 @@
+# services/indice_razas.py
+"""
+Índice en memoria del catálogo de razas, construido una vez por versión del catálogo
+(ver PetAPIService.version_catalogo) y compartido por todos los threads del proceso.
+
+- Búsqueda exacta O(1) por nombre normalizado (sin acentos ni signos), alias en
+  español y una clave aproximada que tolera errores de tipeo comunes.
+- Trie de prefijos para el autocompletado: cada nodo guarda sus mejores resultados
+  ya ordenados, así una consulta cuesta O(largo del prefijo).
+"""
+from collections import namedtuple
+import logging
+import re
+import sys
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# Resultados guardados por nodo del trie (máximo que puede pedir el autocompletado)
+LIMITE_MAX = 20
+# Cada cuánto se vuelve a consultar la versión del catálogo en la base de datos
+INTERVALO_VERIFICACION = 60
+
+RazaIndexada = namedtuple('RazaIndexada', ['id_raza', 'id_externo', 'nombre'])
+
+# Se usan mientras el catálogo local está vacío (antes del primer sync_breeds)
+RAZAS_RESPALDO = {
+    'perro': [
+        'Labrador Retriever', 'German Shepherd', 'Golden Retriever', 'Bulldog', 'Poodle', 'Beagle', 'Rottweiler',
+        'Yorkshire Terrier', 'Boxer', 'Dachshund', 'Siberian Husky', 'Chihuahua', 'Shih Tzu', 'Doberman Pinscher',
+        'Border Collie', 'Australian Shepherd', 'Pug', 'Great Dane', 'Cocker Spaniel', 'Maltese',
+    ],
+    'gato': [
+        'Persian', 'Siamese', 'Maine Coon', 'Ragdoll', 'Bengal', 'Sphynx', 'British Shorthair', 'Scottish Fold',
+        'Abyssinian', 'American Shorthair', 'Russian Blue', 'Norwegian Forest', 'Savannah', 'Bombay', 'Birman',
+        'Oriental', 'Manx', 'Chartreux', 'Turkish Angora', 'Himalayan',
+    ],
+}
+
+# Alias (nombres en español y variantes frecuentes) -> nombres posibles en el catálogo.
+# Se usa el primero que exista en la versión actual del catálogo.
+ALIAS = {
+    'perro': {
+        'pastor aleman': ('German Shepherd Dog', 'German Shepherd'),
+        'ovejero aleman': ('German Shepherd Dog', 'German Shepherd'),
+        'pastor australiano': ('Australian Shepherd',),
+        'pastor belga': ('Belgian Malinois', 'Belgian Tervuren'),
+        'labrador': ('Labrador Retriever',),
+        'golden': ('Golden Retriever',),
+        'caniche': ('Poodle', 'Standard Poodle', 'Miniature Poodle', 'Toy Poodle'),
+        'poodle': ('Poodle', 'Standard Poodle', 'Miniature Poodle', 'Toy Poodle'),
+        'bulldog ingles': ('English Bulldog', 'Bulldog'),
+        'bulldog frances': ('French Bulldog',),
+        'husky': ('Siberian Husky',),
+        'husky siberiano': ('Siberian Husky',),
+        'chiguagua': ('Chihuahua',),
+        'yorkshire': ('Yorkshire Terrier',),
+        'yorkie': ('Yorkshire Terrier',),
+        'yorki': ('Yorkshire Terrier',),
+        'doberman': ('Doberman Pinscher',),
+        'gran danes': ('Great Dane',),
+        'cocker': ('Cocker Spaniel', 'English Cocker Spaniel'),
+        'maltes': ('Maltese',),
+        'bichon maltes': ('Maltese',),
+        'salchicha': ('Dachshund',),
+        'perro salchicha': ('Dachshund',),
+        'teckel': ('Dachshund',),
+        'shitzu': ('Shih Tzu',),
+        'pitbull': ('American Pit Bull Terrier',),
+        'pit bull': ('American Pit Bull Terrier',),
+        'schnauzer': ('Miniature Schnauzer', 'Standard Schnauzer', 'Giant Schnauzer'),
+        'schnauzer miniatura': ('Miniature Schnauzer',),
+        'snauzer': ('Miniature Schnauzer', 'Standard Schnauzer', 'Giant Schnauzer'),
+        'san bernardo': ('Saint Bernard',),
+        'pomerania': ('Pomeranian',),
+        'pomerano': ('Pomeranian',),
+        'boyero de berna': ('Bernese Mountain Dog',),
+        'carlino': ('Pug',),
+        'galgo': ('Greyhound',),
+        'galgo italiano': ('Italian Greyhound',),
+        'dalmata': ('Dalmatian',),
+        'samoyedo': ('Samoyed',),
+        'bigle': ('Beagle',),
+        'bobtail': ('Old English Sheepdog',),
+        'shar pei': ('Chinese Shar-Pei', 'Shar Pei'),
+        'sharpei': ('Chinese Shar-Pei', 'Shar Pei'),
+    },
+    'gato': {
+        'persa': ('Persian',),
+        'siames': ('Siamese',),
+        'azul ruso': ('Russian Blue',),
+        'bosque de noruega': ('Norwegian Forest Cat', 'Norwegian Forest'),
+        'noruego de bosque': ('Norwegian Forest Cat', 'Norwegian Forest'),
+        'britanico de pelo corto': ('British Shorthair',),
+        'britanico': ('British Shorthair',),
+        'americano de pelo corto': ('American Shorthair',),
+        'exotico de pelo corto': ('Exotic Shorthair',),
+        'esfinge': ('Sphynx',),
+        'sphinx': ('Sphynx',),
+        'esfinx': ('Sphynx',),
+        'bengali': ('Bengal',),
+        'bengala': ('Bengal',),
+        'abisinio': ('Abyssinian',),
+        'birmano': ('Birman',),
+        'sagrado de birmania': ('Birman',),
+        'angora turco': ('Turkish Angora',),
+        'angora': ('Turkish Angora',),
+        'van turco': ('Turkish Van',),
+        'himalayo': ('Himalayan',),
+        'main coon': ('Maine Coon',),
+        'fold escoces': ('Scottish Fold',),
+        'scottish': ('Scottish Fold',),
+        'cartujo': ('Chartreux',),
+        'siberiano': ('Siberian',),
+        'ragdol': ('Ragdoll',),
+    },
+}
+
+
+def normalizar_nombre(texto):
+    """'Pastor Alemán' -> 'pastor aleman' (sin acentos, signos ni espacios repetidos)"""
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', texto).split())
+
+
+def clave_aproximada(normalizado):
+    """Clave tolerante a errores típicos: 'rotweiler' y 'rottweiler' comparten clave"""
+    texto = normalizado.replace(' ', '').replace('h', '')
+    texto = texto.translate(str.maketrans({'y': 'i', 'k': 'c', 'q': 'c', 'z': 's', 'w': 'v'}))
+    return re.sub(r'(.)\1+', r'\1', texto)
+
+
+class _Nodo:
+    __slots__ = ('hijos', 'top')
+
+    def __init__(self):
+        self.hijos = None
+        self.top = ()
+
+
+class IndiceRazas:
+    """Índice de una especie para una versión concreta del catálogo"""
+
+    def __init__(self, especie, version, razas):
+        self.especie = especie
+        self.version = version
+        self.razas = tuple(razas)
+        self.exactas = {}
+        self.aproximadas = {}
+        self.raiz = _Nodo()
+        self.nodos = 1
+        self._construir()
+
+    def _construir(self):
+        # (rango, nombre normalizado, clave, índice): el rango prioriza el comienzo
+        # del nombre sobre palabras intermedias y éstas sobre los alias
+        entradas = []
+        ambiguas = set()
+        por_nombre = {}
+        for i, raza in enumerate(self.razas):
+            normalizado = normalizar_nombre(raza.nombre)
+            por_nombre[normalizado] = i
+            self.exactas.setdefault(normalizado, i)
+            aproximada = clave_aproximada(normalizado)
+            if self.aproximadas.get(aproximada, i) != i:
+                ambiguas.add(aproximada)
+            self.aproximadas[aproximada] = i
+
+            entradas.append((0, normalizado, normalizado, i))
+            palabras = normalizado.split()
+            for inicio in range(1, len(palabras)):
+                entradas.append((1, normalizado, ' '.join(palabras[inicio:]), i))
+
+        for alias, candidatos in ALIAS.get(self.especie, {}).items():
+            destino = next((por_nombre[n] for n in map(normalizar_nombre, candidatos) if n in por_nombre), None)
+            if destino is None:
+                continue
+            self.exactas.setdefault(alias, destino)
+            self.aproximadas.setdefault(clave_aproximada(alias), destino)
+            entradas.append((2, normalizar_nombre(self.razas[destino].nombre), alias, destino))
+
+        for clave in ambiguas:
+            del self.aproximadas[clave]
+
+        entradas.sort()
+        for _, _, clave, i in entradas:
+            self._insertar(clave, i)
+        self._compartir_tops()
+
+    def _compartir_tops(self):
+        # Los nodos de una misma rama suelen tener los mismos resultados: reutilizar la tupla
+        compartidas = {}
+        pendientes = [self.raiz]
+        while pendientes:
+            nodo = pendientes.pop()
+            nodo.top = compartidas.setdefault(nodo.top, nodo.top)
+            if nodo.hijos:
+                pendientes.extend(nodo.hijos.values())
+
+    def _insertar(self, clave, i):
+        nodo = self.raiz
+        self._agregar_top(nodo, i)
+        for caracter in clave:
+            if nodo.hijos is None:
+                nodo.hijos = {}
+            siguiente = nodo.hijos.get(caracter)
+            if siguiente is None:
+                siguiente = nodo.hijos[caracter] = _Nodo()
+                self.nodos += 1
+            nodo = siguiente
+            self._agregar_top(nodo, i)
+
+    @staticmethod
+    def _agregar_top(nodo, i):
+        # Las entradas llegan ordenadas por relevancia: basta con agregar al final
+        if len(nodo.top) < LIMITE_MAX and i not in nodo.top:
+            nodo.top = nodo.top + (i,)
+
+    def buscar(self, texto):
+        """Raza exacta por nombre, alias o variante aproximada; None si no existe"""
+        normalizado = normalizar_nombre(texto)
+        if not normalizado:
+            return None
+        i = self.exactas.get(normalizado)
+        if i is None:
+            i = self.aproximadas.get(clave_aproximada(normalizado))
+        return None if i is None else self.razas[i]
+
+    def autocompletar(self, prefijo, limite=10):
+        """Mejores razas cuyo nombre (o alguna palabra o alias) empieza con `prefijo`"""
+        nodo = self.raiz
+        for caracter in normalizar_nombre(prefijo):
+            if nodo.hijos is None or caracter not in nodo.hijos:
+                return []
+            nodo = nodo.hijos[caracter]
+        return [self.razas[i] for i in nodo.top[:limite]]
+
+    def estadisticas(self):
+        """Tamaño aproximado en memoria (bytes) del índice"""
+        total = sum(sys.getsizeof(r) + sys.getsizeof(r.nombre) + sys.getsizeof(r.id_externo) for r in self.razas)
+        total += sys.getsizeof(self.exactas) + sys.getsizeof(self.aproximadas)
+        total += sum(sys.getsizeof(k) for k in self.exactas) + sum(sys.getsizeof(k) for k in self.aproximadas)
+        tops = {}
+        pendientes = [self.raiz]
+        while pendientes:
+            nodo = pendientes.pop()
+            tops[id(nodo.top)] = nodo.top
+            total += sys.getsizeof(nodo)
+            if nodo.hijos:
+                total += sys.getsizeof(nodo.hijos)
+                pendientes.extend(nodo.hijos.values())
+        total += sum(sys.getsizeof(top) for top in tops.values())
+        return {
+            'version': self.version,
+            'razas': len(self.razas),
+            'claves_exactas': len(self.exactas),
+            'claves_aproximadas': len(self.aproximadas),
+            'nodos_trie': self.nodos,
+            'bytes': total,
+        }
+
+
+_indices = {}
+_lock = threading.Lock()
+
+
+def _cargar_razas(especie):
+    from appsuavespets.models import Raza
+
+    razas = [
+        RazaIndexada(id_raza, id_externo, nombre)
+        for id_raza, id_externo, nombre in (
+            Raza.objects.filter(especie=especie).order_by('nombre').values_list('id_raza', 'id_externo', 'nombre')
+        )
+    ]
+    if not razas:
+        razas = [
+            RazaIndexada(None, nombre.lower().replace(' ', '_'), nombre)
+            for nombre in RAZAS_RESPALDO.get(especie, [])
+        ]
+    return razas
+
+
+def obtener_indice(especie):
+    """Índice vigente de la especie; se reconstruye solo si cambió la versión del catálogo"""
+    from appsuavespets.services.pet_api_service import PetAPIService
+
+    actual = _indices.get(especie)
+    if actual and time.monotonic() - actual[1] < INTERVALO_VERIFICACION:
+        return actual[0]
+
+    with _lock:
+        actual = _indices.get(especie)
+        if actual and time.monotonic() - actual[1] < INTERVALO_VERIFICACION:
+            return actual[0]
+        version = PetAPIService.version_catalogo(especie)
+        if actual and actual[0].version == version:
+            indice = actual[0]
+        else:
+            inicio = time.monotonic()
+            indice = IndiceRazas(especie, version, _cargar_razas(especie))
+            datos = indice.estadisticas()
+            logger.info(
+                'Índice de razas %s (%s): %d razas, %d nodos, %.1f KB, %.0f ms',
+                especie, version, datos['razas'], datos['nodos_trie'], datos['bytes'] / 1024,
+                (time.monotonic() - inicio) * 1000,
+            )
+        _indices[especie] = (indice, time.monotonic())
+        return indice
@@ -0,0 +1,249 @@
+# services/lote_pets.py
+"""
+Alta y actualización de mascotas en lote (/api/pets/lote/). El lote completo se valida
+en memoria en una sola pasada, las fichas se reservan con una consulta __in en lugar
+de un exists() por mascota y la escritura va en bloques de bulk_create / bulk_update,
+cada bloque en su propia transacción.
+"""
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import Q
+import datetime
+import logging
+import uuid
+
+from appsuavespets.models import Pet
+from appsuavespets.services.validacion_pets import (
+    DatoInvalido, validar_edad, validar_fecha_nacimiento, validar_peso,
+)
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_EDITABLES = (
+    'nombre_pet', 'descripcion_pet', 'especie', 'sexo', 'tamanio', 'raza', 'es_mestizo',
+    'peso_kg', 'edad', 'fecha_nacimiento', 'alergias',
+)
+OBLIGATORIOS = ('nombre_pet', 'descripcion_pet', 'especie', 'sexo', 'tamanio')
+CAMPOS_TEXTO = ('nombre_pet', 'descripcion_pet', 'especie', 'sexo', 'tamanio', 'raza', 'alergias')
+
+
+def nueva_ficha():
+    return f'PET-{uuid.uuid4().hex[:8].upper()}'
+
+
+def _booleano(valor):
+    return str(valor).strip().lower() in ('1', 'true', 'si', 'sí')
+
+
+def _convertir(campo, valor):
+    """Valor del JSON → valor del modelo. Lanza ValueError (o DatoInvalido) con el mensaje para el cliente."""
+    if campo in CAMPOS_TEXTO:
+        valor = '' if valor is None else str(valor).strip()
+        return valor or (None if campo in ('raza', 'sexo') else '')
+    if campo == 'es_mestizo':
+        return _booleano(valor)
+    if valor in (None, ''):
+        return None
+    if campo == 'peso_kg':
+        try:
+            peso = Decimal(str(valor).replace(',', '.'))
+        except InvalidOperation:
+            raise ValueError('Peso inválido')
+        return validar_peso(peso)
+    if campo == 'edad':
+        try:
+            edad = int(valor)
+        except (TypeError, ValueError):
+            raise ValueError('Edad inválida')
+        if edad < 0:
+            raise ValueError('Edad inválida')
+        return edad
+    if campo == 'fecha_nacimiento':
+        try:
+            fecha = datetime.date.fromisoformat(str(valor))
+        except ValueError:
+            raise ValueError('Fecha de nacimiento inválida')
+        return validar_fecha_nacimiento(fecha)
+    return valor
+
+
+def limpiar_item(datos, pet):
+    """
+    Aplica `datos` sobre `pet` (nueva o existente) con las mismas reglas que el alta
+    individual del API. Devuelve los errores por campo, vacío si el item es válido.
+    """
+    errores = {}
+    for campo in set(datos) - set(CAMPOS_EDITABLES) - {'id_pet', 'numero_ficha'}:
+        errores[campo] = ['Campo desconocido']
+    for campo in CAMPOS_EDITABLES:
+        if campo in datos:
+            try:
+                setattr(pet, campo, _convertir(campo, datos[campo]))
+            except ValueError as e:
+                errores[campo] = [str(e)]
+
+    if pet.es_mestizo and not pet.raza:
+        pet.raza = 'Mestizo'
+    # En una actualización solo se exigen los obligatorios que se envían
+    obligatorios = OBLIGATORIOS if pet.pk is None else [c for c in OBLIGATORIOS if c in datos]
+    for campo in obligatorios:
+        if campo not in errores and not getattr(pet, campo):
+            errores[campo] = ['Este campo es obligatorio.']
+    if not errores and pet.fecha_nacimiento:
+        if pet.edad is None:
+            errores['fecha_nacimiento'] = ['No puedes ingresar fecha si la edad es desconocida']
+        else:
+            try:
+                validar_edad(pet.edad, pet.fecha_nacimiento)
+            except DatoInvalido as e:
+                errores['edad'] = [str(e)]
+
+    largo_ficha = Pet._meta.get_field('numero_ficha').max_length
+    if pet.pk is None and pet.numero_ficha and len(pet.numero_ficha) > largo_ficha:
+        errores['numero_ficha'] = [f'La ficha admite máximo {largo_ficha} caracteres']
+
+    # Opciones, largos y dígitos del modelo; sin consultas (la unicidad de la ficha va aparte)
+    try:
+        pet.clean_fields(exclude=[f.name for f in Pet._meta.fields if f.name not in CAMPOS_EDITABLES] + list(errores))
+    except ValidationError as e:
+        errores.update(e.message_dict)
+    return errores
+
+
+def asignar_fichas(pets):
+    """
+    Respeta la ficha pedida si está libre; si no viene o ya existe (en la base o antes en
+    el lote) se genera una PET-XXXXXXXX. Una consulta __in por vuelta; solo hay otra
+    vuelta si una ficha generada choca.
+    """
+    asignadas = set()
+    pendientes = [(pet, pet.numero_ficha or nueva_ficha()) for pet in pets]
+    while pendientes:
+        usadas = set(
+            Pet.objects.filter(numero_ficha__in={ficha for _, ficha in pendientes})
+            .values_list('numero_ficha', flat=True)
+        )
+        siguientes = []
+        for pet, ficha in pendientes:
+            if ficha in usadas or ficha in asignadas:
+                siguientes.append((pet, nueva_ficha()))
+            else:
+                asignadas.add(ficha)
+                pet.numero_ficha = ficha
+        pendientes = siguientes
+
+
+def _bloques(items):
+    tamanio = settings.PETS_LOTE_BLOQUE
+    for inicio in range(0, len(items), tamanio):
+        yield items[inicio:inicio + tamanio]
+
+
+def _error_bloque(bloque, resultados, campo, mensaje):
+    for indice, _ in bloque:
+        resultados[indice] = {'indice': indice, 'estado': 'error', 'errores': {campo: [mensaje]}}
+
+
+def _crear(items, resultados):
+    pets = [pet for _, pet in items]
+    asignar_fichas(pets)
+    for bloque in _bloques(items):
+        try:
+            with transaction.atomic():
+                creadas = Pet.objects.bulk_create([pet for _, pet in bloque])
+        except IntegrityError:
+            # Otra solicitud tomó una ficha entre la reserva y el INSERT
+            _error_bloque(bloque, resultados, 'numero_ficha', 'Conflicto al guardar, reintenta')
+            continue
+        except DatabaseError as e:
+            # Los bloques anteriores ya están confirmados: solo este queda con error
+            logger.error(f'Lote pets: no se pudo crear un bloque de {len(bloque)}: {e}')
+            _error_bloque(bloque, resultados, 'non_field_errors', 'No se pudo guardar, reintenta')
+            continue
+        if creadas and creadas[0].pk is None:
+            # MySQL no devuelve los ids de bulk_create; la ficha es única
+            ids = dict(Pet.objects.filter(numero_ficha__in=[p.numero_ficha for p in creadas])
+                       .values_list('numero_ficha', 'pk'))
+            for pet in creadas:
+                pet.pk = ids[pet.numero_ficha]
+        for indice, pet in bloque:
+            resultados[indice] = {'indice': indice, 'estado': 'creado',
+                                  'id_pet': pet.id_pet, 'numero_ficha': pet.numero_ficha}
+
+
+def _actualizar(items, resultados):
+    """
+    `items` son (indice, pet, campos enviados). Se agrupan por conjunto de campos para
+    que cada UPDATE escriba solo lo que el cliente mandó y no pise cambios concurrentes.
+    """
+    grupos = {}
+    for indice, pet, campos in items:
+        grupos.setdefault(frozenset(campos), []).append((indice, pet))
+    for campos, grupo in grupos.items():
+        for bloque in _bloques(grupo):
+            try:
+                with transaction.atomic():
+                    # bulk_update pasa por QuerySet.update(), que también marca fecha_actualizacion
+                    Pet.objects.bulk_update([pet for _, pet in bloque], sorted(campos))
+            except DatabaseError as e:
+                logger.error(f'Lote pets: no se pudo actualizar un bloque de {len(bloque)}: {e}')
+                _error_bloque(bloque, resultados, 'non_field_errors', 'No se pudo guardar, reintenta')
+                continue
+            for indice, pet in bloque:
+                resultados[indice] = {'indice': indice, 'estado': 'actualizado',
+                                      'id_pet': pet.id_pet, 'numero_ficha': pet.numero_ficha}
+
+
+def procesar_lote(items, usuario):
+    """
+    `items` es una lista de objetos; los que traen id_pet actualizan esa mascota del
+    usuario (solo los campos enviados) y el resto se crean. Devuelve un resultado por
+    item, en el mismo orden, con estado 'creado', 'actualizado' o 'error'.
+    """
+    ids = {item.get('id_pet') for item in items if isinstance(item, dict) and item.get('id_pet') is not None}
+    existentes = Pet.objects.filter(
+        responsable_id=usuario.id_usuario, pk__in=[i for i in ids if str(i).isdigit()],
+    ).filter(Q(is_deleted=0) | Q(is_deleted__isnull=True)).in_bulk()
+
+    resultados = [None] * len(items)
+    nuevas, cambiadas = [], []
+    for indice, datos in enumerate(items):
+        if not isinstance(datos, dict):
+            resultados[indice] = {'indice': indice, 'estado': 'error', 'errores': {'non_field_errors': ['Se esperaba un objeto']}}
+            continue
+        id_pet = datos.get('id_pet')
+        if id_pet is None:
+            ficha = str(datos.get('numero_ficha') or '').strip() or None
+            pet = Pet(responsable_id=usuario.id_usuario, is_deleted=0, es_mestizo=False, numero_ficha=ficha)
+        else:
+            pet = existentes.get(int(id_pet)) if str(id_pet).isdigit() else None
+            if pet is None:
+                resultados[indice] = {'indice': indice, 'estado': 'error', 'errores': {'id_pet': ['Mascota no encontrada']}}
+                continue
+            if datos.get('numero_ficha') not in (None, pet.numero_ficha):
+                resultados[indice] = {'indice': indice, 'estado': 'error',
+                                      'errores': {'numero_ficha': ['La ficha no se puede modificar']}}
+                continue
+        raza_anterior = pet.raza
+        errores = limpiar_item(datos, pet)
+        if errores:
+            resultados[indice] = {'indice': indice, 'estado': 'error', 'errores': errores}
+        elif pet.pk is None:
+            nuevas.append((indice, pet))
+        else:
+            campos = {campo for campo in CAMPOS_EDITABLES if campo in datos}
+            if pet.raza != raza_anterior:
+                campos.add('raza')
+            if campos:
+                cambiadas.append((indice, pet, campos))
+            else:
+                resultados[indice] = {'indice': indice, 'estado': 'actualizado',
+                                      'id_pet': pet.id_pet, 'numero_ficha': pet.numero_ficha}
+
+    if nuevas:
+        _crear(nuevas, resultados)
+    if cambiadas:
+        _actualizar(cambiadas, resultados)
+    return resultados
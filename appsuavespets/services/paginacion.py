@@ -0,0 +1,117 @@
+# services/paginacion.py
+"""
+Paginación por keyset (seek): en lugar de OFFSET se filtra por los valores de orden
+del último elemento de la página, así el costo no crece con el número de página.
+El cursor es opaco para el cliente: JSON en base64 urlsafe.
+"""
+from django.db.models import Q
+import base64
+import binascii
+import json
+
+
+class CursorInvalido(ValueError):
+    """El cursor no se puede decodificar o no corresponde a este listado"""
+
+
+def _serializar(valor):
+    # isoformat completo: DjangoJSONEncoder recorta los microsegundos y el cursor dejaría de ser exacto
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+
+def codificar_cursor(valores):
+    datos = json.dumps(list(valores), default=_serializar, separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, conversores):
+    """
+    Devuelve los valores del cursor convertidos con `conversores` (uno por campo),
+    o None si no hay cursor. Lanza CursorInvalido si fue alterado.
+    """
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if not isinstance(valores, list) or len(valores) != len(conversores):
+            raise CursorInvalido('Cursor inválido')
+        return [convertir(valor) for convertir, valor in zip(conversores, valores)]
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise CursorInvalido('Cursor inválido') from e
+
+
+def filtro_keyset(campos, valores, descendente=True):
+    """
+    Filtro para las filas que van después de `valores` en el orden de `campos`:
+    (a, b, c) < (va, vb, vc) expandido como a < va OR (a = va AND b < vb) OR ...
+    """
+    comparador = 'lt' if descendente else 'gt'
+    filtro = Q()
+    for i, campo in enumerate(campos):
+        condicion = Q(**{f'{campo}__{comparador}': valores[i]})
+        for anterior, valor in zip(campos[:i], valores[:i]):
+            condicion &= Q(**{anterior: valor})
+        filtro |= condicion
+    return filtro
+
+
+def pagina_keyset(queryset, campos, cursor_valores, tamanio, descendente=True):
+    """
+    Aplica el cursor y el límite (tamanio + 1 para saber si hay más). El queryset ya
+    debe estar ordenado por `campos`. Devuelve (filas, cursor de la página siguiente).
+    """
+    if cursor_valores is not None:
+        queryset = queryset.filter(filtro_keyset(campos, cursor_valores, descendente))
+    filas = list(queryset[:tamanio + 1])
+    siguiente = None
+    if len(filas) > tamanio:
+        filas = filas[:tamanio]
+        siguiente = codificar_cursor(getattr(filas[-1], campo) for campo in campos)
+    return filas, siguiente
+
+
+def tamanio_pagina(valor, defecto, maximo):
+    """Tamaño de página pedido por el cliente, acotado a [1, maximo]"""
+    try:
+        return min(max(int(valor), 1), maximo)
+    except (TypeError, ValueError):
+        return defecto
+
+
+def _direccion(valor):
+    if valor not in ('s', 'a'):
+        raise ValueError(valor)
+    return valor
+
+
+def _valor(fila, campo):
+    # Instancias de modelo o filas de values()
+    return fila[campo] if isinstance(fila, dict) else getattr(fila, campo)
+
+
+def pagina_cursor(queryset, campo, cursor, tamanio, conversor=int):
+    """
+    Paginación hacia adelante y hacia atrás por un campo único y ordenado (la PK).
+    Devuelve (filas, cursor siguiente, cursor anterior); cada página es un rango por
+    índice, así la página 1000 cuesta lo mismo que la primera.
+    """
+    direccion, valor = decodificar_cursor(cursor, (_direccion, conversor)) or ('s', None)
+    if direccion == 'a':
+        filas = list(queryset.filter(**{f'{campo}__lt': valor}).order_by(f'-{campo}')[:tamanio + 1])
+        hay_anterior, hay_siguiente = len(filas) > tamanio, True
+        filas = filas[:tamanio][::-1]
+    else:
+        if valor is not None:
+            queryset = queryset.filter(**{f'{campo}__gt': valor})
+        filas = list(queryset.order_by(campo)[:tamanio + 1])
+        hay_anterior, hay_siguiente = valor is not None, len(filas) > tamanio
+        filas = filas[:tamanio]
+
+    if not filas:
+        return filas, None, None
+    siguiente = codificar_cursor(['s', _valor(filas[-1], campo)]) if hay_siguiente else None
+    anterior = codificar_cursor(['a', _valor(filas[0], campo)]) if hay_anterior else None
+    return filas, siguiente, anterior
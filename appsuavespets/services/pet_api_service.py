@@ -1,10 +1,29 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
-from django.core.cache import cache
+from django.core.cache import cache, caches
+from django.db import connections
+from django.db.models import Count, Max
+import json
 import logging
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+
+from appsuavespets.services.coalescencia import single_flight
+from appsuavespets.services.http_client import cliente_http
 
 logger = logging.getLogger(__name__)
 
+# Refrescos en segundo plano de las listas de razas (stale-while-revalidate)
+_refrescos = ThreadPoolExecutor(max_workers=2, thread_name_prefix='razas')
+
+# Imágenes servidas por este proceso de cada lote: especie -> (versión, cantidad)
+_imagenes_servidas = {}
+_imagenes_lock = threading.Lock()
+
 class PetAPIService:
     """Servicio para obtener información de APIs de mascotas"""
     
@@ -12,106 +31,268 @@ class PetAPIService:
     CAT_API_URL = "https://api.thecatapi.com/v1"
     
     @staticmethod
-    def get_dog_breeds():
-        """Obtiene lista de razas de perros (con cache de 24h)"""
-        cached = cache.get('dog_breeds')
-        if cached:
-            return cached
-        
+    def _pedir_razas(url, api_key, etiqueta):
+        """Descarga la lista de razas de la API; None si falla"""
         try:
-            headers = {'x-api-key': settings.DOG_API_KEY}
-            response = requests.get(
-                f"{PetAPIService.DOG_API_URL}/breeds",
-                headers=headers,
-                timeout=10
-            )
-            
+            headers = {'x-api-key': api_key}
+            response = cliente_http.get(url, headers=headers)
+
             if response.status_code == 200:
-                breeds = response.json()
-                cache.set('dog_breeds', breeds, 60*60*24)  # Cache 24h
-                return breeds
+                return response.json()
+            logger.warning(f"API de razas de {etiqueta} respondió {response.status_code}")
         except Exception as e:
-            logger.error(f"Error obteniendo razas de perros: {e}")
-        
-        return []
-    
+            logger.error(f"Error obteniendo razas de {etiqueta}: {e}")
+        return None
+
     @staticmethod
-    def get_cat_breeds():
-        """Obtiene lista de razas de gatos (con cache de 24h)"""
-        cached = cache.get('cat_breeds')
-        if cached:
-            return cached
-        
+    def _archivo_razas(clave_cache):
+        return os.path.join(settings.RAZAS_CACHE_DIR, f'{clave_cache}.json')
+
+    @staticmethod
+    def _leer_disco(clave_cache):
+        """Última lista buena guardada en disco, para que un worker recién iniciado arranque con datos"""
         try:
-            headers = {'x-api-key': settings.CAT_API_KEY}
-            response = requests.get(
-                f"{PetAPIService.CAT_API_URL}/breeds",
-                headers=headers,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                breeds = response.json()
-                cache.set('cat_breeds', breeds, 60*60*24)  # Cache 24h
-                return breeds
+            with open(PetAPIService._archivo_razas(clave_cache), encoding='utf-8') as archivo:
+                entrada = json.load(archivo)
+        except FileNotFoundError:
+            return None
         except Exception as e:
-            logger.error(f"Error obteniendo razas de gatos: {e}")
-        
-        return []
-    
+            logger.warning(f"No se pudo leer {clave_cache} desde disco: {e}")
+            return None
+        restante = settings.RAZAS_TTL_DURO - (time.time() - entrada.get('guardado', 0))
+        if restante <= 0 or not entrada.get('datos'):
+            return None
+        cache.set(clave_cache, entrada, restante)
+        return entrada
+
+    @staticmethod
+    def _guardar_razas(clave_cache, breeds):
+        entrada = {'datos': breeds, 'guardado': time.time()}
+        cache.set(clave_cache, entrada, settings.RAZAS_TTL_DURO)
+        try:
+            os.makedirs(settings.RAZAS_CACHE_DIR, exist_ok=True)
+            destino = PetAPIService._archivo_razas(clave_cache)
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=settings.RAZAS_CACHE_DIR,
+                                             suffix='.tmp', delete=False) as archivo:
+                json.dump(entrada, archivo)
+            os.replace(archivo.name, destino)
+        except Exception as e:
+            logger.warning(f"No se pudo persistir {clave_cache} en disco: {e}")
+
+    @staticmethod
+    def _descargar_razas(clave_cache, url, api_key, etiqueta):
+        """
+        Descarga y guarda la lista de razas. Si varios requests (de cualquier worker)
+        la necesitan a la vez, solo uno llama a la API. Devuelve None si falla.
+        """
+        breeds = single_flight(
+            'razas', clave_cache, lambda: PetAPIService._pedir_razas(url, api_key, etiqueta),
+            ttl_lock=20, espera_max=15,
+        )
+        if breeds:
+            PetAPIService._guardar_razas(clave_cache, breeds)
+            return breeds
+        return None
+
+    @staticmethod
+    def _refrescar_en_segundo_plano(clave_cache, url, api_key, etiqueta):
+        # Un intento por worker cada RAZAS_TTL_NEGATIVO mientras la API siga fallando
+        if not cache.add(f'{clave_cache}:refrescando', True, settings.RAZAS_TTL_NEGATIVO):
+            return
+
+        def _refrescar():
+            try:
+                PetAPIService._descargar_razas(clave_cache, url, api_key, etiqueta)
+            finally:
+                connections.close_all()
+
+        _refrescos.submit(_refrescar)
+
+    @staticmethod
+    def _obtener_razas(clave_cache, url, api_key, etiqueta):
+        """
+        Stale-while-revalidate: hasta RAZAS_TTL_SUAVE se sirve la cache; entre el TTL
+        suave y el duro se sirve la lista vieja y se refresca en segundo plano; pasado
+        el duro se descarga en el request. Los fallos se recuerdan RAZAS_TTL_NEGATIVO.
+        """
+        entrada = cache.get(clave_cache) or PetAPIService._leer_disco(clave_cache)
+        if entrada is not None:
+            if entrada.get('negativo'):
+                return []
+            if time.time() - entrada['guardado'] >= settings.RAZAS_TTL_SUAVE:
+                PetAPIService._refrescar_en_segundo_plano(clave_cache, url, api_key, etiqueta)
+            return entrada['datos']
+
+        breeds = PetAPIService._descargar_razas(clave_cache, url, api_key, etiqueta)
+        if breeds is None:
+            cache.set(clave_cache, {'datos': [], 'guardado': time.time(), 'negativo': True},
+                      settings.RAZAS_TTL_NEGATIVO)
+            return []
+        return breeds
+
+    @staticmethod
+    def get_dog_breeds():
+        """Obtiene lista de razas de perros (stale-while-revalidate)"""
+        return PetAPIService._obtener_razas(
+            'dog_breeds', f"{PetAPIService.DOG_API_URL}/breeds", settings.DOG_API_KEY, 'perros'
+        )
+
+    @staticmethod
+    def get_cat_breeds():
+        """Obtiene lista de razas de gatos (stale-while-revalidate)"""
+        return PetAPIService._obtener_razas(
+            'cat_breeds', f"{PetAPIService.CAT_API_URL}/breeds", settings.CAT_API_KEY, 'gatos'
+        )
+
+    @staticmethod
+    def descargar_catalogo(especie):
+        """Descarga el catálogo completo de razas de la API, sin cache (lo usa sync_breeds)"""
+        if especie == 'perro':
+            url, api_key = f"{PetAPIService.DOG_API_URL}/breeds", settings.DOG_API_KEY
+        elif especie == 'gato':
+            url, api_key = f"{PetAPIService.CAT_API_URL}/breeds", settings.CAT_API_KEY
+        else:
+            raise ValueError(f'Especie inválida: {especie}')
+        headers = {'x-api-key': api_key} if api_key else {}
+        response = cliente_http.get(url, headers=headers, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def version_catalogo(especie):
+        """Versión del catálogo local de una especie; cambia cada vez que sync_breeds modifica algo"""
+        from appsuavespets.models import Raza
+
+        datos = Raza.objects.filter(especie=especie).aggregate(total=Count('pk'), ultima=Max('fecha_actualizacion'))
+        return PetAPIService._formatear_version(especie, datos)
+
+    @staticmethod
+    async def aversion_catalogo(especie):
+        from appsuavespets.models import Raza
+
+        datos = await Raza.objects.filter(especie=especie).aaggregate(total=Count('pk'), ultima=Max('fecha_actualizacion'))
+        return PetAPIService._formatear_version(especie, datos)
+
+    @staticmethod
+    def _formatear_version(especie, datos):
+        ultima = datos['ultima'].timestamp() if datos['ultima'] else 0
+        return f"{especie}-{datos['total']}-{ultima:.0f}"
+
     @staticmethod
     def get_breed_info(especie, raza_nombre):
-        """Obtiene información detallada de una raza específica"""
+        """Obtiene información detallada de una raza específica desde el catálogo local"""
+        from appsuavespets.models import Raza
+
         if not raza_nombre or raza_nombre.lower() == 'mestizo':
             return None
-        
-        if especie.lower() == 'perro':
-            breeds = PetAPIService.get_dog_breeds()
-        elif especie.lower() == 'gato':
-            breeds = PetAPIService.get_cat_breeds()
-        else:
+
+        especie = especie.lower()
+        if especie not in ('perro', 'gato'):
             return None
-        
-        # Buscar raza específica (case insensitive)
-        for breed in breeds:
-            if breed['name'].lower() == raza_nombre.lower():
-                return {
-                    'nombre': breed.get('name', ''),
-                    'temperamento': breed.get('temperament', 'No disponible'),
-                    'origen': breed.get('origin', 'No disponible'),
-                    'descripcion': breed.get('description', 'No disponible'),
-                    'peso': breed.get('weight', {}).get('metric', 'No disponible'),
-                    'esperanza_vida': breed.get('life_span', 'No disponible'),
-                    'imagen': breed.get('image', {}).get('url', '') if 'image' in breed else '',
-                    'grupo': breed.get('breed_group', 'No disponible') if especie.lower() == 'perro' else None,
-                }
-        return None
-    
+
+        # Buscar raza por nombre, alias en español o variante aproximada (índice en memoria)
+        from appsuavespets.services.indice_razas import obtener_indice
+
+        encontrada = obtener_indice(especie).buscar(raza_nombre)
+        if encontrada is None or encontrada.id_raza is None:
+            return None
+        raza = Raza.objects.filter(pk=encontrada.id_raza).first()
+        return PetAPIService._info_raza(raza, especie)
+
+    @staticmethod
+    def _info_raza(raza, especie):
+        if raza is None:
+            return None
+        return {
+            'nombre': raza.nombre,
+            'temperamento': raza.temperamento or 'No disponible',
+            'origen': raza.origen or 'No disponible',
+            'descripcion': raza.descripcion or 'No disponible',
+            'peso': raza.peso or 'No disponible',
+            'esperanza_vida': raza.esperanza_vida or 'No disponible',
+            'imagen': raza.imagen_url or '',
+            'grupo': (raza.grupo or 'No disponible') if especie == 'perro' else None,
+        }
+
+    @staticmethod
+    def _origen_imagenes(especie):
+        if especie == 'perro':
+            return f"{PetAPIService.DOG_API_URL}/images/search", settings.DOG_API_KEY
+        if especie == 'gato':
+            return f"{PetAPIService.CAT_API_URL}/images/search", settings.CAT_API_KEY
+        return None, None
+
+    @staticmethod
+    def rellenar_imagenes(especie):
+        """
+        Descarga un lote de URLs aleatorias (parámetro `limit` de la API) y lo publica
+        en la cache compartida. Un solo worker rellena a la vez por especie.
+        """
+        url, api_key = PetAPIService._origen_imagenes(especie)
+        if url is None:
+            return 0
+        pool = caches['coordinacion']
+        clave_lock = f'imagenes:{especie}:rellenando'
+        # Si la API falla el lock se deja expirar: como mucho un intento por minuto
+        if not pool.add(clave_lock, True, 60):
+            return 0
+        try:
+            headers = {'x-api-key': api_key} if api_key else {}
+            response = cliente_http.get(url, headers=headers, params={'limit': settings.IMAGENES_POOL_TAMANIO})
+            if response.status_code != 200:
+                logger.warning(f"API de imágenes de {especie} respondió {response.status_code}")
+                return 0
+            urls = list(dict.fromkeys(item['url'] for item in response.json() if item.get('url')))
+            urls = urls[:settings.IMAGENES_POOL_TAMANIO]
+            if urls:
+                pool.set(f'imagenes:{especie}:lote', {'version': uuid.uuid4().hex[:8], 'urls': urls},
+                         settings.IMAGENES_POOL_TTL)
+                pool.delete(clave_lock)
+            return len(urls)
+        except Exception as e:
+            logger.error(f"Error rellenando imágenes de {especie}: {e}")
+            return 0
+
+    @staticmethod
+    def _rellenar_en_segundo_plano(especie):
+        if not cache.add(f'imagenes:{especie}:pedido', True, 30):
+            return
+
+        def _rellenar():
+            try:
+                PetAPIService.rellenar_imagenes(especie)
+            finally:
+                connections.close_all()
+
+        _refrescos.submit(_rellenar)
+
     @staticmethod
     def get_random_image(especie):
-        """Obtiene una imagen aleatoria según la especie"""
+        """
+        Devuelve una imagen aleatoria del lote precargado de la especie, sin tocar la red.
+        Cuando el lote se está agotando se pide otro en segundo plano; si aún no hay
+        lote devuelve None.
+        """
+        especie = especie.lower()
+        if especie not in ('perro', 'gato'):
+            return None
         try:
-            if especie.lower() == 'perro':
-                headers = {'x-api-key': settings.DOG_API_KEY}
-                response = requests.get(
-                    f"{PetAPIService.DOG_API_URL}/images/search",
-                    headers=headers,
-                    timeout=10
-                )
-            elif especie.lower() == 'gato':
-                headers = {'x-api-key': settings.CAT_API_KEY}
-                response = requests.get(
-                    f"{PetAPIService.CAT_API_URL}/images/search",
-                    headers=headers,
-                    timeout=10
-                )
-            else:
+            pool = caches['coordinacion']
+            lote = pool.get(f'imagenes:{especie}:lote')
+            if not lote:
+                PetAPIService._rellenar_en_segundo_plano(especie)
                 return None
-            
-            if response.status_code == 200:
-                data = response.json()
-                return data[0]['url'] if data else None
+
+            # Índice aleatorio: sin cursor compartido (incr de DatabaseCache no es atómico)
+            urls = lote['urls']
+            with _imagenes_lock:
+                version, servidas = _imagenes_servidas.get(especie, (None, 0))
+                servidas = servidas + 1 if version == lote['version'] else 1
+                _imagenes_servidas[especie] = (lote['version'], servidas)
+            if servidas >= len(urls) - len(urls) // 4:
+                # Este proceso ya sirvió tres cuartos del lote: pedir el siguiente
+                PetAPIService._rellenar_en_segundo_plano(especie)
+            return random.choice(urls)
         except Exception as e:
             logger.error(f"Error obteniendo imagen aleatoria: {e}")
-        
-        return None
\ No newline at end of file
+            return None
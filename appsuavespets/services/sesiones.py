@@ -0,0 +1,22 @@
+# services/sesiones.py
+"""
+Una sesión activa por usuario. SesionUsuario indexa las sesiones por usuario al iniciar
+sesión, así cerrar las demás es una consulta por id_usuario en lugar de leer y
+decodificar toda la tabla django_session.
+"""
+from django.contrib.sessions.models import Session
+
+from appsuavespets.models import SesionUsuario
+
+
+def cerrar_otras_sesiones(usuario, clave_actual):
+    """Borra las sesiones del usuario salvo la actual; el índice se limpia en cascada"""
+    return Session.objects.filter(sesionusuario__usuario=usuario).exclude(session_key=clave_actual).delete()
+
+
+def registrar_sesion(usuario, clave):
+    SesionUsuario.objects.update_or_create(session_id=clave, defaults={'usuario': usuario})
+
+
+def olvidar_sesion(clave):
+    SesionUsuario.objects.filter(session_id=clave).delete()
@@ -0,0 +1,149 @@
+# services/validacion_imagenes.py
+"""
+Validación de imágenes subidas sin decodificarlas: firma (magic bytes), dimensiones
+leídas de la cabecera y un presupuesto de píxeles. LimiteSubidaHandler aplica los
+mismos controles mientras el cuerpo llega, así un archivo grande o falso se descarta
+sin guardarlo en memoria ni en disco. validar_imagen es el validador común del
+formulario y de la API.
+"""
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image
+import io
+import os
+import warnings
+
+FIRMAS = {
+    'JPEG': b'\xff\xd8\xff',
+    'PNG': b'\x89PNG\r\n\x1a\n',
+}
+EXTENSIONES = ('.jpg', '.jpeg', '.png')
+# Campos de formulario que reciben fotos; LimiteSubidaHandler solo revisa estos
+CAMPOS_IMAGEN = ('foto_url', 'fotos')
+TIPOS = ('image/jpeg', 'image/png', 'image/jpg')
+# Bytes iniciales donde debe estar la cabecera completa (incluye EXIF/ICC)
+TAMANIO_CABECERA = 256 * 1024
+
+
+class ImagenInvalida(ValueError):
+    """La subida no es una imagen JPG/PNG aceptable"""
+
+
+def _megas(bytes_):
+    return f'{bytes_ / (1024 * 1024):g} MB'
+
+
+def leer_cabecera(datos, completa=True):
+    """
+    Devuelve (formato, ancho, alto) a partir de los primeros bytes del archivo sin
+    decodificar los píxeles. Con completa=False devuelve None si aún faltan bytes.
+    """
+    formato = next((f for f, firma in FIRMAS.items() if datos.startswith(firma)), None)
+    if formato is None:
+        if not completa and len(datos) < max(len(firma) for firma in FIRMAS.values()):
+            return None
+        raise ImagenInvalida('Solo se permiten imágenes JPG o PNG')
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            # Image.open solo lee la cabecera; los píxeles se decodifican con load()
+            with Image.open(io.BytesIO(datos), formats=[formato]) as imagen:
+                ancho, alto = imagen.size
+    except (Image.DecompressionBombWarning, Image.DecompressionBombError):
+        raise ImagenInvalida('La imagen tiene demasiados píxeles')
+    except Exception:
+        if completa:
+            raise ImagenInvalida('Archivo de imagen inválido')
+        return None
+
+    if ancho < 1 or alto < 1:
+        raise ImagenInvalida('Archivo de imagen inválido')
+    if ancho * alto > settings.FOTO_MAX_PIXELES:
+        raise ImagenInvalida(f'La imagen supera {settings.FOTO_MAX_PIXELES / 1_000_000:g} megapíxeles')
+    return formato, ancho, alto
+
+
+class ArchivoRechazado(UploadedFile):
+    """Archivo descartado durante la subida; validar_imagen informa el motivo"""
+
+    def __init__(self, name, content_type, error):
+        super().__init__(io.BytesIO(), name, content_type, 0)
+        self.error_subida = error
+
+
+def validar_imagen(archivo):
+    """Validador común de fotos (formulario y API). Lee como mucho TAMANIO_CABECERA bytes."""
+    error = getattr(archivo, 'error_subida', None)
+    if error:
+        raise ImagenInvalida(error)
+    nombre = getattr(archivo, 'name', '') or ''
+    content_type = (getattr(archivo, 'content_type', '') or '').lower()
+    if content_type and content_type not in TIPOS:
+        raise ImagenInvalida('Solo se permiten imágenes JPG o PNG')
+    if nombre and os.path.splitext(nombre)[1].lower() not in EXTENSIONES:
+        raise ImagenInvalida('Extensión de archivo no permitida')
+    if (getattr(archivo, 'size', 0) or 0) > settings.FOTO_MAX_BYTES:
+        raise ImagenInvalida(f'La imagen supera {_megas(settings.FOTO_MAX_BYTES)}')
+
+    archivo.seek(0)
+    try:
+        return leer_cabecera(archivo.read(TAMANIO_CABECERA))
+    finally:
+        archivo.seek(0)
+
+
+class LimiteSubidaHandler(FileUploadHandler):
+    """
+    Primer handler de FILE_UPLOAD_HANDLERS. Rechaza cuerpos que superan SUBIDA_MAX_BYTES
+    antes de leerlos (límite global para cualquier subida) y, en los campos de
+    CAMPOS_IMAGEN, deja de pasar datos a los handlers siguientes en cuanto el archivo
+    supera FOTO_MAX_BYTES o su cabecera no es una imagen válida. Los demás archivos
+    pasan sin revisar.
+    """
+    chunk_size = 64 * 1024
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length and content_length > settings.SUBIDA_MAX_BYTES:
+            raise RequestDataTooBig(f'La solicitud supera {_megas(settings.SUBIDA_MAX_BYTES)}')
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.cabecera = b''
+        self.revisada = self.field_name not in CAMPOS_IMAGEN
+        self.error = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.field_name not in CAMPOS_IMAGEN:
+            return raw_data
+        if self.error:
+            return None
+        if start + len(raw_data) > settings.FOTO_MAX_BYTES:
+            self.error = f'La imagen supera {_megas(settings.FOTO_MAX_BYTES)}'
+            return None
+        if not self.revisada:
+            self.cabecera += raw_data
+            try:
+                self.revisada = leer_cabecera(
+                    self.cabecera, completa=len(self.cabecera) >= TAMANIO_CABECERA,
+                ) is not None
+            except ImagenInvalida as e:
+                self.error = str(e)
+                return None
+            if self.revisada:
+                self.cabecera = b''
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.error is None and not self.revisada:
+            try:
+                leer_cabecera(self.cabecera)
+            except ImagenInvalida as e:
+                self.error = str(e)
+        if self.error:
+            # Los handlers siguientes no reciben el archivo: se entrega uno vacío con el motivo
+            return ArchivoRechazado(self.file_name, self.content_type, self.error)
+        return None
@@ -0,0 +1,84 @@
+# services/validacion_pets.py
+"""
+Reglas de negocio de mascotas y cuidados sin formularios: las usan PetForm, las vistas
+de cuidados, el API en lote y el comando import_pets. Cada validador devuelve el valor
+limpio o lanza DatoInvalido con el mensaje para el usuario.
+"""
+from decimal import Decimal
+import datetime
+import re
+import unicodedata
+
+PESO_MIN = Decimal('0.4')
+PESO_MAX = Decimal('160')
+DOSIS_MAX_ESPECIALES = 4
+# Opciones del formulario de cuidados; los dos primeros generan recordatorio a socios premium
+TIPOS_CUIDADO = (
+    'Vacunación', 'Control Veterinario', 'Desparasitación', 'Baño y Peluquería', 'Corte de Uñas', 'Otro',
+)
+CUIDADOS_CON_RECORDATORIO = ('Vacunación', 'Control Veterinario')
+
+
+class DatoInvalido(ValueError):
+    """Un valor no cumple las reglas de mascotas o cuidados"""
+
+
+def anios_desde(fecha, hoy=None):
+    return int(((hoy or datetime.date.today()) - fecha).days // 365)
+
+
+def validar_peso(peso):
+    """Peso opcional en kg: entre PESO_MIN y PESO_MAX, con máximo 2 decimales"""
+    if peso is None or peso == '':
+        return None
+    # NaN/Infinity: Decimal no los puede comparar (InvalidOperation no es ValueError)
+    if not Decimal(str(peso)).is_finite():
+        raise DatoInvalido('Peso inválido')
+    if peso < PESO_MIN:
+        raise DatoInvalido(f'El peso mínimo es {PESO_MIN} kg')
+    if peso > PESO_MAX:
+        raise DatoInvalido(f'El peso máximo es {PESO_MAX} kg')
+    peso_str = str(peso)
+    if '.' in peso_str and len(peso_str.split('.')[1]) > 2:
+        raise DatoInvalido('El peso puede tener máximo 2 decimales')
+    return peso
+
+
+def validar_fecha_nacimiento(fecha):
+    if fecha and fecha > datetime.date.today():
+        raise DatoInvalido('La fecha no puede ser futura')
+    return fecha
+
+
+def validar_edad(edad, fecha_nacimiento):
+    """La edad, si viene junto a la fecha de nacimiento, debe coincidir en años cumplidos"""
+    if fecha_nacimiento and edad is not None and anios_desde(fecha_nacimiento) != int(edad):
+        raise DatoInvalido('La edad no coincide con la fecha de nacimiento')
+    return edad
+
+
+def validar_dosis(dosis):
+    """Dosis opcional: al menos una letra o número y pocos caracteres especiales"""
+    dosis = (dosis or '').strip()
+    if not dosis:
+        return None
+    if not re.search(r'[A-Za-z0-9]', dosis):
+        raise DatoInvalido('La dosis debe incluir al menos una letra o un número.')
+    if len(re.findall(r'[^A-Za-z0-9\s]', dosis)) > DOSIS_MAX_ESPECIALES:
+        raise DatoInvalido(f'La dosis admite máximo {DOSIS_MAX_ESPECIALES} caracteres especiales.')
+    return dosis
+
+
+def _sin_tildes(texto):
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c)).lower()
+
+
+_TIPOS_NORMALIZADOS = {_sin_tildes(tipo): tipo for tipo in TIPOS_CUIDADO}
+
+
+def validar_tipo_cuidado(tipo):
+    """Devuelve el tipo tal como lo guarda el formulario ('vacunacion' → 'Vacunación')"""
+    canonico = _TIPOS_NORMALIZADOS.get(_sin_tildes((tipo or '').strip()))
+    if canonico is None:
+        raise DatoInvalido('Tipo de cuidado inválido')
+    return canonico
@@ -1,15 +1,62 @@
-from django.contrib.auth.signals import user_logged_in
-from django.contrib.sessions.models import Session
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db.models.signals import post_save, pre_save
 from django.utils import timezone
 
+from appsuavespets.models import Pet
+from appsuavespets.services.almacenamiento import es_contenido, liberar_referencia
+from appsuavespets.services.imagenes import derivados_generados, encolar_derivados
+from appsuavespets.services.sesiones import cerrar_otras_sesiones, olvidar_sesion, registrar_sesion
+
 def one_session_per_user(sender, user, request, **kwargs):
-    # Obtiene todas las sesiones activas
-    sessions = Session.objects.filter(expire_date__gte=timezone.now())
-    for session in sessions:
-        data = session.get_decoded()
-        # Si la sesión pertenece al usuario actual, la elimina para forzar una sola sesión
-        if data.get('_auth_user_id') == str(user.id_usuario):
-            session.delete()
+    # Cierra las demás sesiones del usuario (consulta indexada por usuario) y registra la actual
+    if not hasattr(request, 'session'):
+        return
+    if request.session.session_key is None:
+        request.session.save()
+    cerrar_otras_sesiones(user, request.session.session_key)
+    registrar_sesion(user, request.session.session_key)
 
 # Conectar la señal para que se ejecute al iniciar sesión un usuario
 user_logged_in.connect(one_session_per_user)
+
+
+def olvidar_sesion_al_salir(sender, request, user=None, **kwargs):
+    # logout() vacía la sesión justo después de esta señal
+    if getattr(request, 'session', None) is not None and request.session.session_key:
+        olvidar_sesion(request.session.session_key)
+
+user_logged_out.connect(olvidar_sesion_al_salir)
+
+
+def derivados_foto_pet(sender, instance, update_fields=None, **kwargs):
+    # Genera thumb/card/full de la foto fuera del request (idempotente si la foto no cambió)
+    if 'foto_url' in instance.get_deferred_fields():
+        return
+    if update_fields is not None and 'foto_url' not in update_fields:
+        return
+    if instance.foto_url:
+        encolar_derivados(instance.foto_url.name, instance.foto_url.storage)
+
+post_save.connect(derivados_foto_pet, sender=Pet)
+
+
+def version_pet_con_derivados(sender, nombre, **kwargs):
+    # foto_miniatura cambia de la foto original al thumb: el ETag del API debe cambiar
+    Pet.objects.filter(foto_url=nombre).update(fecha_actualizacion=timezone.now())
+
+derivados_generados.connect(version_pet_con_derivados)
+
+
+def liberar_foto_reemplazada(sender, instance, update_fields=None, **kwargs):
+    # Al subir una foto nueva se quita la referencia a la anterior (el blob se borra si nadie más lo usa)
+    if not instance.pk or 'foto_url' in instance.get_deferred_fields():
+        return
+    if update_fields is not None and 'foto_url' not in update_fields:
+        return
+    if not instance.foto_url or instance.foto_url._committed:
+        return
+    anterior = Pet.objects.filter(pk=instance.pk).values_list('foto_url', flat=True).first()
+    if es_contenido(anterior):
+        liberar_referencia(anterior)
+
+pre_save.connect(liberar_foto_reemplazada, sender=Pet)
@@ -0,0 +1,39 @@
+from django import template
+from django.utils.html import format_html
+
+from appsuavespets.services.imagenes import TAMANIOS, derivados_listos, ruta_derivado
+
+register = template.Library()
+
+
+def _srcset(storage, nombre, tamanios, formato):
+    return ', '.join(
+        f'{storage.url(ruta_derivado(nombre, tamanio, formato))} {TAMANIOS[tamanio][0]}w'
+        for tamanio in tamanios
+    )
+
+
+@register.simple_tag
+def imagen_pet(foto, alt='', clase='', sizes='100vw', tamanio=None):
+    """
+    <picture> con WebP y JPEG de respaldo a partir de los derivados de la foto.
+    Por defecto ofrece card y full con srcset/sizes; tamanio='thumb' usa la miniatura.
+    Mientras los derivados no existan se muestra la imagen original.
+    """
+    if not foto:
+        return ''
+    # Los derivados viven en el mismo storage que la foto
+    nombre, storage = foto.name, foto.storage
+    if not derivados_listos(nombre, storage):
+        return format_html('<img src="{}" class="{}" alt="{}" loading="lazy">', foto.url, clase, alt)
+
+    tamanios = [tamanio] if tamanio else ['card', 'full']
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" class="{}" alt="{}" loading="lazy">'
+        '</picture>',
+        _srcset(storage, nombre, tamanios, 'webp'), sizes,
+        storage.url(ruta_derivado(nombre, tamanios[0], 'jpg')),
+        _srcset(storage, nombre, tamanios, 'jpg'), sizes, clase, alt,
+    )
@@ -1,3 +1,1444 @@
-from django.test import TestCase
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.exceptions import RequestDataTooBig
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DataError, DatabaseError, connection, transaction
+from django.http import Http404
+from django.template import Context, Template
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import csv
+import datetime
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from google.api_core import exceptions as google_exceptions
+from PIL import Image
+
+from appsuavespets import async_views
+from appsuavespets.models import (
+    ArchivoAdjunto, ContenidoArchivo, Cuidados, EventoClinico, InfoVetCache, Notificacion, Pet, Raza, SesionUsuario,
+    TareaInfoVet, Usuario,
+)
+from appsuavespets.services.adjuntos import FotoPendiente, registrar_adjuntos
+from appsuavespets.services.almacenamiento import almacenamiento, liberar_referencia
+from appsuavespets.services.coalescencia import estadisticas, single_flight
+from appsuavespets.services.cola_vet import (
+    MAX_INTENTOS, TIEMPO_ABANDONO, encolar_info, procesar_pendientes, procesar_tarea, reservar_tarea, tomar_siguiente,
+)
+from appsuavespets.services.gemini_client import CircuitBreaker, CircuitoAbierto, ClienteGemini, cliente_gemini
+from appsuavespets.services.gemini_service import (
+    GeminiVetService, ParserSecciones, calcular_huella, parsear_respuesta, perfil_pet,
+)
+from appsuavespets.services import indice_razas
+from appsuavespets.services.http_client import ClienteHTTP
+from appsuavespets.services.indice_razas import IndiceRazas, RazaIndexada
+from appsuavespets.services.imagenes import derivados_generados, generar_derivados, ruta_derivado
+from appsuavespets.services import pet_api_service
+from appsuavespets.services.paginacion import codificar_cursor
+from appsuavespets.services.pet_api_service import PetAPIService
+from appsuavespets.services.validacion_imagenes import ImagenInvalida, validar_imagen
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        servidor = self.server
+        servidor.puertos.append(self.client_address[1])
+        if servidor.fallos_pendientes:
+            servidor.fallos_pendientes -= 1
+            estado, cuerpo = 503, b'{}'
+        else:
+            estado, cuerpo = 200, b'[{"name": "Beagle"}]'
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(HTTP_TIMEOUT=5, HTTP_REINTENTOS=2, HTTP_MAX_CONCURRENCIA_HOST=4)
+class ClienteHTTPTests(SimpleTestCase):
+    def setUp(self):
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        self.servidor.puertos = []
+        self.servidor.fallos_pendientes = 0
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.servidor.server_port}/v1/breeds'
+        self.cliente = ClienteHTTP()
+
+    def tearDown(self):
+        self.cliente.cerrar()
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+    def test_reutiliza_la_conexion(self):
+        for _ in range(5):
+            self.assertEqual(self.cliente.get(self.url).json(), [{'name': 'Beagle'}])
+        self.assertEqual(len(self.servidor.puertos), 5)
+        self.assertEqual(len(set(self.servidor.puertos)), 1)
+
+    def test_reintenta_get_ante_error_del_servidor(self):
+        self.servidor.fallos_pendientes = 2
+        response = self.cliente.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.servidor.puertos), 3)
+
+    def test_devuelve_el_error_al_agotar_reintentos(self):
+        self.servidor.fallos_pendientes = 10
+        response = self.cliente.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.servidor.puertos), 3)
+
+
+class _ModeloFalso:
+    """Modelo de Gemini que responde con la lista `respuestas` (excepciones o textos)"""
+
+    def __init__(self, *respuestas):
+        self.respuestas = list(respuestas)
+        self.llamadas = 0
+
+    def generate_content(self, prompt, request_options=None, **kwargs):
+        self.llamadas += 1
+        respuesta = self.respuestas.pop(0)
+        if isinstance(respuesta, BaseException):
+            raise respuesta
+        return mock.Mock(text=respuesta)
+
+
+@override_settings(GEMINI_CIRCUITO_UMBRAL=2, GEMINI_CIRCUITO_ENFRIAMIENTO=30, GEMINI_TIMEOUT=10, GEMINI_REINTENTOS=2)
+class ClienteGeminiTests(SimpleTestCase):
+    def setUp(self):
+        self.reloj = 1000.0
+        for parche in (
+            mock.patch('appsuavespets.services.gemini_client.time.monotonic', side_effect=lambda: self.reloj),
+            mock.patch('appsuavespets.services.gemini_client.time.sleep'),
+            mock.patch.object(ClienteGemini, '_espera', return_value=0.1),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+        parche = mock.patch('appsuavespets.services.gemini_client.contadores.sumar')
+        self.sumar = parche.start()
+        self.addCleanup(parche.stop)
+        self.cliente = ClienteGemini()
+
+    def test_abre_el_circuito_y_lo_cierra_tras_la_prueba(self):
+        circuito = self.cliente.circuito
+        self.cliente._modelo = _ModeloFalso(google_exceptions.InvalidArgument('x'), google_exceptions.InvalidArgument('x'), 'ok')
+        for _ in range(2):
+            with self.assertRaises(google_exceptions.InvalidArgument):
+                self.cliente.generar('hola')
+        self.assertEqual(circuito.estado, CircuitBreaker.ABIERTO)
+        with self.assertRaises(CircuitoAbierto):
+            self.cliente.generar('hola')
+
+        self.reloj += 31
+        self.assertTrue(circuito.permitir())
+        self.assertEqual(circuito.estado, CircuitBreaker.SEMIABIERTO)
+        # Una sola llamada de prueba a la vez
+        self.assertFalse(circuito.permitir())
+        circuito.liberar()
+        self.assertEqual(self.cliente.generar('hola').text, 'ok')
+        self.assertEqual(circuito.estado, CircuitBreaker.CERRADO)
+        self.assertEqual(
+            [c.args for c in self.sumar.call_args_list],
+            [('circuito:gemini', 'abierto'), ('circuito:gemini', 'semiabierto'), ('circuito:gemini', 'cerrado')],
+        )
+
+    def test_registra_la_metrica_sin_el_lock_tomado(self):
+        circuito = CircuitBreaker('prueba', umbral=1, enfriamiento=30)
+        self.sumar.side_effect = lambda *args: self.assertFalse(circuito._lock.locked())
+        circuito.registrar_fallo()
+        self.sumar.assert_called_once_with('circuito:prueba', 'abierto')
+
+    def test_falla_en_semiabierto_vuelve_a_abrir(self):
+        circuito = CircuitBreaker('prueba', umbral=1, enfriamiento=30)
+        circuito.registrar_fallo()
+        self.reloj += 31
+        self.assertTrue(circuito.permitir())
+        circuito.registrar_fallo()
+        self.assertEqual(circuito.estado, CircuitBreaker.ABIERTO)
+        self.assertFalse(circuito.permitir())
+
+    def test_reintenta_hasta_gemini_reintentos(self):
+        self.cliente._modelo = _ModeloFalso(*[google_exceptions.ServiceUnavailable('x')] * 3, 'ok')
+        with self.assertRaises(google_exceptions.ServiceUnavailable):
+            self.cliente.generar('hola')
+        self.assertEqual(self.cliente._modelo.llamadas, 3)
+        self.assertEqual(self.cliente.circuito.fallos_consecutivos, 1)
+
+        self.cliente._modelo = _ModeloFalso(google_exceptions.ServiceUnavailable('x'), 'ok')
+        self.assertEqual(self.cliente.generar('hola').text, 'ok')
+        self.assertEqual(self.cliente.circuito.fallos_consecutivos, 0)
+
+    def test_no_reintenta_si_la_espera_pasa_el_plazo(self):
+        self.cliente._modelo = _ModeloFalso(TimeoutError(), 'ok')
+        with mock.patch.object(ClienteGemini, '_espera', return_value=11):
+            with self.assertRaises(TimeoutError):
+                self.cliente.generar('hola')
+        self.assertEqual(self.cliente._modelo.llamadas, 1)
+
+    def test_error_propio_no_cuenta_como_fallo(self):
+        self.cliente._modelo = _ModeloFalso(ValueError('bug'))
+        with self.assertRaises(ValueError):
+            self.cliente.generar('hola')
+        self.assertEqual(self.cliente.circuito.fallos_consecutivos, 0)
+
+
+@override_settings(EVENTOS_POR_PAGINA=10)
+class ListadoEventosClinicosTests(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            'socio@suavespets.cl', 'clave12345', nombre='Socio',
+            tipo_identificacion='rut', identificacion='1', tipo_usuario='socio',
+        )
+        self.pet = Pet.objects.create(
+            nombre_pet='Firulais', especie='perro', tamanio='mediano', raza='Beagle',
+            responsable=self.usuario, is_deleted=0,
+        )
+        self.client.force_login(self.usuario)
+        self.url = f'/pets/{self.pet.id_pet}/eventos/'
+        self.creados = 0
+
+    def crear_eventos(self, cantidad):
+        inicio = datetime.date(2024, 1, 1)
+        for _ in range(cantidad):
+            # Varios eventos por día y algunos antiguos con la misma fecha_registro para ejercitar el desempate
+            evento = EventoClinico.objects.create(
+                id_pet=self.pet, id_usuario_responsable=self.usuario,
+                fecha_evento=inicio + datetime.timedelta(days=self.creados // 3),
+                tipo_evento='preconsulta', sintomas_reportados='Tos',
+                fecha_registro=EventoClinico.FECHA_REGISTRO_DESCONOCIDA if self.creados % 4 == 0 else timezone.now(),
+                is_deleted=0,
+            )
+            ArchivoAdjunto.objects.bulk_create([
+                ArchivoAdjunto(id_eventoclinico=evento, archivo_url=f'eventos_clinicos/{evento.pk}_{i}.jpg',
+                               fecha_subida=timezone.now(), is_deleted=0)
+                for i in range(2)
+            ])
+            self.creados += 1
+
+    def consultas(self, url):
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        # Ordena por las columnas de evento_timeline_idx, sin expresiones
+        self.assertFalse(any('COALESCE' in consulta['sql'] for consulta in contexto.captured_queries))
+        return len(contexto.captured_queries), response
+
+    def test_consultas_constantes_con_historial_largo(self):
+        self.crear_eventos(3)
+        pocas, _ = self.consultas(self.url)
+        self.crear_eventos(60)
+        muchas, response = self.consultas(self.url)
+        self.assertEqual(pocas, muchas)
+        self.assertEqual(len(response.context['eventos']), 10)
+        self.assertTrue(all(len(evento.fotos) == 2 for evento in response.context['eventos']))
+
+    def test_cargar_mas_recorre_todo_sin_repetir(self):
+        self.crear_eventos(25)
+        vistos = []
+        url = self.url
+        while url:
+            _, response = self.consultas(url)
+            vistos += [evento.id_eventoclinico for evento in response.context['eventos']]
+            cursor = response.context['cursor_siguiente']
+            url = f'{self.url}?cursor={cursor}&fragmento=1' if cursor else None
+        self.assertEqual(len(vistos), 25)
+        self.assertEqual(set(vistos), set(EventoClinico.objects.values_list('id_eventoclinico', flat=True)))
+        fechas = dict(EventoClinico.objects.values_list('id_eventoclinico', 'fecha_evento'))
+        self.assertEqual([fechas[i] for i in vistos], sorted(fechas[i] for i in vistos)[::-1])
+        self.assertIsNone(re.search(r'<html', response.content.decode()))
+        self.assertNotIn('01/01/1900', response.content.decode())
+
+
+class ApiPetsCondicionalTests(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            'socio@suavespets.cl', 'clave12345', nombre='Socio',
+            tipo_identificacion='rut', identificacion='1', tipo_usuario='socio',
+        )
+        self.pet = Pet.objects.create(
+            nombre_pet='Firulais', especie='perro', tamanio='mediano', raza='Beagle',
+            responsable=self.usuario, is_deleted=0,
+        )
+        self.client.force_login(self.usuario)
+
+    def etag(self, url):
+        response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def estado(self, url, etag):
+        return self.client.get(url, secure=True, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def test_304_con_una_consulta_si_no_hubo_cambios(self):
+        for url in ('/api/pets/', f'/api/pets/{self.pet.id_pet}/'):
+            etag = self.etag(url)
+            with CaptureQueriesContext(connection) as contexto:
+                self.assertEqual(self.estado(url, etag), 304)
+            self.assertEqual(len([q for q in contexto.captured_queries if '"pet"' in q['sql']]), 1)
+
+    def test_toda_escritura_cambia_la_version(self):
+        url = '/api/pets/?expand=ultimos_eventos'
+        etag = self.etag(url)
+        Pet.objects.filter(pk=self.pet.pk).update(alergias='Polen')
+        self.assertEqual(self.estado(url, etag), 200)
+
+        etag = self.etag(url)
+        EventoClinico.objects.create(
+            id_pet=self.pet, id_usuario_responsable=self.usuario, fecha_evento=datetime.date(2024, 1, 1),
+            tipo_evento='preconsulta', sintomas_reportados='Tos', is_deleted=0,
+        )
+        self.assertEqual(self.estado(url, etag), 200)
+
+        etag = self.etag('/api/pets/')
+        self.assertEqual(self.client.delete(f'/api/pets/{self.pet.id_pet}/', secure=True).status_code, 204)
+        self.assertEqual(self.estado('/api/pets/', etag), 200)
+
+    def test_miniatura_lista_y_datos_del_veterinario_cambian_la_version(self):
+        Pet.objects.filter(pk=self.pet.pk).update(foto_url='blobs/ab/cd/foto.jpg')
+        url = '/api/pets/?fields=nombre_pet,foto_miniatura'
+        etag = self.etag(url)
+        derivados_generados.send(sender=generar_derivados, nombre='blobs/ab/cd/foto.jpg')
+        self.assertEqual(self.estado(url, etag), 200)
+
+        veterinario = Usuario.objects.create_user(
+            'vet@suavespets.cl', 'clave12345', nombre='Vet', tipo_identificacion='rut',
+            identificacion='2', tipo_usuario='veterinario',
+        )
+        Pet.objects.filter(pk=self.pet.pk).update(veterinario=veterinario)
+        url = '/api/pets/?expand=veterinario'
+        response = self.client.get(url, secure=True)
+        self.assertFalse(response.has_header('Last-Modified'))
+        Usuario.objects.filter(pk=veterinario.pk).update(nombre='Dra. Vet')
+        self.assertEqual(self.estado(url, response['ETag']), 200)
+
+
+class ApiPetsPaginacionTests(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            'socio@suavespets.cl', 'clave12345', nombre='Socio',
+            tipo_identificacion='rut', identificacion='1', tipo_usuario='socio',
+        )
+        # Muchas mascotas con los mismos valores en los filtros: el cursor desempata por id_pet
+        for i in range(13):
+            Pet.objects.create(
+                nombre_pet=f'Pet {i}', especie='perro' if i % 3 else 'gato', tamanio='mediano',
+                raza='Beagle', responsable=self.usuario, is_deleted=0,
+            )
+        self.client.force_login(self.usuario)
+
+    def pagina(self, parametros):
+        response = self.client.get(f'/api/pets/?{parametros}', secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_recorre_hacia_adelante_y_hacia_atras(self):
+        perros = list(Pet.objects.filter(especie='perro').order_by('pk').values_list('pk', flat=True))
+        paginas, datos = [], self.pagina('especie=perro&page_size=3')
+        self.assertIsNone(datos['prev'])
+        while True:
+            paginas.append([pet['id_pet'] for pet in datos['results']])
+            if not datos['next']:
+                break
+            datos = self.pagina(f"especie=perro&page_size=3&cursor={datos['next']}")
+        self.assertEqual(sum(paginas, []), perros)
+        self.assertEqual([len(p) for p in paginas], [3, 3, 2])
+
+        for esperada in reversed(paginas[:-1]):
+            datos = self.pagina(f"especie=perro&page_size=3&cursor={datos['prev']}")
+            self.assertEqual([pet['id_pet'] for pet in datos['results']], esperada)
+        self.assertIsNone(datos['prev'])
+        self.assertIsNotNone(datos['next'])
+
+    def test_cursor_alterado_devuelve_400(self):
+        for cursor in ('no-es-base64!', codificar_cursor(['x', 1]), codificar_cursor(['s', 'uno']), codificar_cursor([1, 2, 3])):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f'/api/pets/?cursor={cursor}', secure=True)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': 'Cursor inválido'})
+
+    def test_consultas_acotadas_con_filtros(self):
+        def consultas(parametros):
+            with CaptureQueriesContext(connection) as contexto:
+                datos = self.pagina(parametros)
+            return len(contexto.captured_queries), datos
+
+        primera, datos = consultas('especie=perro&tamanio=mediano&raza=Beagle&page_size=2')
+        for _ in range(3):
+            siguiente, datos = consultas(f"especie=perro&tamanio=mediano&raza=Beagle&page_size=2&cursor={datos['next']}")
+            self.assertEqual(siguiente, primera)
+        self.assertLessEqual(primera, 4)
+
+
+RAZAS_PERRO = ['Beagle', 'Bernese Mountain Dog', 'Border Collie', 'German Shepherd Dog', 'Golden Retriever', 'Rottweiler']
+
+
+class IndiceRazasTests(SimpleTestCase):
+    def setUp(self):
+        self.indice = IndiceRazas('perro', 'v1', [
+            RazaIndexada(i, nombre.lower().replace(' ', '_'), nombre) for i, nombre in enumerate(RAZAS_PERRO)
+        ])
+
+    def nombres(self, razas):
+        return [raza.nombre for raza in razas]
+
+    def test_busca_por_nombre_alias_y_variantes(self):
+        casos = {
+            'Beagle': 'Beagle',
+            '  GOLDEN-retriever ': 'Golden Retriever',
+            'pastor alemán': 'German Shepherd Dog',
+            'Ovejero Aleman': 'German Shepherd Dog',
+            'rotweiler': 'Rottweiler',
+            'bigle': 'Beagle',
+        }
+        for texto, esperado in casos.items():
+            with self.subTest(texto=texto):
+                self.assertEqual(self.indice.buscar(texto).nombre, esperado)
+        self.assertIsNone(self.indice.buscar('Chihuahua'))
+        self.assertIsNone(self.indice.buscar(''))
+
+    def test_autocompletar_prioriza_el_comienzo_del_nombre(self):
+        self.assertEqual(self.nombres(self.indice.autocompletar('b')), ['Beagle', 'Bernese Mountain Dog', 'Border Collie'])
+        # 'shepherd' es una palabra intermedia; 'pastor' un alias
+        self.assertEqual(self.nombres(self.indice.autocompletar('Shep')), ['German Shepherd Dog'])
+        self.assertEqual(self.nombres(self.indice.autocompletar('pastor')), ['German Shepherd Dog'])
+        self.assertEqual(self.nombres(self.indice.autocompletar('g')), ['German Shepherd Dog', 'Golden Retriever'])
+        self.assertEqual(self.nombres(self.indice.autocompletar('b', limite=2)), ['Beagle', 'Bernese Mountain Dog'])
+        self.assertEqual(self.indice.autocompletar('xyz'), [])
+
+
+class BuscarRazasAPITests(TestCase):
+    def setUp(self):
+        indice_razas._indices.clear()
+        self.addCleanup(indice_razas._indices.clear)
+        for nombre in RAZAS_PERRO:
+            Raza.objects.create(especie='perro', id_externo=nombre[:3], nombre=nombre, fecha_actualizacion=timezone.now())
+
+    def buscar(self, parametros):
+        return self.client.get(f'/api/razas/buscar/?{parametros}', secure=True)
+
+    def test_autocompleta_por_prefijo_con_limite(self):
+        response = self.buscar('especie=perro&q=b')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['razas'],
+            [{'id': 'Bea', 'name': 'Beagle'}, {'id': 'Ber', 'name': 'Bernese Mountain Dog'}, {'id': 'Bor', 'name': 'Border Collie'}],
+        )
+        self.assertIn('max-age', response['Cache-Control'])
+        self.assertEqual(len(self.buscar('especie=perro&q=b&limite=1').json()['razas']), 1)
+        self.assertEqual(len(self.buscar('especie=perro&q=b&limite=abc').json()['razas']), 3)
+        self.assertEqual(self.buscar('especie=perro&q=pastor%20alem').json()['razas'], [{'id': 'Ger', 'name': 'German Shepherd Dog'}])
+
+    def test_especie_desconocida(self):
+        for especie in ('', 'loro'):
+            with self.subTest(especie=especie):
+                self.assertEqual(self.buscar(f'especie={especie}&q=b').status_code, 400)
+
+    def test_sin_catalogo_usa_las_razas_de_respaldo(self):
+        nombres = [raza['name'] for raza in self.buscar('especie=gato&q=s').json()['razas']]
+        self.assertIn('Siamese', nombres)
+
+
+@override_settings(RAZAS_TTL_SUAVE=100, RAZAS_TTL_DURO=1000, RAZAS_TTL_NEGATIVO=10)
+class RazasStaleWhileRevalidateTests(TestCase):
+    def setUp(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        ajustes = override_settings(RAZAS_CACHE_DIR=carpeta)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        cache.clear()
+        caches['coordinacion'].clear()
+
+        self.reloj = 1_000_000.0
+        self.respuesta = mock.Mock(status_code=200, json=lambda: [{'name': 'Beagle'}])
+        self.get = mock.Mock(side_effect=lambda *args, **kwargs: self.respuesta)
+        self.refrescos = mock.Mock()
+        for parche in (
+            mock.patch.object(pet_api_service.cliente_http, 'get', self.get),
+            mock.patch.object(pet_api_service, 'time', mock.Mock(time=lambda: self.reloj)),
+            mock.patch.object(pet_api_service, '_refrescos', self.refrescos),
+            # El refresco corre en el thread del test: no debe cerrar su conexión
+            mock.patch.object(pet_api_service, 'connections'),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def test_sirve_la_cache_fresca_sin_llamar_a_la_api(self):
+        self.assertEqual(PetAPIService.get_dog_breeds(), [{'name': 'Beagle'}])
+        self.reloj += 99
+        self.assertEqual(PetAPIService.get_dog_breeds(), [{'name': 'Beagle'}])
+        self.assertEqual(self.get.call_count, 1)
+        self.refrescos.submit.assert_not_called()
+
+    def test_vencida_sirve_la_lista_vieja_y_refresca_en_segundo_plano(self):
+        PetAPIService.get_dog_breeds()
+        self.respuesta = mock.Mock(status_code=200, json=lambda: [{'name': 'Beagle'}, {'name': 'Boxer'}])
+        self.reloj += 101
+        self.assertEqual(PetAPIService.get_dog_breeds(), [{'name': 'Beagle'}])
+        self.assertEqual(PetAPIService.get_dog_breeds(), [{'name': 'Beagle'}])
+        # Un solo refresco programado aunque lleguen varios requests
+        self.assertEqual(self.refrescos.submit.call_count, 1)
+        self.assertEqual(self.get.call_count, 1)
+
+        self.refrescos.submit.call_args.args[0]()
+        self.assertEqual(PetAPIService.get_dog_breeds(), [{'name': 'Beagle'}, {'name': 'Boxer'}])
+        self.assertEqual(self.get.call_count, 2)
+
+    def test_un_worker_nuevo_arranca_con_la_copia_en_disco(self):
+        PetAPIService.get_dog_breeds()
+        cache.clear()
+        self.assertEqual(PetAPIService.get_dog_breeds(), [{'name': 'Beagle'}])
+        self.assertEqual(self.get.call_count, 1)
+
+        # Pasado el TTL duro la copia en disco ya no sirve
+        cache.clear()
+        self.reloj += 1001
+        PetAPIService.get_dog_breeds()
+        self.assertEqual(self.get.call_count, 2)
+
+    def test_recuerda_el_fallo_durante_el_ttl_negativo(self):
+        self.respuesta = mock.Mock(status_code=503)
+        self.assertEqual(PetAPIService.get_dog_breeds(), [])
+        caches['coordinacion'].clear()
+        self.assertEqual(PetAPIService.get_dog_breeds(), [])
+        self.assertEqual(self.get.call_count, 1)
+        self.assertFalse(os.listdir(settings.RAZAS_CACHE_DIR))
+
+
+@override_settings(IMAGENES_POOL_TAMANIO=8)
+class ImagenesPoolTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['coordinacion'].clear()
+        pet_api_service._imagenes_servidas.clear()
+        self.addCleanup(pet_api_service._imagenes_servidas.clear)
+        urls = [{'url': f'https://cdn.example/{i}.jpg'} for i in range(8)]
+        self.get = mock.Mock(return_value=mock.Mock(status_code=200, json=lambda: urls + urls[:2]))
+        self.refrescos = mock.Mock()
+        for parche in (
+            mock.patch.object(pet_api_service.cliente_http, 'get', self.get),
+            mock.patch.object(pet_api_service, '_refrescos', self.refrescos),
+            mock.patch.object(pet_api_service, 'connections'),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def rellenar(self):
+        self.refrescos.submit.call_args.args[0]()
+        cache.delete('imagenes:perro:pedido')
+        self.refrescos.reset_mock()
+
+    def test_sin_lote_devuelve_none_y_pide_uno(self):
+        self.assertIsNone(PetAPIService.get_random_image('perro'))
+        self.assertIsNone(PetAPIService.get_random_image('perro'))
+        self.assertEqual(self.refrescos.submit.call_count, 1)
+        self.get.assert_not_called()
+
+        self.rellenar()
+        self.assertEqual(self.get.call_args.kwargs['params'], {'limit': 8})
+        self.assertRegex(PetAPIService.get_random_image('Perro'), r'^https://cdn\.example/[0-7]\.jpg$')
+        self.assertIsNone(PetAPIService.get_random_image('loro'))
+
+    def test_pide_el_siguiente_lote_al_servir_tres_cuartos(self):
+        PetAPIService.get_random_image('perro')
+        self.rellenar()
+        lote = caches['coordinacion'].get('imagenes:perro:lote')
+        self.assertEqual(len(lote['urls']), 8)
+        for _ in range(5):
+            PetAPIService.get_random_image('perro')
+        self.refrescos.submit.assert_not_called()
+        PetAPIService.get_random_image('perro')
+        self.assertEqual(self.refrescos.submit.call_count, 1)
+
+        # El lote nuevo reinicia la cuenta de este proceso
+        self.rellenar()
+        self.assertNotEqual(caches['coordinacion'].get('imagenes:perro:lote')['version'], lote['version'])
+        PetAPIService.get_random_image('perro')
+        self.refrescos.submit.assert_not_called()
+
+    def test_si_la_api_falla_sigue_sin_lote(self):
+        self.get.return_value = mock.Mock(status_code=503)
+        PetAPIService.get_random_image('perro')
+        self.rellenar()
+        self.assertIsNone(PetAPIService.get_random_image('perro'))
+        self.assertIsNone(caches['coordinacion'].get('imagenes:perro:lote'))
+
+
+@override_settings(FOTO_MAX_BYTES=64 * 1024, FOTO_MAX_PIXELES=10_000, SUBIDA_MAX_BYTES=512 * 1024)
+class LimiteSubidaTests(SimpleTestCase):
+    def setUp(self):
+        contenido = io.BytesIO()
+        Image.new('RGB', (80, 60), (0, 90, 0)).save(contenido, 'JPEG')
+        self.jpg = contenido.getvalue()
+
+    def subir(self, **archivos):
+        datos = {campo: SimpleUploadedFile(nombre, contenido, tipo) for campo, (nombre, contenido, tipo) in archivos.items()}
+        return RequestFactory().post('/pets/crear/', datos).FILES
+
+    def error(self, archivo):
+        with self.assertRaises(ImagenInvalida) as contexto:
+            validar_imagen(archivo)
+        return str(contexto.exception)
+
+    def test_acepta_una_foto_valida(self):
+        foto = self.subir(foto_url=('rex.jpg', self.jpg, 'image/jpeg'))['foto_url']
+        self.assertEqual(validar_imagen(foto), ('JPEG', 80, 60))
+        self.assertEqual(foto.read(), self.jpg)
+
+    def test_corta_el_archivo_que_supera_el_limite(self):
+        foto = self.subir(foto_url=('rex.jpg', self.jpg + b'\0' * 100 * 1024, 'image/jpeg'))['foto_url']
+        self.assertEqual(foto.size, 0)
+        self.assertEqual(self.error(foto), 'La imagen supera 0.0625 MB')
+
+    def test_rechaza_una_firma_que_no_es_jpg_ni_png(self):
+        fotos = self.subir(fotos=('rex.jpg', b'GIF89a' + b'\0' * 1024, 'image/jpeg'))
+        self.assertEqual(self.error(fotos['fotos']), 'Solo se permiten imágenes JPG o PNG')
+
+    def test_rechaza_por_pixeles_sin_decodificar(self):
+        contenido = io.BytesIO()
+        Image.new('RGB', (200, 100)).save(contenido, 'PNG')
+        foto = self.subir(foto_url=('rex.png', contenido.getvalue(), 'image/png'))['foto_url']
+        self.assertEqual(self.error(foto), 'La imagen supera 0.01 megapíxeles')
+
+    def test_otros_campos_no_se_revisan(self):
+        documento = b'%PDF-1.7' + b'\0' * 100 * 1024
+        archivos = self.subir(documento=('informe.pdf', documento, 'application/pdf'))
+        self.assertEqual(archivos['documento'].read(), documento)
+
+    def test_el_cuerpo_completo_tiene_un_limite_global(self):
+        with self.assertRaises(RequestDataTooBig):
+            self.subir(documento=('informe.pdf', b'\0' * 600 * 1024, 'application/pdf'))
+
+
+class FormaPetTests(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            'socio@suavespets.cl', 'clave12345', nombre='Socio',
+            tipo_identificacion='rut', identificacion='1', tipo_usuario='socio',
+        )
+        self.rex, self.toby = [
+            Pet.objects.create(nombre_pet=nombre, especie='perro', tamanio='mediano', raza='Beagle',
+                               responsable=self.usuario, is_deleted=0)
+            for nombre in ('Rex', 'Toby')
+        ]
+        self.client.force_login(self.usuario)
+
+    def api(self, parametros, estado=200):
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(f'/api/pets/?{parametros}', secure=True)
+        self.assertEqual(response.status_code, estado)
+        return response.json(), contexto.captured_queries
+
+    def evento(self, pet, dias, **campos):
+        return EventoClinico.objects.create(
+            id_pet=pet, id_usuario_responsable=self.usuario, fecha_evento=datetime.date(2024, 1, 1) + datetime.timedelta(days=dias),
+            tipo_evento='control', sintomas_reportados='-', is_deleted=campos.pop('is_deleted', 0), **campos,
+        )
+
+    def test_fields_limita_el_json_y_las_columnas(self):
+        datos, consultas = self.api('fields=nombre_pet,especie')
+        self.assertEqual(datos['results'][0], {'id_pet': self.rex.pk, 'nombre_pet': 'Rex', 'especie': 'perro'})
+        pagina = next(c['sql'] for c in consultas if 'nombre_pet' in c['sql'] and 'LIMIT' in c['sql'])
+        self.assertNotIn('descripcion_pet', pagina)
+        self.assertNotIn('JOIN', pagina)
+
+    def test_campos_o_expansiones_desconocidos_devuelven_400(self):
+        datos, _ = self.api('fields=nombre_pet,password', estado=400)
+        self.assertEqual(datos, {'error': 'Campos desconocidos: password'})
+        datos, _ = self.api('expand=eventos', estado=400)
+        self.assertEqual(datos, {'error': 'Campos desconocidos: eventos'})
+
+    def test_expand_responsable(self):
+        datos, _ = self.api('fields=nombre_pet&expand=responsable')
+        self.assertEqual(
+            datos['results'][0]['responsable'],
+            {'id_usuario': self.usuario.pk, 'nombre': 'Socio', 'email': 'socio@suavespets.cl'},
+        )
+        self.assertNotIn('password', json.dumps(datos))
+
+    def test_expand_ultimos_eventos_limita_por_mascota(self):
+        eventos_rex = [self.evento(self.rex, dias) for dias in range(5)]
+        self.evento(self.rex, 10, is_deleted=1)
+        evento_toby = self.evento(self.toby, 0)
+        datos, consultas = self.api('fields=nombre_pet&expand=ultimos_eventos')
+
+        por_pet = {pet['id_pet']: pet['ultimos_eventos'] for pet in datos['results']}
+        self.assertEqual([e['id_eventoclinico'] for e in por_pet[self.rex.pk]], [e.pk for e in eventos_rex[:1:-1]])
+        self.assertEqual(por_pet[self.toby.pk], [{
+            'id_eventoclinico': evento_toby.pk, 'fecha_evento': '2024-01-01',
+            'tipo_evento': 'control', 'estado_preconsulta': None,
+        }])
+        # Una sola consulta con ROW_NUMBER para todas las mascotas de la página
+        self.assertEqual(sum('ROW_NUMBER' in c['sql'] for c in consultas), 1)
+
+
+class WarmVetInfoTests(TransactionTestCase):
+    # El comando genera en un ThreadPoolExecutor: sus threads solo ven datos confirmados
+    def setUp(self):
+        cache.clear()
+        usuario = Usuario.objects.create_user(
+            'socio@suavespets.cl', 'clave12345', nombre='Socio',
+            tipo_identificacion='rut', identificacion='1', tipo_usuario='socio',
+        )
+        self.pets = [
+            Pet.objects.create(nombre_pet=nombre, especie='perro', tamanio='mediano', raza=raza, sexo='macho', edad=3,
+                               responsable=usuario, is_deleted=0)
+            for nombre, raza in (('Rex', 'Beagle'), ('Toby', 'Poodle'), ('Max', 'beagle '))
+        ]
+        GeminiVetService.guardar_cache(perfil_pet(self.pets[0]), json.loads(RESPUESTA_GEMINI))
+        parche = mock.patch.object(cliente_gemini, 'generar', return_value=mock.Mock(text=RESPUESTA_GEMINI))
+        self.generar = parche.start()
+        self.addCleanup(parche.stop)
+
+    def calentar(self, *argumentos):
+        salida, errores = io.StringIO(), io.StringIO()
+        call_command('warm_vet_info', '--rpm', '0', '--concurrencia', '1', *argumentos, stdout=salida, stderr=errores)
+        return salida.getvalue(), errores.getvalue()
+
+    def test_dry_run_no_llama_a_gemini(self):
+        salida, _ = self.calentar('--dry-run')
+        self.assertIn('Perfiles distintos: 2 | ya en cache: 1 | llamadas a realizar: 1', salida)
+        self.generar.assert_not_called()
+        self.assertEqual(InfoVetCache.objects.count(), 1)
+
+    def test_reanuda_omitiendo_las_huellas_en_cache(self):
+        salida, _ = self.calentar()
+        self.assertIn('Listo: ok=1 errores=0', salida)
+        self.assertEqual(self.generar.call_count, 1)
+        self.assertIsNotNone(GeminiVetService.obtener_cache(perfil_pet(self.pets[1])))
+
+        salida, _ = self.calentar()
+        self.assertIn('llamadas a realizar: 0', salida)
+        self.assertEqual(self.generar.call_count, 1)
+
+    def test_catalogo_agrega_las_razas_de_la_api(self):
+        perros = [{'name': 'Akita', 'weight': {'metric': '30 - 50'}}]
+        with mock.patch.object(PetAPIService, 'get_dog_breeds', return_value=perros), \
+                mock.patch.object(PetAPIService, 'get_cat_breeds', return_value=[]):
+            salida, errores = self.calentar('--catalogo', '--dry-run')
+        # Akita: macho y hembra en cuatro etapas
+        self.assertIn('Perfiles distintos: 10 | ya en cache: 1 | llamadas a realizar: 9', salida)
+        self.assertIn('No se pudo obtener el catálogo de razas de gato', errores)
+
+
+TEXTO_SECCIONES = (
+    '**ENFERMEDADES:**\n- Otitis: orejas caídas\n- Obesidad\n\n'
+    '## ALIMENTOS_PROHIBIDOS:\n* Chocolate: teobromina\n'
+    'CUIDADOS:\n- Cepillado semanal\n'
+)
+
+
+class ParserRespuestaTests(SimpleTestCase):
+    def test_json_valido(self):
+        info = parsear_respuesta(json.dumps({
+            'enfermedades': [{'titulo': ' Otitis ', 'detalle': 'Orejas caídas'}, {'titulo': ''}, {'detalle': 'sin título'}],
+            'cuidados': ['- Cepillado: semanal', '  '],
+            'estudios': '- Hemograma anual\n- Radiografía',
+            'referencias': {'titulo': 'no es lista'},
+        }))
+        self.assertEqual(info['enfermedades'], [{'titulo': 'Otitis', 'detalle': 'Orejas caídas'}])
+        self.assertEqual(info['cuidados'], [{'titulo': 'Cepillado', 'detalle': 'semanal'}])
+        self.assertEqual([i['titulo'] for i in info['estudios']], ['Hemograma anual', 'Radiografía'])
+        self.assertEqual((info['alimentos_prohibidos'], info['referencias']), ([], []))
+
+    def test_json_invalido_o_parcial_usa_el_parser_de_texto(self):
+        info = parsear_respuesta(TEXTO_SECCIONES)
+        self.assertEqual(info['enfermedades'], [{'titulo': 'Otitis', 'detalle': 'orejas caídas'}, {'titulo': 'Obesidad', 'detalle': ''}])
+        self.assertEqual(info['alimentos_prohibidos'], [{'titulo': 'Chocolate', 'detalle': 'teobromina'}])
+        self.assertEqual(info['cuidados'], [{'titulo': 'Cepillado semanal', 'detalle': ''}])
+
+        # Respuesta cortada a mitad del JSON o que no es un objeto
+        for texto in ('{"enfermedades": [{"titulo": "Otitis"', '["Otitis"]', '', None):
+            with self.subTest(texto=texto):
+                self.assertEqual(parsear_respuesta(texto), {seccion: [] for seccion in GeminiVetService.SECCIONES})
+
+    def test_fragmentos_que_cortan_un_encabezado(self):
+        completo = parsear_respuesta(TEXTO_SECCIONES)
+        for corte in range(1, len(TEXTO_SECCIONES)):
+            with self.subTest(corte=corte):
+                parser = ParserSecciones()
+                cerradas = parser.alimentar(TEXTO_SECCIONES[:corte]) + parser.alimentar(TEXTO_SECCIONES[corte:])
+                cerradas += parser.cerrar()
+                self.assertEqual(cerradas, ['enfermedades', 'alimentos_prohibidos', 'cuidados'])
+                self.assertEqual(parser.info, completo)
+
+    def test_cada_seccion_se_entrega_al_llegar_el_siguiente_encabezado(self):
+        parser = ParserSecciones()
+        self.assertEqual(parser.alimentar('ENFERMEDADES:\n- Otitis\nALIMENTOS_PRO'), [])
+        self.assertEqual(parser.alimentar('HIBIDOS:\n'), ['enfermedades'])
+        self.assertEqual(parser.alimentar('- Chocolate'), [])
+        self.assertEqual(parser.cerrar(), ['alimentos_prohibidos'])
+        self.assertEqual(parser.info['alimentos_prohibidos'], [{'titulo': 'Chocolate', 'detalle': ''}])
+
+
+def _breed(id_, nombre, **campos):
+    return {'id': id_, 'name': nombre, 'weight': {'metric': '10 - 15'}, **campos}
+
+
+class SyncBreedsTests(TestCase):
+    def setUp(self):
+        self.catalogos = {'perro': [_breed(1, 'Beagle'), _breed(2, 'Boxer'), _breed(3, 'Pug')], 'gato': [_breed('abys', 'Abyssinian')]}
+
+        def descargar(especie):
+            catalogo = self.catalogos[especie]
+            if isinstance(catalogo, Exception):
+                raise catalogo
+            return catalogo
+
+        parche = mock.patch.object(PetAPIService, 'descargar_catalogo', side_effect=descargar)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def sincronizar(self, *argumentos):
+        salida, errores = io.StringIO(), io.StringIO()
+        call_command('sync_breeds', *argumentos, stdout=salida, stderr=errores)
+        return salida.getvalue(), errores.getvalue()
+
+    def razas(self, especie):
+        return dict(Raza.objects.filter(especie=especie).values_list('id_externo', 'nombre'))
+
+    def test_inserta_actualiza_y_elimina(self):
+        salida, _ = self.sincronizar()
+        self.assertIn('perro: 3 razas | nuevas=3 actualizadas=0 eliminadas=0', salida)
+        self.assertEqual(self.razas('gato'), {'abys': 'Abyssinian'})
+
+        self.catalogos['perro'] = [
+            _breed(1, 'Beagle', temperament='Amistoso'), _breed(3, 'Pug'), _breed(4, 'Akita'), _breed(4, 'Akita repetida'),
+        ]
+        self.catalogos['gato'] = DatabaseError('API caída')
+        salida, errores = self.sincronizar()
+        self.assertIn('perro: 4 razas | nuevas=1 actualizadas=1 eliminadas=1', salida)
+        self.assertEqual(self.razas('perro'), {'1': 'Beagle', '3': 'Pug', '4': 'Akita'})
+        self.assertEqual(Raza.objects.get(id_externo='1').temperamento, 'Amistoso')
+        # Si la API falla el catálogo local de esa especie queda igual
+        self.assertIn('No se pudo descargar el catálogo de gato', errores)
+        self.assertEqual(self.razas('gato'), {'abys': 'Abyssinian'})
+
+    def test_catalogo_vacio_no_borra_nada(self):
+        self.sincronizar('--especie', 'perro')
+        self.catalogos['perro'] = []
+        _, errores = self.sincronizar('--especie', 'perro')
+        self.assertIn('catálogo vacío para perro', errores)
+        self.assertEqual(len(self.razas('perro')), 3)
+
+    def test_razas_api_responde_304_con_el_mismo_etag(self):
+        self.sincronizar()
+        vistas = [
+            lambda **headers: self.client.get('/api/razas/?especie=perro', secure=True, headers=headers),
+            lambda **headers: async_to_sync(async_views.RazasAPI.as_view())(
+                RequestFactory().get('/api/razas/?especie=perro', secure=True, headers=headers)
+            ),
+        ]
+        for i, pedir in enumerate(vistas):
+            with self.subTest(vista=('sync', 'async')[i]):
+                response = pedir()
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [r['name'] for r in json.loads(response.content)['razas']],
+                    list(Raza.objects.filter(especie='perro').order_by('nombre').values_list('nombre', flat=True)),
+                )
+                etag = response['ETag']
+                self.assertEqual(pedir(if_none_match=etag).status_code, 304)
+
+                # Un sync que cambia el catálogo cambia la versión
+                self.catalogos['perro'].append(_breed(10 + i, f'Raza {i}'))
+                self.sincronizar('--especie', 'perro')
+                response = pedir(if_none_match=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+
+class ApiPetsLoteTests(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            'socio@suavespets.cl', 'clave12345', nombre='Socio',
+            tipo_identificacion='rut', identificacion='1', tipo_usuario='socio',
+        )
+        Pet.objects.create(
+            nombre_pet='Firulais', especie='perro', tamanio='mediano', raza='Beagle',
+            responsable=self.usuario, numero_ficha='F-1', is_deleted=0,
+        )
+        self.client.force_login(self.usuario)
+        self.base = {'nombre_pet': 'Toby', 'descripcion_pet': 'Tranquilo', 'especie': 'perro',
+                     'sexo': 'macho', 'tamanio': 'mediano', 'es_mestizo': True}
+
+    def enviar(self, items):
+        return self.client.post('/api/pets/lote/', json.dumps(items), content_type='application/json', secure=True)
+
+    def test_mil_mascotas_con_consultas_acotadas(self):
+        items = [dict(self.base, numero_ficha=f'F-{i % 10}') for i in range(1000)]
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.enviar(items)
+        self.assertEqual(response.status_code, 201)
+        # SQLite parte cada bulk_create en INSERT de ~50 filas (límite de parámetros)
+        self.assertLess(len(contexto.captured_queries), 50)
+        self.assertEqual(Pet.objects.values('numero_ficha').distinct().count(), 1001)
+        self.assertEqual(Pet.objects.filter(raza='Mestizo').count(), 1000)
+
+    def test_errores_por_item_sin_bloquear_los_validos(self):
+        response = self.enviar([
+            self.base, dict(self.base, especie='pez'), dict(self.base, peso_kg='mucho'), 'x',
+            dict(self.base, peso_kg='NaN'), dict(self.base, peso_kg='Infinity'),
+        ])
+        self.assertEqual(response.status_code, 207)
+        estados = [r['estado'] for r in response.json()['resultados']]
+        self.assertEqual(estados, ['creado', 'error', 'error', 'error', 'error', 'error'])
+        self.assertEqual(response.json()['resultados'][4]['errores'], {'peso_kg': ['Peso inválido']})
+        self.assertIn('especie', response.json()['resultados'][1]['errores'])
+        self.assertEqual(Pet.objects.count(), 2)
+
+    def test_ficha_demasiado_larga_es_error_del_item(self):
+        response = self.enviar([self.base, dict(self.base, numero_ficha='F' * 80)])
+        self.assertEqual(response.status_code, 207)
+        self.assertIn('numero_ficha', response.json()['resultados'][1]['errores'])
+
+    @override_settings(PETS_LOTE_BLOQUE=1)
+    def test_error_de_base_marca_solo_su_bloque(self):
+        original = Pet.objects.bulk_create
+        llamadas = []
+
+        def falla_el_segundo(pets, *args, **kwargs):
+            llamadas.append(pets)
+            if len(llamadas) == 2:
+                raise DataError('value too long')
+            return original(pets, *args, **kwargs)
+
+        with mock.patch.object(Pet.objects, 'bulk_create', side_effect=falla_el_segundo):
+            response = self.enviar([self.base] * 3)
+        self.assertEqual([r['estado'] for r in response.json()['resultados']], ['creado', 'error', 'creado'])
+        self.assertEqual(Pet.objects.count(), 3)
+
+    def test_actualiza_solo_los_campos_enviados(self):
+        pet = Pet.objects.get()
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.enviar([{'id_pet': pet.pk, 'alergias': 'Polen'}, {'id_pet': pet.pk, 'edad': 4}])
+        self.assertEqual(response.status_code, 201)
+        updates = [q['sql'] for q in contexto.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        self.assertTrue(any('"alergias"' in u and '"edad"' not in u for u in updates))
+        self.assertTrue(any('"edad"' in u and '"alergias"' not in u for u in updates))
+
+
+class UnaSesionPorUsuarioTests(TestCase):
+    def setUp(self):
+        for i, email in enumerate(('socio@suavespets.cl', 'otro@suavespets.cl')):
+            Usuario.objects.create_user(
+                email, 'clave12345', nombre='Socio', tipo_identificacion='rut',
+                identificacion=str(i), tipo_usuario='socio',
+            )
+
+    def iniciar(self, email):
+        cliente = Client()
+        response = cliente.post('/login/', {'email': email, 'password': 'clave12345'}, secure=True)
+        self.assertEqual(response.status_code, 302)
+        return cliente
+
+    def test_el_nuevo_login_cierra_solo_las_sesiones_del_usuario(self):
+        primera = self.iniciar('socio@suavespets.cl')
+        otro = self.iniciar('otro@suavespets.cl')
+        segunda = self.iniciar('socio@suavespets.cl')
+        self.assertEqual(primera.get('/pets/', secure=True).status_code, 302)
+        self.assertEqual(segunda.get('/pets/', secure=True).status_code, 200)
+        self.assertEqual(otro.get('/pets/', secure=True).status_code, 200)
+        self.assertEqual(SesionUsuario.objects.count(), 2)
+
+        segunda.get('/logout/', secure=True)
+        self.assertEqual(SesionUsuario.objects.count(), 1)
+        self.assertEqual(Session.objects.count(), 1)
+
+
+class RecuperarAdjuntosTests(TestCase):
+    def setUp(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=os.path.join(carpeta, 'media'),
+                                    ARCHIVOS_TEMPORALES_DIR=os.path.join(carpeta, 'tmp'))
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.temporales = os.path.join(carpeta, 'tmp', 'adjuntos')
+
+        usuario = Usuario.objects.create_user(
+            'vet@suavespets.cl', 'clave12345', nombre='Vet',
+            tipo_identificacion='rut', identificacion='1', tipo_usuario='veterinario',
+        )
+        pet = Pet.objects.create(
+            nombre_pet='Firulais', especie='perro', tamanio='mediano', raza='Beagle',
+            responsable=usuario, is_deleted=0,
+        )
+        evento = EventoClinico.objects.create(
+            id_pet=pet, id_usuario_responsable=usuario, fecha_evento=datetime.date(2024, 1, 1),
+            tipo_evento='preconsulta', sintomas_reportados='Tos', is_deleted=0,
+        )
+        # Sin commit los threads no llegan a correr: igual que un proceso que se reinició
+        self.archivos = registrar_adjuntos(evento, [FotoPendiente(self.foto(i)) for i in range(2)], usuario)
+
+    def foto(self, i):
+        contenido = io.BytesIO()
+        Image.new('RGB', (8, 8), (i * 90, 0, 0)).save(contenido, 'PNG')
+        return SimpleUploadedFile(f'foto{i}.png', contenido.getvalue(), content_type='image/png')
+
+    def test_reintenta_los_pendientes_antiguos_y_limpia_los_temporales(self):
+        self.assertEqual(sorted(os.listdir(self.temporales)), sorted(str(a.pk) for a in self.archivos))
+        FotoPendiente(self.foto(9))  # temporal de un request que falló
+        call_command('recuperar_adjuntos', stdout=io.StringIO())
+        self.assertEqual(ArchivoAdjunto.objects.filter(estado='pendiente').count(), 2)
+        self.assertEqual(len(os.listdir(self.temporales)), 3)
+
+        os.remove(os.path.join(self.temporales, str(self.archivos[1].pk)))
+        ArchivoAdjunto.objects.update(fecha_subida=timezone.now() - datetime.timedelta(hours=1))
+        hace_una_hora = (timezone.now() - datetime.timedelta(hours=1)).timestamp()
+        for nombre in os.listdir(self.temporales):
+            os.utime(os.path.join(self.temporales, nombre), (hace_una_hora, hace_una_hora))
+        call_command('recuperar_adjuntos', stdout=io.StringIO())
+
+        listo, perdido = ArchivoAdjunto.objects.order_by('pk')
+        self.assertEqual(listo.estado, 'listo')
+        self.assertTrue(listo.url.startswith('/media/blobs/'))
+        self.assertEqual(perdido.estado, 'error')
+        self.assertEqual(os.listdir(self.temporales), [])
+
+
+class AlmacenamientoDeduplicadoTests(TestCase):
+    def setUp(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        self.media = os.path.join(carpeta, 'media')
+        ajustes = override_settings(MEDIA_ROOT=self.media, ARCHIVOS_TEMPORALES_DIR=os.path.join(carpeta, 'tmp'))
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        contenido = io.BytesIO()
+        Image.new('RGB', (8, 8), (0, 90, 0)).save(contenido, 'PNG')
+        self.png = contenido.getvalue()
+
+    def test_migrar_no_cuenta_subidas_y_el_huerfano_se_borra(self):
+        nombre = almacenamiento.save('pets/nueva.png', ContentFile(self.png))
+        self.assertEqual(os.listdir(os.path.join(self.media, 'blobs')), [nombre.split('/')[1]])
+
+        # Foto guardada con el almacenamiento anterior, con el mismo contenido
+        os.makedirs(os.path.join(self.media, 'pets'))
+        with open(os.path.join(self.media, 'pets', 'vieja.png'), 'wb') as archivo:
+            archivo.write(self.png)
+        usuario = Usuario.objects.create_user(
+            'socio@suavespets.cl', 'clave12345', nombre='Socio',
+            tipo_identificacion='rut', identificacion='1', tipo_usuario='socio',
+        )
+        pet = Pet.objects.create(nombre_pet='Firulais', especie='perro', tamanio='mediano', raza='Beagle',
+                                 responsable=usuario, is_deleted=0, foto_url='pets/vieja.png')
+        call_command('deduplicar_media', '--migrar', stdout=io.StringIO())
+
+        pet.refresh_from_db()
+        self.assertEqual(pet.foto_url.name, nombre)
+        contenido = ContenidoArchivo.objects.get()
+        self.assertEqual((contenido.referencias, contenido.subidas), (2, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.media, 'pets', 'vieja.png')))
+
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                liberar_referencia(nombre)
+        self.assertFalse(ContenidoArchivo.objects.exists())
+        self.assertFalse(almacenamiento.exists(nombre))
+
+    def test_borra_el_blob_de_una_subida_revertida(self):
+        conservado = almacenamiento.save('pets/conservada.png', ContentFile(self.png))
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                huerfano = almacenamiento.save('pets/revertida.jpg', ContentFile(b'otro contenido'))
+                raise DatabaseError('rollback')
+        self.assertTrue(almacenamiento.exists(huerfano))
+        self.assertFalse(ContenidoArchivo.objects.filter(ruta=huerfano).exists())
+
+        # Un blob recién escrito puede ser de una subida aún en curso
+        call_command('deduplicar_media', '--borrar-huerfanos', stdout=io.StringIO())
+        self.assertTrue(almacenamiento.exists(huerfano))
+
+        hace_dos_horas = time.time() - 2 * 60 * 60
+        for nombre in (huerfano, conservado):
+            os.utime(almacenamiento.path(nombre), (hace_dos_horas, hace_dos_horas))
+        salida = io.StringIO()
+        call_command('deduplicar_media', '--borrar-huerfanos', stdout=salida)
+        self.assertIn('Blobs huérfanos borrados: 1', salida.getvalue())
+        self.assertFalse(almacenamiento.exists(huerfano))
+        self.assertTrue(almacenamiento.exists(conservado))
+        self.assertEqual(ContenidoArchivo.objects.get().ruta, conservado)
+
+
+class DerivadosImagenTests(TestCase):
+    def setUp(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        self.media = os.path.join(carpeta, 'media')
+        ajustes = override_settings(MEDIA_ROOT=self.media, ARCHIVOS_TEMPORALES_DIR=os.path.join(carpeta, 'tmp'))
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        cache.clear()
+        contenido = io.BytesIO()
+        Image.new('RGB', (1600, 1000), (200, 120, 0)).save(contenido, 'JPEG')
+        self.nombre = almacenamiento.save('pets/rex.jpg', ContentFile(contenido.getvalue()))
+        usuario = Usuario.objects.create_user(
+            'socio@suavespets.cl', 'clave12345', nombre='Socio',
+            tipo_identificacion='rut', identificacion='1', tipo_usuario='socio',
+        )
+        Pet.objects.filter(pk=Pet.objects.create(
+            nombre_pet='Rex', especie='perro', tamanio='grande', raza='Beagle', responsable=usuario, is_deleted=0,
+        ).pk).update(foto_url=self.nombre)
+        self.pet = Pet.objects.get()
+
+    def archivos(self):
+        return sorted(os.listdir(os.path.dirname(almacenamiento.path(self.nombre))))
+
+    def test_escribe_los_derivados_en_su_ruta_exacta(self):
+        self.assertEqual(generar_derivados(self.nombre), 6)
+        raiz = os.path.splitext(os.path.basename(self.nombre))[0]
+        esperados = [f'{raiz}__{t}.{f}' for t in ('card', 'full', 'thumb') for f in ('jpg', 'webp')]
+        self.assertEqual(self.archivos(), sorted(esperados + [os.path.basename(self.nombre)]))
+        with almacenamiento.open(ruta_derivado(self.nombre, 'card', 'jpg')) as archivo:
+            self.assertEqual(Image.open(archivo).size, (480, 300))
+        self.assertEqual(generar_derivados(self.nombre), 0)
+
+        # Regenerar reemplaza los archivos en lugar de dejar copias renombradas (o guardarlas por hash)
+        self.assertEqual(generar_derivados(self.nombre, forzar=True), 6)
+        self.assertEqual(self.archivos(), sorted(esperados + [os.path.basename(self.nombre)]))
+        self.assertEqual(ContenidoArchivo.objects.get().referencias, 1)
+
+    def test_imagen_pet_usa_srcset_cuando_hay_derivados(self):
+        plantilla = Template('{% load imagenes %}{% imagen_pet pet.foto_url alt="Rex" sizes="280px" %}')
+        html = plantilla.render(Context({'pet': self.pet}))
+        self.assertNotIn('srcset', html)
+        self.assertIn(f'src="{almacenamiento.url(self.nombre)}"', html)
+
+        generar_derivados(self.nombre)
+        html = plantilla.render(Context({'pet': self.pet}))
+        url = lambda tamanio, formato: almacenamiento.url(ruta_derivado(self.nombre, tamanio, formato))
+        self.assertIn(f'<source type="image/webp" srcset="{url("card", "webp")} 480w, {url("full", "webp")} 1200w" sizes="280px">', html)
+        self.assertIn(f'<img src="{url("card", "jpg")}" srcset="{url("card", "jpg")} 480w, {url("full", "jpg")} 1200w"', html)
+
+
+class CoalescenciaTests(TestCase):
+    def test_solo_se_publican_resultados_exitosos(self):
+        cache = caches['coordinacion']
+        self.assertEqual(single_flight('prueba', 'razas', lambda: []), [])
+        self.assertIsNone(cache.get('sf:prueba:resultado:razas'))
+
+        self.assertEqual(single_flight('prueba', 'razas', lambda: ['Beagle']), ['Beagle'])
+        self.assertEqual(cache.get('sf:prueba:resultado:razas'), ['Beagle'])
+
+        # Otro worker tiene el lock: se espera el resultado publicado en vez de llamar
+        cache.add('sf:prueba:lock:razas', 'otro worker', 60)
+        llamada = mock.Mock(return_value=['Poodle'])
+        self.assertEqual(single_flight('prueba', 'razas', llamada, espera_max=1), ['Beagle'])
+        llamada.assert_not_called()
+        self.assertEqual(estadisticas('prueba'), {'ejecutadas': 2, 'ahorradas': 1})
+
+
+class ImportPetsTests(TestCase):
+    CSV = os.path.join(os.path.dirname(__file__), 'fixtures', 'import_pets.csv')
+
+    def setUp(self):
+        self.carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.carpeta, ignore_errors=True)
+        self.rechazos = os.path.join(self.carpeta, 'rechazos.csv')
+        socio = Usuario.objects.create_user(
+            'socio@suavespets.cl', 'clave12345', nombre='Socio',
+            tipo_identificacion='rut', identificacion='1', tipo_usuario='socio_premium',
+        )
+        Usuario.objects.create_user(
+            'vet@suavespets.cl', 'clave12345', nombre='Vet',
+            tipo_identificacion='rut', identificacion='2', tipo_usuario='veterinario',
+        )
+        self.existente = Pet.objects.create(
+            nombre_pet='Firulais', especie='perro', tamanio='mediano', raza='Beagle',
+            responsable=socio, is_deleted=0, numero_ficha='EXIST-1',
+        )
+
+    def importar(self, *argumentos, archivo=None):
+        call_command('import_pets', archivo or self.CSV, '--lote', '3', '--rechazos', self.rechazos,
+                     *argumentos, stdout=io.StringIO())
+
+    def rechazadas(self):
+        with open(self.rechazos, newline='', encoding='utf-8') as archivo:
+            return [(fila['fila'], fila['errores'].split(':')[0]) for fila in csv.DictReader(archivo)]
+
+    def comprobar_resultado(self):
+        self.assertEqual(
+            sorted(Pet.objects.values_list('numero_ficha', flat=True)), ['EXIST-1', 'IMP-1', 'IMP-2', 'IMP-3'],
+        )
+        self.assertEqual(Pet.objects.get(numero_ficha='IMP-1').veterinario.email, 'vet@suavespets.cl')
+        self.assertEqual(
+            sorted(Cuidados.objects.values_list('id_pet__numero_ficha', 'tipo_cuidado')),
+            [('EXIST-1', 'Control Veterinario'), ('IMP-1', 'Desparasitación'), ('IMP-1', 'Vacunación')],
+        )
+        # Solo vacunación y control veterinario generan recordatorio al socio premium
+        self.assertEqual(Notificacion.objects.count(), 2)
+        self.assertEqual(
+            self.rechazadas(), [('3', 'email_responsable'), ('4', 'especie'), ('8', 'numero_ficha')],
+        )
+
+    def test_importa_por_bloques_con_rechazos_y_cuidados_de_fichas_existentes(self):
+        with CaptureQueriesContext(connection) as contexto:
+            self.importar()
+        self.comprobar_resultado()
+        # Tres bloques: las consultas dependen de los bloques, no de las filas
+        self.assertLess(len(contexto.captured_queries), 40)
+
+    def test_reanudar_un_bloque_fallido_no_duplica_rechazos(self):
+        original = Notificacion.objects.bulk_create
+        llamadas = []
+
+        def fallar_en_el_segundo_bloque(objetos, *args, **kwargs):
+            llamadas.append(objetos)
+            if len(llamadas) == 2:
+                raise DatabaseError('conexión perdida')
+            return original(objetos, *args, **kwargs)
+
+        with mock.patch.object(Notificacion.objects, 'bulk_create', side_effect=fallar_en_el_segundo_bloque):
+            with self.assertRaises(DatabaseError):
+                self.importar()
+        # El segundo bloque se revirtió completo, también sus rechazos
+        self.assertEqual(self.rechazadas(), [('3', 'email_responsable')])
+        self.assertFalse(Cuidados.objects.filter(id_pet=self.existente).exists())
+
+        self.importar('--desde', '3')
+        self.comprobar_resultado()
+
+    def test_importa_excel_con_celdas_tipadas(self):
+        import openpyxl
+
+        libro = openpyxl.Workbook()
+        hoja = libro.active
+        hoja.title = 'Mascotas'
+        with open(self.CSV, newline='', encoding='utf-8') as archivo:
+            filas = list(csv.reader(archivo))
+        hoja.append(filas[0])
+        fecha, peso = filas[0].index('fecha_proxima'), filas[0].index('peso_kg')
+        for fila in filas[1:]:
+            # Excel guarda fechas y números como tales, no como texto
+            celdas = [valor or None for valor in fila]
+            if fila[fecha]:
+                celdas[fecha] = datetime.datetime.fromisoformat(fila[fecha])
+            if fila[peso]:
+                celdas[peso] = float(fila[peso])
+            hoja.append(celdas)
+        ruta = os.path.join(self.carpeta, 'mascotas.xlsx')
+        libro.save(ruta)
+
+        self.importar('--hoja', 'Mascotas', archivo=ruta)
+        self.comprobar_resultado()
+        self.assertEqual(str(Pet.objects.get(numero_ficha='IMP-3').peso_kg), '4.00')
+        self.assertEqual(
+            Cuidados.objects.get(id_pet__numero_ficha='IMP-1', tipo_cuidado='Vacunación').fecha_proxima,
+            datetime.date(2027, 1, 10),
+        )
+
+
+class DetallePetTests(TestCase):
+    def setUp(self):
+        self.usuarios = {
+            tipo: Usuario.objects.create_user(
+                f'{tipo}@suavespets.cl', 'clave12345', nombre=tipo, tipo_identificacion='rut',
+                identificacion=str(i), tipo_usuario=tipo,
+            )
+            for i, tipo in enumerate(('socio', 'socio_premium', 'veterinario', 'admin'))
+        }
+        self.pet = Pet.objects.create(
+            nombre_pet='Firulais', especie='perro', tamanio='mediano', raza='Beagle',
+            responsable=self.usuarios['socio'], is_deleted=0,
+        )
+
+    def detalle_sync(self, usuario):
+        self.client.force_login(usuario)
+        response = self.client.get(f'/pets/{self.pet.pk}/', secure=True)
+        if response.status_code == 404:
+            raise Http404
+        return response
+
+    def detalle_async(self, usuario):
+        request = RequestFactory().get(f'/pets/{self.pet.pk}/', secure=True)
+        request.user = usuario
+
+        async def auser():
+            return usuario
+        request.auser = auser
+        request.session = self.client.session
+        request._messages = FallbackStorage(request)
+        return async_to_sync(async_views.detalle_pet)(request, pk=self.pet.pk)
+
+    def test_las_dos_versiones_aplican_los_mismos_permisos(self):
+        for detalle in (self.detalle_sync, self.detalle_async):
+            with self.subTest(detalle.__name__):
+                for tipo in ('socio', 'admin'):
+                    response = detalle(self.usuarios[tipo])
+                    self.assertEqual(response.status_code, 200)
+                    self.assertIn('Firulais', response.content.decode())
+                with self.assertRaises(Http404):
+                    detalle(self.usuarios['socio_premium'])
+                response = detalle(self.usuarios['veterinario'])
+                self.assertEqual((response.status_code, response.url), (302, '/acceso-denegado/'))
+
+    def test_la_version_async_encola_la_info_sin_salir_del_event_loop(self):
+        # La plantilla se renderiza en el event loop: una consulta ahí lanzaría SynchronousOnlyOperation
+        response = self.detalle_async(self.usuarios['socio'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(TareaInfoVet.objects.get().estado, 'pendiente')
+
+
+class InfoVetCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.socio = Usuario.objects.create_user(
+            'socio@suavespets.cl', 'clave12345', nombre='socio', tipo_identificacion='rut',
+            identificacion='1', tipo_usuario='socio',
+        )
+
+    def crear_pet(self, raza, **campos):
+        return Pet.objects.create(
+            nombre_pet='Rex', especie='perro', tamanio='grande', raza=raza,
+            responsable=self.socio, is_deleted=0, **campos,
+        )
+
+    def test_la_huella_ignora_acentos_y_espacios(self):
+        base = calcular_huella(perfil_pet(self.crear_pet('Pastor Alemán', edad=4)))
+        self.assertEqual(calcular_huella(perfil_pet(self.crear_pet('  pastor   ALEMAN ', edad=5))), base)
+        self.assertNotEqual(calcular_huella(perfil_pet(self.crear_pet('Pastor Alemán', edad=9))), base)
+        with mock.patch('appsuavespets.services.gemini_service.PROMPT_VERSION', 'v99'):
+            self.assertNotEqual(calcular_huella(perfil_pet(self.crear_pet('Pastor Alemán', edad=4))), base)
+
+    def test_no_usa_entradas_vencidas_ni_de_otra_version_del_prompt(self):
+        perfil = perfil_pet(self.crear_pet('Beagle'))
+        GeminiVetService.guardar_cache(perfil, {'cuidados': 'ok'})
+        cache.clear()
+        self.assertEqual(GeminiVetService.obtener_cache(perfil), {'cuidados': 'ok'})
+
+        entradas = InfoVetCache.objects.filter(huella=calcular_huella(perfil))
+        entradas.update(fecha_expiracion=timezone.now() - datetime.timedelta(seconds=1))
+        cache.clear()
+        self.assertIsNone(GeminiVetService.obtener_cache(perfil))
+
+        entradas.update(fecha_expiracion=timezone.now() + datetime.timedelta(days=1), version_prompt='v1')
+        self.assertIsNone(GeminiVetService.obtener_cache(perfil))
+
+    def test_actualizar_pet_invalida_la_huella_cuando_queda_sin_uso(self):
+        rex = self.crear_pet('Pastor Alemán')
+        toby = self.crear_pet('pastor  aleman')
+        perfil = perfil_pet(rex)
+        GeminiVetService.guardar_cache(perfil, {'cuidados': 'ok'})
+        self.client.force_login(self.socio)
+
+        def cambiar_raza(pet, raza):
+            datos = {'nombre_pet': pet.nombre_pet, 'especie': 'perro', 'tamanio': 'grande', 'raza': raza, 'es_mestizo': 'False'}
+            response = self.client.post(f'/pets/{pet.pk}/actualizar/', datos, secure=True)
+            self.assertEqual(response.status_code, 302)
+
+        # Toby escribe la raza distinto pero comparte la huella: la entrada se mantiene
+        cambiar_raza(rex, 'Beagle')
+        self.assertEqual(GeminiVetService.obtener_cache(perfil), {'cuidados': 'ok'})
+        cambiar_raza(toby, 'Beagle')
+        self.assertIsNone(GeminiVetService.obtener_cache(perfil))
+        self.assertFalse(InfoVetCache.objects.filter(huella=calcular_huella(perfil)).exists())
+
+
+RESPUESTA_GEMINI = json.dumps({
+    'enfermedades': [{'titulo': 'Otitis', 'detalle': 'Orejas caídas'}],
+    'alimentos_prohibidos': [{'titulo': 'Chocolate'}],
+    'cuidados': [{'titulo': 'Cepillado'}],
+    'estudios': [{'titulo': 'Hemograma anual'}],
+    'referencias': [{'titulo': 'WSAVA 2024'}],
+})
+
+
+class ColaInfoVetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user(
+            'socio@suavespets.cl', 'clave12345', nombre='Socio',
+            tipo_identificacion='rut', identificacion='1', tipo_usuario='socio',
+        )
+        self.pet = Pet.objects.create(
+            nombre_pet='Firulais', especie='perro', tamanio='mediano', raza='Beagle', sexo='macho', edad=3,
+            responsable=self.usuario, is_deleted=0,
+        )
+        self.perfil = perfil_pet(self.pet)
+        # Gemini sin red: cada llamada devuelve el JSON de prueba o lanza el error configurado
+        self.gemini = mock.patch.object(cliente_gemini, 'generar', return_value=mock.Mock(text=RESPUESTA_GEMINI))
+        self.generar = self.gemini.start()
+        self.addCleanup(self.gemini.stop)
+
+    def test_encolar_es_idempotente_por_huella(self):
+        primera = encolar_info(self.perfil)
+        self.assertEqual(encolar_info(dict(self.perfil, raza='  beagle ')).pk, primera.pk)
+        self.assertEqual(TareaInfoVet.objects.count(), 1)
+
+    def test_tomar_y_completar(self):
+        encolar_info(self.perfil)
+        tarea = tomar_siguiente()
+        self.assertEqual((tarea.estado, tarea.intentos), ('procesando', 1))
+        self.assertIsNone(tomar_siguiente())
+        self.assertIsNone(reservar_tarea(self.perfil))
+
+        self.assertTrue(procesar_tarea(tarea))
+        self.assertEqual(TareaInfoVet.objects.get().estado, 'completada')
+        self.assertEqual(GeminiVetService.obtener_cache(self.perfil)['enfermedades'][0]['titulo'], 'Otitis')
+        self.assertEqual(self.generar.call_count, 1)
+
+    def test_reintenta_con_espera_creciente_hasta_marcar_error(self):
+        self.generar.side_effect = RuntimeError('Gemini caído')
+        encolar_info(self.perfil)
+        for intento in range(1, MAX_INTENTOS + 1):
+            tarea = tomar_siguiente()
+            self.assertEqual(tarea.intentos, intento)
+            antes = timezone.now()
+            self.assertFalse(procesar_tarea(tarea))
+            tarea.refresh_from_db()
+            if intento < MAX_INTENTOS:
+                self.assertEqual(tarea.estado, 'pendiente')
+                self.assertGreaterEqual(tarea.disponible_desde, antes + datetime.timedelta(seconds=30 * intento))
+                # Aún en espera: nadie la toma hasta que se cumpla el plazo
+                self.assertIsNone(tomar_siguiente())
+                TareaInfoVet.objects.update(disponible_desde=timezone.now())
+        self.assertEqual(tarea.estado, 'error')
+        self.assertIn('Gemini no devolvió contenido', tarea.ultimo_error)
+        self.assertIsNone(tomar_siguiente())
+
+    def test_recupera_una_tarea_abandonada(self):
+        encolar_info(self.perfil)
+        tomar_siguiente()
+        self.assertIsNone(tomar_siguiente())
+        # El worker que la tomó se cayó sin terminarla
+        TareaInfoVet.objects.update(fecha_actualizacion=timezone.now() - TIEMPO_ABANDONO - datetime.timedelta(seconds=1))
+        tarea = tomar_siguiente()
+        self.assertEqual((tarea.estado, tarea.intentos), ('procesando', 2))
+
+        TareaInfoVet.objects.update(fecha_actualizacion=timezone.now() - TIEMPO_ABANDONO - datetime.timedelta(seconds=1))
+        self.assertIsNotNone(reservar_tarea(self.perfil))
+
+    def test_el_endpoint_de_consulta_pasa_de_pendiente_a_listo(self):
+        self.client.force_login(self.usuario)
+        url = f'/pets/{self.pet.pk}/info-vet/'
+        self.assertEqual(self.client.get(url, secure=True).json(), {'estado': 'pendiente'})
+        self.assertEqual(TareaInfoVet.objects.get().estado, 'pendiente')
+
+        self.assertEqual(procesar_pendientes(), 1)
+        datos = self.client.get(url, secure=True).json()
+        self.assertEqual(datos['estado'], 'listo')
+        self.assertEqual(datos['info']['referencias'], [{'titulo': 'WSAVA 2024', 'detalle': ''}])
+        self.assertTrue(InfoVetCache.objects.exists())
@@ -1,28 +1,43 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import Count, Max, Prefetch, Q
 from django.db import IntegrityError, transaction
-from django.core.exceptions import ValidationError
+from django.core.exceptions import RequestDataTooBig, ValidationError
 from .forms import PetForm, EditarPerfilForm, RegistroForm
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import PetSerializer
+from .renderers import JSONRapidoRenderer
+from .serializers import FormaPet, PetSerializer
 from django.http import JsonResponse
 from functools import wraps
-from appsuavespets.models import ArchivoAdjunto, EventoClinico, Usuario, Pet, Notificacion
+from asgiref.sync import iscoroutinefunction
+from appsuavespets.models import ArchivoAdjunto, EventoClinico, Usuario, Pet, Notificacion, Raza
 from django.contrib.auth import login
 from django.contrib.auth.hashers import check_password
 from django.utils.decorators import method_decorator
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from django.views import View
 from django.conf import settings
-from appsuavespets.services.gemini_service import GeminiVetService
-import requests
+from appsuavespets.services.adjuntos import FotoPendiente, registrar_adjuntos
+from appsuavespets.services.lote_pets import procesar_lote
+from appsuavespets.services.validacion_imagenes import ImagenInvalida, validar_imagen
+from appsuavespets.services.validacion_pets import DatoInvalido, validar_dosis
+from appsuavespets.services.gemini_service import GeminiVetService, CAMPOS_HUELLA, perfil_pet
+from appsuavespets.services.cola_vet import encolar_info, estado_tarea, info_o_encolar
+from appsuavespets.services.pet_api_service import PetAPIService
+from appsuavespets.services.indice_razas import LIMITE_MAX, RAZAS_RESPALDO, obtener_indice
+from appsuavespets.services.paginacion import (
+    CursorInvalido, decodificar_cursor, pagina_cursor, pagina_keyset, tamanio_pagina,
+)
+import hashlib
 import logging
 import uuid
+from urllib.parse import urlencode
 from decimal import Decimal, InvalidOperation
-import re
 from .models import Pet, Cuidados
 
 
@@ -127,16 +142,29 @@ def iniciar_sesion(request):
 # DECORADOR PARA ROLES
 # ============================================
 def role_required(allowed_roles):
-    """Decorador para verificar roles de usuario"""
+    """Decorador para verificar roles de usuario (sirve también para vistas async)"""
+    def permitido(user):
+        tu = getattr(user, 'tipo_usuario', None)
+        return tu == 'admin' or (tu is not None and tu in allowed_roles)
+
+    def denegar(request):
+        messages.error(request, '❌ No tienes permiso para acceder a esta página.')
+        return redirect('acceso_denegado')
+
     def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_async_view(request, *args, **kwargs):
+                if permitido(await request.auser()):
+                    return await view_func(request, *args, **kwargs)
+                return denegar(request)
+            return _wrapped_async_view
+
         @wraps(view_func)
         def _wrapped_view(request, *args, **kwargs):
-            if hasattr(request.user, 'tipo_usuario'):
-                tu = request.user.tipo_usuario
-                if tu == 'admin' or tu in allowed_roles:
-                    return view_func(request, *args, **kwargs)
-            messages.error(request, '❌ No tienes permiso para acceder a esta página.')
-            return redirect('acceso_denegado')
+            if permitido(request.user):
+                return view_func(request, *args, **kwargs)
+            return denegar(request)
         return _wrapped_view
     return decorator
 
@@ -146,6 +174,12 @@ def is_admin(user):
     return hasattr(user, 'tipo_usuario') and user.tipo_usuario == 'admin'
 
 
+def pets_del_usuario(user, campos):
+    """Mascotas visibles para el usuario (admin ve todas), cargando solo `campos`"""
+    pets = Pet.objects.only(*campos)
+    return pets if is_admin(user) else pets.filter(responsable=user)
+
+
 # ============================================
 # PERFIL DE USUARIO
 # ============================================
@@ -189,72 +223,95 @@ def editar_perfil(request):
 # ============================================
 # CRUD MASCOTAS (PETS)
 # ============================================
+FILTROS_PETS = ('especie', 'tamanio', 'raza')
+
+
+def filtrar_pets(pets, params):
+    """Filtros opcionales del listado; todos por igualdad sobre columnas indexadas"""
+    filtros = {campo: params.get(campo, '').strip() for campo in FILTROS_PETS}
+    filtros = {campo: valor for campo, valor in filtros.items() if valor}
+    return pets.filter(**filtros), filtros
+
+
 @login_required
 def listado_pets(request):
-    if request.user.tipo_usuario == 'admin' or request.user.is_staff:
-        pets = (
-            Pet.objects
-            .filter(Q(is_deleted=0) | Q(is_deleted__isnull=True))
-            .only('id_pet', 'nombre_pet', 'especie', 'tamanio')
-        )
-    else:
-        pets = (
-            Pet.objects
-            .filter(responsable_id=request.user.id_usuario)
-            .filter(Q(is_deleted=0) | Q(is_deleted__isnull=True))
-            .only('id_pet', 'nombre_pet', 'especie', 'tamanio')
-        )
-    
-    return render(request, 'templatesApp/pets/listado-pets.html', {'pets': pets})
+    pets = (
+        Pet.objects
+        .filter(Q(is_deleted=0) | Q(is_deleted__isnull=True))
+        .only('id_pet', 'nombre_pet', 'especie', 'tamanio')
+    )
+    if not (request.user.tipo_usuario == 'admin' or request.user.is_staff):
+        pets = pets.filter(responsable_id=request.user.id_usuario)
+    pets, filtros = filtrar_pets(pets, request.GET)
+
+    limite = tamanio_pagina(request.GET.get('limite'), settings.PETS_POR_PAGINA, settings.PETS_POR_PAGINA_MAX)
+    try:
+        pets, siguiente, anterior = pagina_cursor(pets, 'id_pet', request.GET.get('cursor'), limite)
+    except CursorInvalido:
+        pets, siguiente, anterior = pagina_cursor(pets, 'id_pet', None, limite)
+
+    parametros = urlencode({**filtros, 'limite': limite})
+    return render(request, 'templatesApp/pets/listado-pets.html', {
+        'pets': pets,
+        'filtros': filtros,
+        'especies': Pet.ESPECIE_CHOICES,
+        'tamanios': Pet.TAMANIO_CHOICES,
+        'url_siguiente': f'?{parametros}&cursor={siguiente}' if siguiente else None,
+        'url_anterior': f'?{parametros}&cursor={anterior}' if anterior else None,
+    })
 
 from .models import Pet
 
+# Campos que usan perfil_pet (info veterinaria) y la plantilla del detalle
+CAMPOS_PERFIL_PET = ('id_pet', 'especie', 'sexo', 'tamanio', 'raza', 'es_mestizo', 'edad', 'fecha_nacimiento')
+CAMPOS_DETALLE_PET = CAMPOS_PERFIL_PET + (
+    'nombre_pet', 'descripcion_pet', 'peso_kg', 'foto_url', 'foto', 'responsable', 'veterinario',
+)
+
+
 @login_required
 @role_required(['socio', 'socio_premium'])
 def detalle_pet(request, pk):
-    if is_admin(request.user):
-        pet_qs = Pet.objects.only('id_pet','nombre_pet','descripcion_pet','especie','sexo','tamanio','raza','edad','peso_kg','foto_url','foto','responsable','veterinario')
-        pet = get_object_or_404(pet_qs, pk=pk)
-    else:
-        pet_qs = Pet.objects.only('id_pet','nombre_pet','descripcion_pet','especie','sexo','tamanio','raza','edad','peso_kg','foto_url','foto','responsable','veterinario')
-        pet = get_object_or_404(pet_qs, pk=pk, responsable=request.user)
-
-    # Obtener información veterinaria generada con IA usando Gemini
-    info_vet = GeminiVetService.get_pet_health_info(pet)
-    if not info_vet or not any(info_vet.get(k) for k in ['enfermedades','alimentos_prohibidos','cuidados','estudios','referencias']):
-        especie = (pet.especie or '').lower()
-        if especie == 'perro':
-            info_vet = {
-                'enfermedades': '- Parvovirus: prevenir con calendario de vacunas\n- Moquillo: vacunación y controles regulares\n- Tos de las perreras: evitar contagios en guarderías\n- Leptospirosis: evitar aguas estancadas y mantener vacunación\n- Otitis: revisar y limpiar orejas periódicamente',
-                'alimentos_prohibidos': '- Chocolate: puede causar problemas serios\n- Uvas y pasas: pueden afectar los riñones\n- Cebolla y ajo: pueden alterar la sangre\n- Alcohol: nocivo para su salud\n- Xilitol: puede bajar el azúcar peligrosamente',
-                'cuidados': '- Vacunas y desparasitación al día\n- Higiene dental mensual\n- Ejercicio diario acorde al tamaño\n- Protección contra parásitos externos\n- Controles veterinarios cada 6-12 meses',
-                'estudios': '- Hemograma anual en adultos\n- Radiografías si hay cojera\n- Perfil renal/hepático en mayores de 7 años',
-                'referencias': '- AVMA. (2015). Preventive Care.\n- WSAVA. (2020). Vaccination Guidelines.'
-            }
-        elif especie == 'gato':
-            info_vet = {
-                'enfermedades': '- Panleucopenia: prevenir con vacunación completa\n- Rinotraqueitis: medidas de higiene y vacunas\n- Gingivitis: higiene dental y controles\n- Obesidad: alimentación adecuada y juego diario\n- Enfermedad renal crónica: monitoreo especialmente en mayores',
-                'alimentos_prohibidos': '- Chocolate: puede afectar su salud\n- Cebolla y ajo: pueden alterar la sangre\n- Lácteos: suelen causar molestias digestivas\n- Atún crudo: puede causar déficit de vitaminas\n- Huesos: riesgo de lesiones',
-                'cuidados': '- Vacunación core y refuerzos\n- Enriquecimiento ambiental diario\n- Higiene dental y dieta adecuada\n- Control de parásitos internos/externos',
-                'estudios': '- Hemograma y bioquímica anual\n- Estudios cardíacos si hay soplo\n- Uroanálisis desde los 7 años',
-                'referencias': '- AAFP. (2018). Feline Preventive Care.\n- ISFM. (2019). Senior Cat Guidelines.'
-            }
-        else:
-            info_vet = {
-                'enfermedades': '- Enfermedades comunes según especie\n- Consulta profesional recomendada',
-                'alimentos_prohibidos': '- Evitar tóxicos conocidos\n- Dieta específica por especie',
-                'cuidados': '- Calendario de vacunas y desparasitación\n- Controles periódicos',
-                'estudios': '- Pruebas recomendadas según edad, basadas en evidencia desde 2005 en adelante',
-                'referencias': '- Guías veterinarias generales.'
-            }
-
-    # Renderizar la plantilla pasando pet e info_vet al contexto
+    pet = get_object_or_404(pets_del_usuario(request.user, CAMPOS_DETALLE_PET), pk=pk)
+    # Información veterinaria: si aún no está en cache se encola su generación
+    # y se muestra el contenido por especie mientras el worker la completa
+    info_vet, info_vet_pendiente = info_o_encolar(perfil_pet(pet))
+    return render_detalle_pet(request, pet, info_vet, info_vet_pendiente)
+
+
+def render_detalle_pet(request, pet, info_vet, info_vet_pendiente):
+    """
+    Página de detalle (la usan views y async_views). La plantilla solo lee campos ya
+    cargados de `pet`, sin relaciones ni consultas, así que se puede renderizar en el event loop.
+    """
     return render(request, 'templatesApp/pets/detalle-pet.html', {
         'pet': pet,
         'info_vet': info_vet,
+        'info_vet_pendiente': info_vet_pendiente,
     })
 
 
+@login_required
+@role_required(['socio', 'socio_premium'])
+def info_vet_pet(request, pk):
+    """Estado de la información veterinaria de una mascota (consultado por detalle_pet)"""
+    pet = get_object_or_404(pets_del_usuario(request.user, CAMPOS_PERFIL_PET), pk=pk)
+
+    perfil = perfil_pet(pet)
+    info_vet = GeminiVetService.obtener_cache(perfil)
+    if info_vet is not None:
+        return JsonResponse({'estado': 'listo', 'info': info_vet})
+
+    estado = estado_tarea(perfil)
+    if estado is None or estado == 'completada':
+        # Sin tarea (o el contenido expiró desde que se completó): volver a encolar
+        encolar_info(perfil)
+        estado = 'pendiente'
+    if estado == 'error':
+        return JsonResponse({'estado': 'error', 'info': GeminiVetService.info_fallback(pet.especie)})
+    return JsonResponse({'estado': 'pendiente'})
+
+
 
 @login_required
 @role_required(['socio', 'socio_premium'])
@@ -327,6 +384,12 @@ def agregar_pet_api(request):
         if not raza_final:
             return Response({'error': 'Raza requerida'}, status=400)
 
+        if foto_url:
+            try:
+                validar_imagen(foto_url)
+            except ImagenInvalida as e:
+                return Response({'error': str(e)}, status=400)
+
         numero = numero_ficha
         if not numero:
             numero = f"PET-{uuid.uuid4().hex[:8].upper()}"
@@ -350,13 +413,14 @@ def agregar_pet_api(request):
                 responsable_id=request.user.id_usuario,
                 is_deleted=0
             )
-            pet.save()
             if foto_url:
                 pet.foto_url = foto_url
-                pet.save()
+            pet.save()
 
         return Response({'success': True, 'id_pet': pet.id_pet}, status=201)
 
+    except RequestDataTooBig as e:
+        return Response({'error': str(e)}, status=413)
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
@@ -365,16 +429,16 @@ def agregar_pet_api(request):
 @role_required(['socio', 'socio_premium', 'veterinario'])
 def actualizar_pet(request, pk):
     if is_admin(request.user):
-        pet_qs = Pet.objects.only('id_pet','nombre_pet','descripcion_pet','especie','tamanio','raza','es_mestizo','sexo','edad','peso_kg','foto_url')
+        pet_qs = Pet.objects.only('id_pet','nombre_pet','descripcion_pet','especie','tamanio','raza','es_mestizo','sexo','edad','fecha_nacimiento','peso_kg','foto_url')
         pet = get_object_or_404(pet_qs, id_pet=pk, is_deleted=0)
     elif request.user.tipo_usuario == 'veterinario':
-        pet_qs = Pet.objects.only('id_pet','nombre_pet','descripcion_pet','especie','tamanio','raza','es_mestizo','sexo','edad','peso_kg','foto_url')
+        pet_qs = Pet.objects.only('id_pet','nombre_pet','descripcion_pet','especie','tamanio','raza','es_mestizo','sexo','edad','fecha_nacimiento','peso_kg','foto_url')
         pet = get_object_or_404(pet_qs, id_pet=pk, veterinario_id=request.user.id_usuario, is_deleted=0)
         if request.GET.get('consent') != '1':
             messages.error(request, 'Se requiere consentimiento previo.')
             return redirect('detalle_pet', pk=pk)
     else:
-        pet_qs = Pet.objects.only('id_pet','nombre_pet','descripcion_pet','especie','tamanio','raza','es_mestizo','sexo','edad','peso_kg','foto_url')
+        pet_qs = Pet.objects.only('id_pet','nombre_pet','descripcion_pet','especie','tamanio','raza','es_mestizo','sexo','edad','fecha_nacimiento','peso_kg','foto_url')
         pet = get_object_or_404(pet_qs, id_pet=pk, responsable_id=request.user.id_usuario, is_deleted=0)
 
     # **GET**: Mostrar formulario precargado con datos actuales
@@ -384,8 +448,15 @@ def actualizar_pet(request, pk):
     # **POST**: Procesar formulario enviado
     elif request.method == 'POST':
         form = PetForm(request.POST, request.FILES, instance=pet)
+        perfil_anterior = perfil_pet(pet)
         if form.is_valid():
             form.save()
+            # Si cambió un campo que define la información veterinaria, descartar la entrada anterior si quedó sin uso
+            if set(form.changed_data) & set(CAMPOS_HUELLA) and perfil_pet(pet) != perfil_anterior:
+                try:
+                    GeminiVetService.invalidar_si_huerfana(perfil_anterior, excluir_pet_id=pet.id_pet)
+                except Exception as e:
+                    logger.warning(f'No se pudo invalidar cache veterinaria: {e}')
             messages.success(request, f'✅ {pet.nombre_pet} actualizado correctamente.')
             return redirect('detalle_pet', pk=pk)
         # Si inválido, form mantiene valores y errores
@@ -470,17 +541,101 @@ def admin_configuracion(request):
 # ============================================
 # API REST PARA PETS
 # ============================================
+def _version_pets(request, pk=None):
+    """
+    (ETag, Last-Modified) de lo que devolvería un GET del API de mascotas, a partir de
+    una sola consulta agregada sobre fecha_actualizacion. Se calcula una vez por request;
+    None si no aplica (otro método, parámetros inválidos o mascota inexistente).
+    """
+    if not hasattr(request, 'version_pets'):
+        request.version_pets = _calcular_version_pets(request, pk)
+    return request.version_pets
+
+
+def _calcular_version_pets(request, pk):
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    try:
+        forma = FormaPet.desde_request(request)
+    except ValueError:
+        return None
+
+    # El listado incluye las removidas: un soft delete también cambia la versión
+    pets = Pet.objects.filter(responsable_id=request.user.id_usuario)
+    if pk is not None:
+        pets = pets.filter(pk=pk).filter(Q(is_deleted=0) | Q(is_deleted__isnull=True))
+    agregados = {'total': Count('pk', distinct=True), 'ultima': Max('fecha_actualizacion')}
+    if 'ultimos_eventos' in forma.expansiones:
+        agregados['ultimo_evento'] = Max('eventoclinico__fecha_actualizacion')
+    datos = pets.aggregate(**agregados)
+    if pk is not None and not datos['total']:
+        return None
+
+    fechas = [f for f in (datos['ultima'], datos.get('ultimo_evento')) if f]
+    # responsable_data sale del propio usuario; la query string distingue forma y página
+    partes = [
+        request.user.id_usuario, request.user.nombre, request.user.email, datos['total'],
+        *(f.isoformat() for f in fechas), request.GET.urlencode(),
+    ]
+    ultima_modificacion = max(fechas, default=None)
+    if 'veterinario' in forma.expansiones:
+        # Nombre y email de otros usuarios: entran al ETag, pero no tienen fecha propia,
+        # así que esta forma no responde a If-Modified-Since
+        partes += sorted(
+            pets.filter(veterinario__isnull=False)
+            .values_list('veterinario_id', 'veterinario__nombre', 'veterinario__email').distinct()
+        )
+        ultima_modificacion = None
+    huella = '|'.join(str(parte) for parte in partes)
+    return hashlib.md5(huella.encode()).hexdigest(), ultima_modificacion
+
+
+def _etag_pets(request, pk=None):
+    version = _version_pets(request, pk)
+    return version[0] if version else None
+
+
+def _modificacion_pets(request, pk=None):
+    version = _version_pets(request, pk)
+    return version[1] if version else None
+
+
+# 304 sin serializar nada cuando If-None-Match / If-Modified-Since siguen vigentes
+condicional_pets = condition(etag_func=_etag_pets, last_modified_func=_modificacion_pets)
+
+
 @api_view(['GET', 'POST'])
+@renderer_classes([JSONRapidoRenderer, BrowsableAPIRenderer])
 @login_required
+@condicional_pets
 def pet_list_api(request):
     """API para listar y crear mascotas"""
     if request.method == 'GET':
         try:
+            try:
+                forma = FormaPet.desde_request(request)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             pets = Pet.objects.filter(
                 responsable_id=request.user.id_usuario
-            ).filter(Q(is_deleted=0) | Q(is_deleted__isnull=True))
-            serializer = PetSerializer(pets, many=True)
-            return Response(serializer.data)
+            ).filter(Q(is_deleted=0) | Q(is_deleted__isnull=True)).values(*forma.columnas)
+            pets, _ = filtrar_pets(pets, request.query_params)
+            limite = tamanio_pagina(
+                request.query_params.get('page_size'), settings.PETS_POR_PAGINA, settings.PETS_POR_PAGINA_MAX,
+            )
+            try:
+                pets, siguiente, anterior = pagina_cursor(pets, 'id_pet', request.query_params.get('cursor'), limite)
+            except CursorInvalido as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            response = Response({
+                'results': forma.serializar(pets),
+                'next': siguiente,
+                'prev': anterior,
+                'page_size': limite,
+            })
+            # El cliente puede guardar la respuesta, pero revalida con ETag en cada uso
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
         
         except Exception as e:
             logger.error(f'Error en API GET pets: {e}')
@@ -539,6 +694,13 @@ def pet_list_api(request):
                     if years != int(edad):
                         return Response({'error': 'Edad no coincide con fecha de nacimiento'}, status=status.HTTP_400_BAD_REQUEST)
 
+            foto = request.FILES.get('foto_url')
+            if foto:
+                try:
+                    validar_imagen(foto)
+                except ImagenInvalida as e:
+                    return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
             pet = Pet(
                 nombre_pet=nombre_pet,
                 descripcion_pet=descripcion_pet,
@@ -555,30 +717,15 @@ def pet_list_api(request):
                 responsable_id=request.user.id_usuario,
                 is_deleted=0
             )
-            pet.save()
-
-            if 'foto_url' in request.FILES:
-                foto = request.FILES['foto_url']
-                allowed_ct = ['image/jpeg','image/png','image/jpg']
-                if getattr(foto, 'content_type', '').lower() not in allowed_ct:
-                    return Response({'error': 'Solo se permiten imágenes JPG o PNG'}, status=status.HTTP_400_BAD_REQUEST)
-                if getattr(foto, 'size', 0) > 5 * 1024 * 1024:
-                    return Response({'error': 'La imagen supera 5 MB'}, status=status.HTTP_400_BAD_REQUEST)
-                try:
-                    from PIL import Image
-                    Image.open(foto).verify()
-                    try:
-                        foto.seek(0)
-                    except Exception:
-                        pass
-                except Exception:
-                    return Response({'error': 'Archivo de imagen inválido'}, status=status.HTTP_400_BAD_REQUEST)
+            if foto:
                 pet.foto_url = foto
-                pet.save()
+            pet.save()
 
             logger.info(f'Pet creado via API por usuario {request.user.id_usuario} (id_pet={pet.id_pet})')
             return Response(PetSerializer(pet).data, status=status.HTTP_201_CREATED)
 
+        except RequestDataTooBig as e:
+            return Response({'error': str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
         except Exception as e:
             logger.error(f'Error en API POST pet: {e}')
             return Response(
@@ -587,12 +734,64 @@ def pet_list_api(request):
             )
 
 
+@api_view(['POST'])
+@renderer_classes([JSONRapidoRenderer, BrowsableAPIRenderer])
+@login_required
+def pet_lote_api(request):
+    """
+    Alta/actualización de mascotas en lote. Recibe una lista de objetos (los que traen
+    id_pet se actualizan) y responde un resultado por item; los items válidos se guardan
+    aunque otros tengan errores.
+    """
+    items = request.data
+    if not isinstance(items, list) or not items:
+        return Response({'error': 'Se esperaba una lista de mascotas'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.PETS_LOTE_MAX:
+        return Response(
+            {'error': f'El lote supera {settings.PETS_LOTE_MAX} mascotas'},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+
+    try:
+        resultados = procesar_lote(items, request.user)
+    except Exception as e:
+        logger.error(f'Error en API lote pets: {e}')
+        return Response({'error': 'Error al procesar el lote'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    errores = sum(1 for r in resultados if r['estado'] == 'error')
+    logger.info(f'Lote de {len(items)} pets via API por usuario {request.user.id_usuario} ({errores} con error)')
+    if errores == len(resultados):
+        codigo = status.HTTP_400_BAD_REQUEST
+    elif errores:
+        codigo = status.HTTP_207_MULTI_STATUS
+    else:
+        codigo = status.HTTP_201_CREATED
+    return Response({'resultados': resultados, 'errores': errores}, status=codigo)
+
+
 @api_view(['GET', 'PUT', 'DELETE'])
+@renderer_classes([JSONRapidoRenderer, BrowsableAPIRenderer])
 @login_required
+@condicional_pets
 def pet_detail_api(request, pk):
     """API para detalle, actualizar y remover mascota"""
+    pets = Pet.objects.filter(pk=pk, responsable_id=request.user.id_usuario).filter(Q(is_deleted=0) | Q(is_deleted__isnull=True))
+
+    if request.method == 'GET':
+        # Solo las columnas y relaciones que pide el cliente (?fields= / ?expand=)
+        try:
+            forma = FormaPet.desde_request(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        fila = pets.values(*forma.columnas).first()
+        if fila is None:
+            return Response({'error': 'Mascota no encontrada'}, status=status.HTTP_404_NOT_FOUND)
+        response = Response(forma.serializar([fila])[0])
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
     try:
-        pet = Pet.objects.filter(pk=pk, responsable_id=request.user.id_usuario).filter(Q(is_deleted=0) | Q(is_deleted__isnull=True)).first()
+        pet = pets.first()
         if not pet:
             raise Pet.DoesNotExist
     except Pet.DoesNotExist:
@@ -601,11 +800,7 @@ def pet_detail_api(request, pk):
             status=status.HTTP_404_NOT_FOUND
         )
     
-    if request.method == 'GET':
-        serializer = PetSerializer(pet)
-        return Response(serializer.data)
-    
-    elif request.method == 'PUT':
+    if request.method == 'PUT':
         try:
             serializer = PetSerializer(pet, data=request.data)
             if serializer.is_valid():
@@ -662,7 +857,17 @@ def registrar_evento_clinico(request, pk):
             if not all([fecha_evento, tipo_evento, sintomas]):
                 messages.error(request, '❌ Todos los campos son obligatorios.')
                 return render(request, 'templatesApp/evento/agregar-eventoclinico.html', {'pet': pet})
+
+            fotos = request.FILES.getlist('fotos')[:4]
+            for foto in fotos:
+                try:
+                    validar_imagen(foto)
+                except ImagenInvalida as e:
+                    messages.error(request, f'❌ {foto.name}: {e}')
+                    return render(request, 'templatesApp/evento/agregar-eventoclinico.html', {'pet': pet})
             
+            # Las fotos se copian a temporales; se guardan y procesan después del commit
+            pendientes = [FotoPendiente(foto) for foto in fotos]
             try:
                 with transaction.atomic():
                     # Crear evento clínico
@@ -672,28 +877,19 @@ def registrar_evento_clinico(request, pk):
                         fecha_evento=fecha_evento,
                         tipo_evento=tipo_evento,
                         sintomas_reportados=sintomas,
-                        estado_preconsulta='pendiente'
+                        estado_preconsulta='pendiente',
+                        fecha_registro=timezone.now(),
+                        is_deleted=0
                     )
-                    
-                    # Procesar fotos (máximo 4)
-                    fotos = request.FILES.getlist('fotos')
-                    for i, foto in enumerate(fotos[:4]):
-                        from django.core.files.storage import default_storage
-                        file_name = f'eventos_clinicos/{evento.id_eventoclinico}_{i}_{foto.name}'
-                        file_path = default_storage.save(file_name, foto)
-                        
-                        ArchivoAdjunto.objects.create(
-                            id_eventoclinico=evento,
-                            archivo_url=file_path,
-                            descripcion=f'Foto {i+1} del evento',
-                            subido_por=request.user
-                        )
+                    registrar_adjuntos(evento, pendientes, request.user)
                     
                     messages.success(request, '✅ Evento clínico registrado exitosamente.')
                     logger.info(f'Evento clínico creado: {evento.id_eventoclinico}')
                     return redirect('listado_eventos_clinicos', pk=pet.id_pet)
             
             except Exception as e:
+                for pendiente in pendientes:
+                    pendiente.descartar()
                 logger.error(f'Error al registrar evento clínico: {e}')
                 messages.error(request, '❌ Error al registrar evento.')
         
@@ -704,51 +900,62 @@ def registrar_evento_clinico(request, pk):
         return redirect('listado_pets')
 
 
+# Orden del timeline, el mismo de evento_timeline_idx
+ORDEN_EVENTOS = ('fecha_evento', 'fecha_registro', 'id_eventoclinico')
+CURSOR_EVENTOS = (datetime.date.fromisoformat, datetime.datetime.fromisoformat, int)
+
+
 @login_required
 @role_required(['socio', 'socio_premium', 'veterinario', 'clinica'])
 def listado_eventos_clinicos(request, pk):
-    """Listado de eventos clínicos de una mascota"""
+    """Listado de eventos clínicos de una mascota, paginado por keyset ("cargar más")"""
     try:
         mask_pet_name = (request.user.tipo_usuario == 'clinica')
         can_register = not mask_pet_name
+        pets = Pet.objects.only('id_pet', 'nombre_pet', 'especie', 'edad')
         if is_admin(request.user):
-            pet = get_object_or_404(Pet, pk=pk, is_deleted=False)
-            eventos = EventoClinico.objects.filter(
-                id_pet=pet,
-                is_deleted=False
-            ).order_by('-fecha_evento', '-fecha_registro')
+            pet = get_object_or_404(pets, pk=pk, is_deleted=False)
+            eventos = EventoClinico.objects.filter(id_pet=pet)
         elif request.user.tipo_usuario == 'veterinario':
-            pet = get_object_or_404(Pet, pk=pk, veterinario_id=request.user.id_usuario, is_deleted=False)
-            eventos = EventoClinico.objects.filter(
-                id_pet=pet,
-                is_deleted=False
-            ).order_by('-fecha_evento', '-fecha_registro')
+            pet = get_object_or_404(pets, pk=pk, veterinario_id=request.user.id_usuario, is_deleted=False)
+            eventos = EventoClinico.objects.filter(id_pet=pet)
         else:
-            pet = get_object_or_404(Pet, pk=pk, responsable_id=request.user, is_deleted=False)
-            eventos = EventoClinico.objects.filter(
-                id_pet=pet,
-                id_usuario_responsable=request.user,
-                is_deleted=False
-            ).order_by('-fecha_evento', '-fecha_registro')
-        
-        # Obtener fotos para cada evento
-        eventos_con_fotos = []
-        for evento in eventos:
-            fotos = ArchivoAdjunto.objects.filter(
-                id_eventoclinico=evento,
-                is_deleted=False
-            )
-            eventos_con_fotos.append({
-                'evento': evento,
-                'fotos': fotos
-            })
-        
-        return render(request, 'templatesApp/evento/listado-eventosclinicos.html', {
+            pet = get_object_or_404(pets, pk=pk, responsable_id=request.user, is_deleted=False)
+            eventos = EventoClinico.objects.filter(id_pet=pet, id_usuario_responsable=request.user)
+
+        try:
+            cursor = decodificar_cursor(request.GET.get('cursor'), CURSOR_EVENTOS)
+        except CursorInvalido:
+            cursor = None
+
+        # Tres consultas por página sin importar el largo del historial:
+        # mascota, página de eventos y fotos de esos eventos
+        eventos = (
+            eventos.filter(Q(is_deleted=0) | Q(is_deleted__isnull=True))
+            .order_by('-fecha_evento', '-fecha_registro', '-id_eventoclinico')
+            .only('id_eventoclinico', 'tipo_evento', 'fecha_evento', 'estado_preconsulta',
+                  'sintomas_reportados', 'descripcion_evento', 'fecha_registro')
+            .prefetch_related(Prefetch(
+                'archivoadjunto_set',
+                queryset=ArchivoAdjunto.objects.filter(is_deleted=0)
+                .only('id_archivo', 'id_eventoclinico', 'archivo_url', 'estado').order_by('id_archivo'),
+                to_attr='fotos',
+            ))
+        )
+        eventos, siguiente = pagina_keyset(
+            eventos, ORDEN_EVENTOS, cursor, settings.EVENTOS_POR_PAGINA,
+        )
+
+        contexto = {
             'pet': pet,
-            'eventos_con_fotos': eventos_con_fotos,
+            'eventos': eventos,
+            'cursor_siguiente': siguiente,
             'mask_pet_name': mask_pet_name,
             'can_register': can_register
-        })
+        }
+        if request.GET.get('fragmento'):
+            return render(request, 'templatesApp/evento/eventos-pagina.html', contexto)
+        return render(request, 'templatesApp/evento/listado-eventosclinicos.html', contexto)
     
     except Pet.DoesNotExist:
         messages.error(request, '❌ Mascota no encontrada.')
@@ -761,54 +968,62 @@ def listado_eventos_clinicos(request, pk):
 
 
 # ============================================
-# API EXTERNA - RAZAS (DOG API / CAT API)
+# API RAZAS (catálogo local sincronizado con sync_breeds)
 # ============================================
+def _etag_razas(request):
+    especie = request.GET.get('especie', '').lower()
+    if especie not in ('perro', 'gato'):
+        return None
+    return PetAPIService.version_catalogo(especie)
+
+
 class RazasAPI(View):
     """API para obtener razas de perros y gatos"""
-    
+
+    @method_decorator(condition(etag_func=_etag_razas))
     def get(self, request):
         especie = request.GET.get('especie', '').lower()
         
-        if especie == 'perro':
-            url = 'https://api.thedogapi.com/v1/breeds'
-            api_key = settings.DOG_API_KEY
-        elif especie == 'gato':
-            url = 'https://api.thecatapi.com/v1/breeds'
-            api_key = settings.CAT_API_KEY
-        else:
+        if especie not in ('perro', 'gato'):
             return JsonResponse({'error': 'Especie inválida'}, status=400)
-        
-        try:
-            headers = {'x-api-key': api_key} if api_key else {}
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            razas = [{'id': r.get('id', r.get('name', '').lower().replace(' ', '_')), 'name': r['name']} for r in response.json()]
-            logger.info('RazasAPI externo OK: %s (%d items)', especie, len(razas))
-            return JsonResponse({'razas': razas})
-        
-        except requests.Timeout:
-            logger.warning('RazasAPI timeout: %s', especie)
-        
-        except requests.RequestException as e:
-            logger.error('RazasAPI error de red: %s', e)
-        
-        except Exception as e:
-            logger.error('RazasAPI error inesperado: %s', e)
-        
-        if especie == 'perro':
-            nombres = [
-                'Labrador Retriever','German Shepherd','Golden Retriever','Bulldog','Poodle','Beagle','Rottweiler','Yorkshire Terrier','Boxer','Dachshund',
-                'Siberian Husky','Chihuahua','Shih Tzu','Doberman Pinscher','Border Collie','Australian Shepherd','Pug','Great Dane','Cocker Spaniel','Maltese'
-            ]
-        else:
-            nombres = [
-                'Persian','Siamese','Maine Coon','Ragdoll','Bengal','Sphynx','British Shorthair','Scottish Fold','Abyssinian','American Shorthair',
-                'Russian Blue','Norwegian Forest','Savannah','Bombay','Birman','Oriental','Manx','Chartreux','Turkish Angora','Himalayan'
-            ]
+
+        razas = [
+            {'id': id_externo, 'name': nombre}
+            for id_externo, nombre in (
+                Raza.objects.filter(especie=especie).order_by('nombre').values_list('id_externo', 'nombre')
+            )
+        ]
+        if razas:
+            response = JsonResponse({'razas': razas})
+            patch_cache_control(response, max_age=settings.RAZAS_CACHE_MAX_AGE, must_revalidate=True)
+            return response
+
+        # Catálogo aún no sincronizado (python manage.py sync_breeds)
+        nombres = RAZAS_RESPALDO[especie]
         fallback = [{'id': n.lower().replace(' ', '_'), 'name': n} for n in nombres]
-        logger.info('RazasAPI fallback usado: %s (%d items)', especie, len(fallback))
-        return JsonResponse({'razas': fallback})
+        logger.warning('RazasAPI: catálogo local vacío, fallback usado: %s (%d items)', especie, len(fallback))
+        response = JsonResponse({'razas': fallback})
+        patch_cache_control(response, no_cache=True)
+        return response
+
+
+class BuscarRazasAPI(View):
+    """Autocompletado de razas por prefijo (nombre, alias en español o variantes comunes)"""
+
+    def get(self, request):
+        especie = request.GET.get('especie', '').lower()
+        if especie not in ('perro', 'gato'):
+            return JsonResponse({'error': 'Especie inválida'}, status=400)
+
+        try:
+            limite = min(max(int(request.GET.get('limite', 10)), 1), LIMITE_MAX)
+        except ValueError:
+            limite = 10
+
+        razas = obtener_indice(especie).autocompletar(request.GET.get('q', ''), limite)
+        response = JsonResponse({'razas': [{'id': r.id_externo, 'name': r.nombre} for r in razas]})
+        patch_cache_control(response, max_age=settings.RAZAS_CACHE_MAX_AGE)
+        return response
         
         
 
@@ -835,28 +1050,20 @@ def gestionar_cuidados(request, pk):
             })
         tipo_cuidado = request.POST.get('tipo_cuidado')
         fecha_proxima = request.POST.get('fecha_proxima')
-        dosis = (request.POST.get('dosis') or '').strip()
-
-        if dosis:
-            if not re.search(r'[A-Za-z0-9]', dosis):
-                messages.error(request, 'La dosis debe incluir al menos una letra o un número.')
-                return render(request, 'templatesApp/cuidados/gestionar-cuidados.html', {
-                    'pet': pet,
-                    'cuidados': cuidados
-                })
-            especiales = re.findall(r'[^A-Za-z0-9\s]', dosis)
-            if len(especiales) > 4:
-                messages.error(request, 'La dosis admite máximo 4 caracteres especiales.')
-                return render(request, 'templatesApp/cuidados/gestionar-cuidados.html', {
-                    'pet': pet,
-                    'cuidados': cuidados
-                })
+        try:
+            dosis = validar_dosis(request.POST.get('dosis'))
+        except DatoInvalido as e:
+            messages.error(request, str(e))
+            return render(request, 'templatesApp/cuidados/gestionar-cuidados.html', {
+                'pet': pet,
+                'cuidados': cuidados
+            })
         
         Cuidados.objects.create(
             id_pet=pet,
             tipo_cuidado=tipo_cuidado,
             fecha_proxima=fecha_proxima,
-            dosis=dosis or None,
+            dosis=dosis,
             is_deleted=0
         )
         try:
@@ -901,24 +1108,15 @@ def editar_cuidado(request, pk, cuidado_id):
     if request.method == 'POST':
         cuidado.tipo_cuidado = request.POST.get('tipo_cuidado')
         cuidado.fecha_proxima = request.POST.get('fecha_proxima')
-        dosis = (request.POST.get('dosis') or '').strip()
-        if dosis:
-            if not re.search(r'[A-Za-z0-9]', dosis):
-                messages.error(request, 'La dosis debe incluir al menos una letra o un número.')
-                return render(request, 'templatesApp/cuidados/gestionar-cuidados.html', {
-                    'pet': pet,
-                    'cuidados': cuidados,
-                    'cuidado_editar': cuidado
-                })
-            especiales = re.findall(r'[^A-Za-z0-9\s]', dosis)
-            if len(especiales) > 4:
-                messages.error(request, 'La dosis admite máximo 4 caracteres especiales.')
-                return render(request, 'templatesApp/cuidados/gestionar-cuidados.html', {
-                    'pet': pet,
-                    'cuidados': cuidados,
-                    'cuidado_editar': cuidado
-                })
-        cuidado.dosis = dosis or None
+        try:
+            cuidado.dosis = validar_dosis(request.POST.get('dosis'))
+        except DatoInvalido as e:
+            messages.error(request, str(e))
+            return render(request, 'templatesApp/cuidados/gestionar-cuidados.html', {
+                'pet': pet,
+                'cuidados': cuidados,
+                'cuidado_editar': cuidado
+            })
         cuidado.save()
         try:
             if getattr(pet.responsable, 'tipo_usuario', '') == 'socio_premium' and cuidado.tipo_cuidado in ['Vacunación', 'Control Veterinario']:
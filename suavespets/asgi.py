@@ -5,6 +5,12 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Las vistas de appsuavespets/async_views.py (streaming SSE, detalle_pet, RazasAPI)
+deben servirse con ASGI para que las esperas a servicios externos no ocupen un
+worker. Puede desplegarse junto a la app WSGI (suavespets.wsgi), por ejemplo:
+
+    gunicorn suavespets.asgi:application -k uvicorn.workers.UvicornWorker
 """
 
 import os
@@ -12,5 +18,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'suavespets.settings')
+os.environ.setdefault('VISTAS_ASYNC', '1')
 
 application = get_asgi_application()
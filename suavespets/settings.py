@@ -145,6 +145,19 @@ else:
 
 
 
+# Cache: 'default' en memoria del proceso; 'coordinacion' compartida entre workers
+# (locks de coalescencia de llamadas externas). Requiere `python manage.py createcachetable`.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'coordinacion': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_coordinacion',
+    },
+}
+
+
 # Duración de sesión (ejemplo: 20 minutos)
 SESSION_COOKIE_AGE = 20 * 60
 
@@ -217,8 +230,38 @@ USE_TZ = True
 
 
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+GEMINI_MODELO = os.getenv('GEMINI_MODELO', 'gemini-2.0-flash-exp')
+# Plazo total por generación (segundos, incluye reintentos) y cantidad de reintentos
+GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', 20))
+GEMINI_REINTENTOS = int(os.getenv('GEMINI_REINTENTOS', 2))
+# Usar las versiones async de las vistas con esperas externas (asgi.py lo activa)
+VISTAS_ASYNC = os.getenv('VISTAS_ASYNC', '0') == '1'
+# Plazo total de una generación en streaming (SSE)
+GEMINI_STREAM_TIMEOUT = float(os.getenv('GEMINI_STREAM_TIMEOUT', 60))
+# Circuit breaker: fallos seguidos para abrir y segundos de enfriamiento
+GEMINI_CIRCUITO_UMBRAL = int(os.getenv('GEMINI_CIRCUITO_UMBRAL', 5))
+GEMINI_CIRCUITO_ENFRIAMIENTO = int(os.getenv('GEMINI_CIRCUITO_ENFRIAMIENTO', 60))
+# Cache de información veterinaria generada: base de datos (30 días) y memoria del proceso (1 hora)
+GEMINI_CACHE_TTL = int(os.getenv('GEMINI_CACHE_TTL', 60 * 60 * 24 * 30))
+GEMINI_CACHE_MEMORIA_TTL = int(os.getenv('GEMINI_CACHE_MEMORIA_TTL', 60 * 60))
 DOG_API_KEY = os.getenv('DOG_API_KEY')
 CAT_API_KEY = os.getenv('CAT_API_KEY')
+# Llamadas HTTP salientes (services/http_client.py): plazo por llamada, reintentos de GET
+# y máximo de conexiones/llamadas simultáneas por host
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 10))
+HTTP_REINTENTOS = int(os.getenv('HTTP_REINTENTOS', 2))
+HTTP_MAX_CONCURRENCIA_HOST = int(os.getenv('HTTP_MAX_CONCURRENCIA_HOST', 10))
+# Listas de razas de TheDogAPI/TheCatAPI: TTL suave (se refresca en segundo plano),
+# TTL duro (se descarga en el request), TTL de fallos y carpeta de la última copia buena
+RAZAS_TTL_SUAVE = int(os.getenv('RAZAS_TTL_SUAVE', 60 * 60 * 24))
+RAZAS_TTL_DURO = int(os.getenv('RAZAS_TTL_DURO', 60 * 60 * 24 * 7))
+RAZAS_TTL_NEGATIVO = int(os.getenv('RAZAS_TTL_NEGATIVO', 60 * 5))
+RAZAS_CACHE_DIR = os.getenv('RAZAS_CACHE_DIR', str(BASE_DIR / 'cache_razas'))
+# Lote precargado de imágenes aleatorias por especie (get_random_image)
+IMAGENES_POOL_TAMANIO = min(int(os.getenv('IMAGENES_POOL_TAMANIO', 50)), 100)
+IMAGENES_POOL_TTL = int(os.getenv('IMAGENES_POOL_TTL', 60 * 60 * 6))
+# Segundos que el navegador reutiliza la lista de razas antes de revalidar con ETag
+RAZAS_CACHE_MAX_AGE = int(os.getenv('RAZAS_CACHE_MAX_AGE', 60 * 10))
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
@@ -229,6 +272,30 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Archivos a medio procesar (fotos de eventos, blobs en copia): fuera de MEDIA_ROOT para no servirlos
+ARCHIVOS_TEMPORALES_DIR = Path(os.getenv('ARCHIVOS_TEMPORALES_DIR', BASE_DIR / 'tmp'))
+
+# Mascotas por página en listado_pets y /api/pets/ (el cliente puede pedir hasta el máximo)
+PETS_POR_PAGINA = int(os.getenv('PETS_POR_PAGINA', 25))
+PETS_POR_PAGINA_MAX = int(os.getenv('PETS_POR_PAGINA_MAX', 100))
+# Eventos clínicos por página en el timeline (paginación por keyset)
+EVENTOS_POR_PAGINA = int(os.getenv('EVENTOS_POR_PAGINA', 20))
+# Alta/actualización en lote (/api/pets/lote/): máximo por request y filas por transacción
+PETS_LOTE_MAX = int(os.getenv('PETS_LOTE_MAX', 1000))
+PETS_LOTE_BLOQUE = int(os.getenv('PETS_LOTE_BLOQUE', 250))
+
+# Subidas: el primer handler limita el cuerpo de cualquier request y valida en streaming
+# los campos de foto (ver services/validacion_imagenes.py)
+FILE_UPLOAD_HANDLERS = [
+    'appsuavespets.services.validacion_imagenes.LimiteSubidaHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+FOTO_MAX_BYTES = int(os.getenv('FOTO_MAX_BYTES', 5 * 1024 * 1024))
+# Presupuesto de píxeles por foto (ancho x alto leído de la cabecera)
+FOTO_MAX_PIXELES = int(os.getenv('FOTO_MAX_PIXELES', 40_000_000))
+# Tamaño máximo del cuerpo de una subida: hasta 4 fotos de evento más los campos del formulario
+SUBIDA_MAX_BYTES = int(os.getenv('SUBIDA_MAX_BYTES', 4 * FOTO_MAX_BYTES + 1024 * 1024))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
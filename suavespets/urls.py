@@ -19,9 +19,13 @@ from django.urls import include, path
 from appsuavespets import views
 from appsuavespets import auth_views
 from appsuavespets import configuration_views
+from appsuavespets import async_views
 from django.conf import settings
 from django.conf.urls.static import static
 
+# Bajo ASGI (VISTAS_ASYNC, ver asgi.py) las vistas que esperan servicios externos usan su versión async
+vistas_io = async_views if settings.VISTAS_ASYNC else views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     
@@ -42,7 +46,9 @@ urlpatterns = [
 
     path('pets/', views.listado_pets, name='listado_pets'),
     path('pets/nueva/', views.agregar_pet, name='agregar_pet'),
-    path('pets/<int:pk>/', views.detalle_pet, name='detalle_pet'),
+    path('pets/<int:pk>/', vistas_io.detalle_pet, name='detalle_pet'),
+    path('pets/<int:pk>/info-vet/', views.info_vet_pet, name='info_vet_pet'),
+    path('pets/<int:pk>/info-vet/stream/', async_views.info_vet_stream, name='info_vet_stream'),
     path('pets/<int:pk>/actualizar/', views.actualizar_pet, name='actualizar_pet'),
     path('pets/<int:pk>/remover/', views.remover_pet, name='remover_pet'),
     
@@ -51,11 +57,13 @@ urlpatterns = [
 
     path('api/pets/', views.pet_list_api, name='api_pet_list'),
     path('api/pets/<int:pk>/', views.pet_detail_api, name='api_pet_detail'),
+    path('api/pets/lote/', views.pet_lote_api, name='api_pet_lote'),
 
     path('notificaciones/', views.listado_notificaciones, name='listado_notificaciones'),
 
     path('', views.inicio, name='inicio'),
-    path('api/razas/', views.RazasAPI.as_view(), name='razas_api'),
+    path('api/razas/', vistas_io.RazasAPI.as_view(), name='razas_api'),
+    path('api/razas/buscar/', views.BuscarRazasAPI.as_view(), name='buscar_razas_api'),
     
     path('pets/<int:pk>/cuidados/', views.gestionar_cuidados, name='gestionar_cuidados'),
     path('pets/<int:pk>/cuidados/<int:cuidado_id>/editar/', views.editar_cuidado, name='editar_cuidado'),